@@ -35,6 +35,7 @@ __author__ = 'Jason Haury'
 import argparse
 import asana
 from youtrack.connection import Connection
+from youtrack.memory import MemoryProfiler, NullProfiler
 import youtrack as yt
 import json
 from datetime import datetime
@@ -205,9 +206,11 @@ def migrate_projects_to_subsystems(a_conn, yt_conn, a_work, yt_proj):
     return a_projects, yt_subs
 
 
-def migrate_tasks_to_issues(a_conn, yt_conn, a_work, yt_proj, yt_login):
+def migrate_tasks_to_issues(a_conn, yt_conn, a_work, yt_proj, yt_login, profiler=None):
     """ Asana Tasks can be in multiple Projects, yet YouTrack Issues can be in only one Subsystem.  Thus, we will
      use the 1st Project in the Asana list to use as the YouTrack Subsystem """
+    if profiler is None:
+        profiler = NullProfiler()
 
     # We must filter tasks by project, tag, or assignee + workspace, so we'll use the last option and migrate tasks
     # one user at a time
@@ -319,6 +322,7 @@ def migrate_tasks_to_issues(a_conn, yt_conn, a_work, yt_proj, yt_login):
         print 'Creating new YouTrack Issues for {} (Asana IDs: {})'.format(a_user['email'],
                                                                            [n.AsanaID for n in new_issues])
         print yt_conn.importIssues(yt_proj.id, None, new_issues, test=False)
+        profiler.page('tasks of {}'.format(a_user['email']))
 
         # # only get Tasks which are not yet complete
         # now = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
@@ -332,8 +336,10 @@ def migrate_tasks_to_issues(a_conn, yt_conn, a_work, yt_proj, yt_login):
 # ----------------------
 # Main Program
 # ----------------------
-def main(a_pat, yt_url, yt_login, yt_pass):
+def main(a_pat, yt_url, yt_login, yt_pass, profiler=None):
     """ Creates connections to Asana and your YouTrack site, then migrates tasks """
+    if profiler is None:
+        profiler = NullProfiler()
     a_conn = asana.Client.access_token(a_pat)
     yt_conn = Connection(yt_url, yt_login, yt_pass)
     print 'Logged in with Asana User {} and YouTrack User {}'.format(a_conn.users.me()['name'],
@@ -393,9 +399,12 @@ def main(a_pat, yt_url, yt_login, yt_pass):
             yt_conn.createProjectCustomFieldDetailed(yt_proj.id, field_name, '')
 
         # Migrate users and save our list for later so we can assign people
+        profiler.phase('{} users'.format(a_work['name']))
         migrate_workspace_users(a_conn, yt_conn, a_work)
+        profiler.phase('{} subsystems'.format(a_work['name']))
         migrate_projects_to_subsystems(a_conn, yt_conn, a_work, yt_proj)
-        migrate_tasks_to_issues(a_conn, yt_conn, a_work, yt_proj, yt_login)
+        profiler.phase('{} tasks'.format(a_work['name']))
+        migrate_tasks_to_issues(a_conn, yt_conn, a_work, yt_proj, yt_login, profiler)
 
 
 if __name__ == '__main__':
@@ -405,7 +414,13 @@ if __name__ == '__main__':
     parser.add_argument("--youtrack_url", '-u', help="YouTrack URL", type=str)
     parser.add_argument("--youtrack_login", '-l', help="YouTrack Login (user)", type=str)
     parser.add_argument("--youtrack_password", '-p', help="YouTrack Password", type=str)
+    parser.add_argument("--memory_profile", '-m', metavar='USERS', type=int,
+                        help="Report memory growth to stderr after every phase and every USERS users' tasks")
     # parser.add_argument("--youtrack_project", '-r', help="YouTrack Project to migrate into", type=str)
 
     args = parser.parse_args()
-    main(args.asana_pat, args.youtrack_url, args.youtrack_login, args.youtrack_password)
+    profiler = MemoryProfiler(interval=args.memory_profile) if args.memory_profile else NullProfiler()
+    try:
+        main(args.asana_pat, args.youtrack_url, args.youtrack_login, args.youtrack_password, profiler)
+    finally:
+        profiler.stop()
@@ -0,0 +1,6 @@
+"""
+Offline benchmarks, they don't need running YouTrack.
+Run them from the python directory, e.g.:
+
+    python -m benchmarks.interning -n 100000
+"""
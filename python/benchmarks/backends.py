@@ -0,0 +1,64 @@
+"""
+Time of parsing a page of exported issues, and of turning it into
+youtrack.Issue objects, with every available youtrack.xmlbackend.
+
+    python -m benchmarks.backends [-n REPEAT] [-p PAGE_SIZE]
+"""
+import getopt
+import sys
+import timeit
+
+import youtrack
+from youtrack import xmlbackend
+from benchmarks.interning import export_pages
+from benchmarks.util import report
+
+ROUNDS = 5
+
+
+def load(page):
+    xml = xmlbackend.parseString(page)
+    return [youtrack.Issue(e, None) for e in xml.documentElement.childNodes
+            if e.nodeType == e.ELEMENT_NODE]
+
+
+def run(repeat, page_size):
+    page = next(export_pages(page_size, page_size))
+    default = xmlbackend.backend
+    backends = xmlbackend.available()
+    parse_times = dict((name, float('inf')) for name in backends)
+    load_times = dict(parse_times)
+    try:
+        # runs are interleaved so that a busy machine affects all backends alike
+        for i in range(ROUNDS):
+            for name in backends:
+                xmlbackend.use(name)
+                parse_time = timeit.timeit(lambda: xmlbackend.parseString(page), number=repeat) / repeat
+                load_time = timeit.timeit(lambda: load(page), number=repeat) / repeat
+                parse_times[name] = min(parse_times[name], parse_time)
+                load_times[name] = min(load_times[name], load_time)
+    finally:
+        xmlbackend.use(default)
+    rows = []
+    for name in backends:
+        rows.append((name + ' parse', '%.1f ms, %.1fx' % (
+            parse_times[name] * 1000, parse_times['minidom'] / parse_times[name])))
+        rows.append((name + ' Issue()', '%.1f ms, %.1fx' % (
+            load_times[name] * 1000, load_times['minidom'] / load_times[name])))
+    report('%d issues per page, best of %d x %d' % (page_size, ROUNDS, repeat), rows)
+
+
+def main():
+    repeat = 10
+    page_size = 100
+    opts, args = getopt.getopt(sys.argv[1:], 'n:p:')
+    for opt, val in opts:
+        if opt == '-n':
+            repeat = int(val)
+        elif opt == '-p':
+            page_size = int(val)
+    run(repeat, page_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+"""
+Synthetic inputs of the importers, from a thousand to millions of issues.
+
+    python -m benchmarks.datasets [-n ISSUES] [-s SEED] [-p PROJECT] [-d DESCRIPTION_SIZE]
+                                  [-c COMMENTS] [-l LINKS] [-t TAGS] [-a ATTACHMENTS] FORMAT OUTPUT
+
+FORMAT is one of
+    csv       issues in csvClient.youtrackMapping format for csv2youtrack, with
+              comments in OUTPUT.comments.csv and attachments in OUTPUT.attachments.csv
+    youtrack  <issues> xml in the format of /rest/issue/byproject, with comments,
+              tags, links and attachments
+    redmine   Redmine REST issues with journals, attachments and relations, one
+              json object per line
+    jira      Jira REST issues with comments, labels, issue links and attachments,
+              one json object per line
+
+-c, -l, -t and -a are average numbers per issue. Every issue is made by its own
+random generator seeded with the seed and the issue number, so files are written
+as they are generated, in constant memory, and the same seed always gives the
+same data whatever the number of issues is.
+"""
+import csv
+import getopt
+import json
+import os
+import random
+import sys
+import time
+from xml.sax.saxutils import escape, quoteattr
+
+from benchmarks.util import measure, report
+from youtrack.fake_server import PRIORITIES, STATES, TYPES, random_text
+
+SUBSYSTEMS = ['UI', 'Core', 'Import', 'REST API', 'Documentation']
+VERSIONS = ['1.0', '1.1', '2.0', '2.1', '3.0']
+LINK_TYPES = [('Relates', 'relates to', 'relates to'), ('Depend', 'depends on', 'is required for'),
+              ('Duplicate', 'duplicates', 'is duplicated by')]
+TAGS = ['regression', 'performance', 'ui', 'security', 'customer', 'backport', 'flaky', 'docs']
+START = 1262304000000  # 2010-01-01
+# attachment contents of 1KB, 2KB ... 1MB
+CONTENT_FILES = 11
+
+
+class Dataset(object):
+    def __init__(self, count, seed=1, project='BENCH', description_size=500, comments=5, links=1, tags=1,
+                 attachments=1, users=200):
+        self.count = count
+        self.seed = seed
+        self.project = project
+        self.description_size = description_size
+        self.comments = comments
+        self.links = links
+        self.tags = tags
+        self.attachments = attachments
+        self.users = ['user%d' % i for i in range(users)]
+
+    def _some(self, rnd, average):
+        return rnd.randint(0, 2 * average) if average else 0
+
+    def issue(self, number):
+        """ Issue record, the same for the same seed and number """
+        rnd = random.Random(self.seed * 1000003 + number)
+        created = START + number * 60000
+        updated = created + rnd.randint(0, 10 ** 8)
+        issue = {
+            'number': number,
+            'summary': 'Issue %d: %s' % (number, random_text(rnd, 60)),
+            'description': random_text(rnd, rnd.randint(self.description_size / 2, self.description_size * 3 / 2)),
+            'reporter': rnd.choice(self.users),
+            'assignee': rnd.choice(self.users),
+            'created': created,
+            'updated': updated,
+            'state': rnd.choice(STATES),
+            'priority': rnd.choice(PRIORITIES),
+            'type': rnd.choice(TYPES),
+            'subsystem': rnd.choice(SUBSYSTEMS),
+            'fix_versions': rnd.sample(VERSIONS, rnd.randint(0, 2)),
+            'story_points': rnd.choice([1, 2, 3, 5, 8, 13]),
+            'tags': rnd.sample(TAGS, min(len(TAGS), self._some(rnd, self.tags))),
+        }
+        comments = self._some(rnd, self.comments)
+        issue['comments'] = [(rnd.choice(self.users), created + (i + 1) * (updated - created) / (comments + 1),
+                              random_text(rnd, rnd.randint(20, 400))) for i in range(comments)]
+        # links point to earlier issues, so every prefix of the dataset is consistent
+        issue['links'] = [(rnd.choice(LINK_TYPES), rnd.randint(1, number - 1))
+                          for i in range(self._some(rnd, self.links) if number > 1 else 0)]
+        issue['attachments'] = [('attachment%d.log' % i, rnd.choice(self.users), created + i,
+                                 rnd.randint(0, CONTENT_FILES - 1))
+                                for i in range(self._some(rnd, self.attachments))]
+        return issue
+
+    def __iter__(self):
+        for number in range(1, self.count + 1):
+            yield self.issue(number)
+
+    def content_size(self, index):
+        """ Size of attachment content file, a few sizes from 1KB to 1MB """
+        return 1024 << (index % CONTENT_FILES)
+
+
+def _csv_date(ms):
+    return time.strftime('%A, %B %d, %Y %I:%M:%S %p', time.gmtime(ms / 1000)) + ' +0000'
+
+
+def _iso_date(ms, suffix='.000+0000'):
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ms / 1000)) + suffix
+
+
+def _attachment_files(dataset, directory):
+    """ Shared content files of attachments, attachments of the same size point to the same file """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    paths = []
+    for index in range(CONTENT_FILES):
+        path = os.path.join(directory, 'content%d.bin' % index)
+        size = dataset.content_size(index)
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            with open(path, 'wb') as f:
+                f.write(('x' * 1023 + '\n') * (size / 1024))
+        paths.append(path)
+    return paths
+
+
+def write_csv(dataset, output):
+    """ csv2youtrack OUTPUT OUTPUT.comments.csv OUTPUT.attachments.csv with csvClient.youtrackMapping """
+    paths = _attachment_files(dataset, output + '.files')
+    with open(output, 'wb') as issues_file, open(output + '.comments.csv', 'wb') as comments_file, \
+            open(output + '.attachments.csv', 'wb') as attachments_file:
+        issues = csv.writer(issues_file)
+        comments = csv.writer(comments_file)
+        attachments = csv.writer(attachments_file)
+        issues.writerow(['Project', 'Project Id', 'Issue Id', 'Summary', 'Reporter', 'Created', 'Updated',
+                         'Description', 'State', 'Assignee', 'Priority', 'Subsystem', 'Fix versions',
+                         'Story points'])
+        for issue in dataset:
+            number = issue['number']
+            issues.writerow([dataset.project, dataset.project, number, issue['summary'], issue['reporter'],
+                             _csv_date(issue['created']), _csv_date(issue['updated']), issue['description'],
+                             issue['state'], issue['assignee'], issue['priority'], issue['subsystem'],
+                             ','.join(issue['fix_versions']), issue['story_points']])
+            for author, created, text in issue['comments']:
+                comments.writerow([dataset.project, number, author, _csv_date(created), text])
+            for name, author, created, content in issue['attachments']:
+                attachments.writerow([dataset.project, number, author, _csv_date(created), paths[content]])
+
+
+def _field(name, values):
+    if not isinstance(values, list):
+        values = [values]
+    return '<field name=%s>%s</field>' % (quoteattr(name), ''.join('<value>%s</value>' % escape(str(v))
+                                                                   for v in values))
+
+
+def youtrack_issue(dataset, issue):
+    """ Issue xml as /rest/issue/byproject returns it """
+    project = dataset.project
+    issue_id = '%s-%d' % (project, issue['number'])
+    parts = ['<issue id="%s">' % issue_id,
+             _field('projectShortName', project),
+             _field('numberInProject', issue['number']),
+             _field('summary', issue['summary']),
+             _field('description', issue['description']),
+             _field('created', issue['created']),
+             _field('updated', issue['updated']),
+             _field('updaterName', issue['assignee']),
+             _field('reporterName', issue['reporter']),
+             _field('commentsCount', len(issue['comments'])),
+             _field('State', issue['state']),
+             _field('Priority', issue['priority']),
+             _field('Type', issue['type']),
+             _field('Subsystem', issue['subsystem']),
+             _field('Assignee', issue['assignee']),
+             _field('Story points', issue['story_points'])]
+    if issue['fix_versions']:
+        parts.append(_field('Fix versions', issue['fix_versions']))
+    for i, (author, created, text) in enumerate(issue['comments']):
+        parts.append('<comment id="%s-%d" author=%s issueId="%s" deleted="false" text=%s created="%d"/>' % (
+            issue_id, i, quoteattr(author), issue_id, quoteattr(text), created))
+    for tag in issue['tags']:
+        parts.append('<tag>%s</tag>' % tag)
+    if issue['links']:
+        parts.append('<links>%s</links>' % ''.join(
+            '<issueLink typeName="%s" typeOutward="%s" typeInward="%s" source="%s" target="%s-%d"/>' % (
+                link_type[0], link_type[1], link_type[2], issue_id, project, target)
+            for link_type, target in issue['links']))
+    if issue['attachments']:
+        parts.append('<attachments>%s</attachments>' % ''.join(
+            '<fileUrl id="%s-%d" name="%s" authorLogin="%s" created="%d" url="/_persistent/%s?file=%s-%d"/>' % (
+                issue_id, i, name, author, created, name, issue_id, i)
+            for i, (name, author, created, content) in enumerate(issue['attachments'])))
+    parts.append('</issue>')
+    return ''.join(parts)
+
+
+def write_youtrack(dataset, output):
+    with open(output, 'wb') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<issues>\n')
+        for issue in dataset:
+            f.write(youtrack_issue(dataset, issue))
+            f.write('\n')
+        f.write('</issues>\n')
+
+
+def _redmine_ref(names, name):
+    return {'id': names.index(name) + 1, 'name': name}
+
+
+def redmine_issue(dataset, issue):
+    """ Issue json as Redmine /issues/{id}.json?include=journals,attachments,relations returns it """
+    number = issue['number']
+    user = lambda login: {'id': int(login[4:]) + 1, 'name': login}
+    redmine = {
+        'id': number,
+        'project': {'id': 1, 'name': dataset.project},
+        'tracker': _redmine_ref(TYPES, issue['type']),
+        'status': _redmine_ref(STATES, issue['state']),
+        'priority': _redmine_ref(PRIORITIES, issue['priority']),
+        'author': user(issue['reporter']),
+        'assigned_to': user(issue['assignee']),
+        'category': _redmine_ref(SUBSYSTEMS, issue['subsystem']),
+        'subject': issue['summary'],
+        'description': issue['description'],
+        'done_ratio': 0,
+        'created_on': _iso_date(issue['created'], 'Z'),
+        'updated_on': _iso_date(issue['updated'], 'Z'),
+        'custom_fields': [{'id': 1, 'name': 'Story points', 'value': str(issue['story_points'])}],
+        'journals': [{'id': number * 1000 + i, 'user': user(author), 'notes': text,
+                      'created_on': _iso_date(created, 'Z'), 'details': []}
+                     for i, (author, created, text) in enumerate(issue['comments'])],
+        'attachments': [{'id': number * 1000 + i, 'filename': name, 'filesize': dataset.content_size(content),
+                         'content_type': 'text/plain', 'author': user(author),
+                         'content_url': '/attachments/download/%d/%s' % (number * 1000 + i, name),
+                         'created_on': _iso_date(created, 'Z')}
+                        for i, (name, author, created, content) in enumerate(issue['attachments'])],
+        'relations': [{'id': number * 1000 + i, 'issue_id': number, 'issue_to_id': target,
+                       'relation_type': link_type[0].lower()}
+                      for i, (link_type, target) in enumerate(issue['links'])],
+    }
+    if issue['fix_versions']:
+        redmine['fixed_version'] = _redmine_ref(VERSIONS, issue['fix_versions'][0])
+    return redmine
+
+
+def jira_issue(dataset, issue):
+    """ Issue json as Jira /rest/api/latest/issue/{key} returns it """
+    key = '%s-%d' % (dataset.project, issue['number'])
+    user = lambda login: {'name': login, 'displayName': 'User %s' % login[4:],
+                          'emailAddress': login + '@example.com'}
+    return {
+        'key': key,
+        'fields': {
+            'summary': issue['summary'],
+            'description': issue['description'],
+            'issuetype': {'name': issue['type']},
+            'status': {'name': issue['state']},
+            'priority': {'name': issue['priority']},
+            'reporter': user(issue['reporter']),
+            'assignee': user(issue['assignee']),
+            'components': [{'name': issue['subsystem']}],
+            'fixVersions': [{'name': v} for v in issue['fix_versions']],
+            'created': _iso_date(issue['created']),
+            'updated': _iso_date(issue['updated']),
+            'labels': issue['tags'],
+            'comment': {'total': len(issue['comments']),
+                        'comments': [{'author': user(author), 'body': text, 'created': _iso_date(created),
+                                      'updated': _iso_date(created)}
+                                     for author, created, text in issue['comments']]},
+            'issuelinks': [{'type': {'name': link_type[0], 'outward': link_type[1], 'inward': link_type[2]},
+                            'outwardIssue': {'key': '%s-%d' % (dataset.project, target)}}
+                           for link_type, target in issue['links']],
+            'subtasks': [],
+            'attachment': [{'filename': name, 'author': user(author), 'created': _iso_date(created),
+                            'size': dataset.content_size(content), 'mimeType': 'text/plain',
+                            'content': '/secure/attachment/%d%d/%s' % (issue['number'], i, name)}
+                           for i, (name, author, created, content) in enumerate(issue['attachments'])],
+        }
+    }
+
+
+def _write_json_lines(dataset, output, convert):
+    with open(output, 'wb') as f:
+        for issue in dataset:
+            f.write(json.dumps(convert(dataset, issue), sort_keys=True))
+            f.write('\n')
+
+
+def write_redmine(dataset, output):
+    _write_json_lines(dataset, output, redmine_issue)
+
+
+def write_jira(dataset, output):
+    _write_json_lines(dataset, output, jira_issue)
+
+
+WRITERS = {'csv': write_csv, 'youtrack': write_youtrack, 'redmine': write_redmine, 'jira': write_jira}
+
+
+def main():
+    count = 1000
+    options = {}
+    opts, args = getopt.getopt(sys.argv[1:], 'n:s:p:d:c:l:t:a:')
+    names = {'-s': 'seed', '-d': 'description_size', '-c': 'comments', '-l': 'links', '-t': 'tags',
+             '-a': 'attachments'}
+    for opt, val in opts:
+        if opt == '-n':
+            count = int(val)
+        elif opt == '-p':
+            options['project'] = val
+        else:
+            options[names[opt]] = int(val)
+    if len(args) != 2 or args[0] not in WRITERS:
+        print __doc__
+        sys.exit(1)
+    output_format, output = args
+    result, seconds = measure(WRITERS[output_format], Dataset(count, **options), output)
+    size = os.path.getsize(output)
+    report('%d issues in %s format' % (count, output_format),
+           [('file', output), ('size', '%.1f MB' % (size / 1e6)),
+            ('time', '%.1f s, %.0f issues/s' % (seconds, count / seconds))])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Memory taken by parsed issues with and without youtrack.value_pool.
+
+    python -m benchmarks.interning [-n ISSUES] [-p PAGE_SIZE]
+"""
+import getopt
+import random
+import sys
+from xml.dom import minidom
+from xml.sax.saxutils import escape, quoteattr
+
+import youtrack
+from benchmarks.util import deep_size, measure, report
+
+STATES = ['Submitted', 'Open', 'In Progress', 'Fixed', 'Verified', 'Duplicate']
+PRIORITIES = ['Show-stopper', 'Critical', 'Major', 'Normal', 'Minor']
+TYPES = ['Bug', 'Feature', 'Task', 'Usability Problem', 'Exception']
+SUBSYSTEMS = ['No subsystem', 'UI', 'Core', 'Import', 'REST API']
+VERSIONS = ['1.0', '1.1', '2.0', '2.1', '3.0']
+USERS = ['user%d' % i for i in range(50)]
+
+
+def _field(name, values, xsi_type=None):
+    attrs = ' name=%s' % quoteattr(name)
+    if xsi_type:
+        attrs += ' xsi:type=%s' % quoteattr(xsi_type)
+    return '<field%s>%s</field>' % (attrs, ''.join('<value>%s</value>' % escape(v) for v in values))
+
+
+def issue_xml(rnd, project, number):
+    created = 1262300000000 + number * 60000
+    fields = [
+        _field('projectShortName', [project], 'SingleField'),
+        _field('numberInProject', [str(number)], 'SingleField'),
+        _field('summary', ['Issue summary %d %x' % (number, rnd.getrandbits(32))], 'SingleField'),
+        _field('description', ['Description of issue %d. ' % number * rnd.randint(1, 5)], 'SingleField'),
+        _field('created', [str(created)], 'SingleField'),
+        _field('updated', [str(created + rnd.randint(0, 10 ** 8))], 'SingleField'),
+        _field('updaterName', [rnd.choice(USERS)], 'SingleField'),
+        _field('reporterName', [rnd.choice(USERS)], 'SingleField'),
+        _field('commentsCount', [str(rnd.randint(0, 3))], 'SingleField'),
+        _field('votes', [str(rnd.randint(0, 3))], 'SingleField'),
+        _field('Priority', [rnd.choice(PRIORITIES)], 'CustomFieldValue'),
+        _field('Type', [rnd.choice(TYPES)], 'CustomFieldValue'),
+        _field('State', [rnd.choice(STATES)], 'CustomFieldValue'),
+        _field('Subsystem', [rnd.choice(SUBSYSTEMS)], 'CustomFieldValue'),
+        _field('Assignee', [rnd.choice(USERS)], 'CustomFieldValue'),
+        _field('Fix versions', rnd.sample(VERSIONS, rnd.randint(1, 2)), 'CustomFieldValue'),
+    ]
+    comments = ['<comment id="%d-%d" author=%s issueId="%s-%d" deleted="false" text=%s '
+                'shownForIssueAuthor="false" created="%d"><replies/></comment>'
+                % (number, i, quoteattr(rnd.choice(USERS)), project, number,
+                   quoteattr('Comment %d for issue %d' % (i, number)), created + i)
+                for i in range(rnd.randint(0, 3))]
+    return '<issue id="%s-%d">%s%s</issue>' % (project, number, ''.join(fields), ''.join(comments))
+
+
+def export_pages(count, page_size, seed=1):
+    """Yields xml pages like /issue/byproject/{project} returns"""
+    rnd = random.Random(seed)
+    for start in range(0, count, page_size):
+        issues = [issue_xml(rnd, 'BENCH', number) for number in range(start + 1, min(start + page_size, count) + 1)]
+        yield ('<issues xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">%s</issues>'
+               % ''.join(issues))
+
+
+def load(count, page_size):
+    issues = []
+    for page in export_pages(count, page_size):
+        xml = minidom.parseString(page)
+        issues.extend(youtrack.Issue(e, None) for e in xml.documentElement.childNodes
+                      if e.nodeType == e.ELEMENT_NODE)
+    return issues
+
+
+def run(count, page_size):
+    rows = []
+    for enabled in (False, True):
+        youtrack.value_pool.clear()
+        youtrack.value_pool.enabled = enabled
+        issues, seconds = measure(load, count, page_size)
+        size = deep_size(issues)
+        rows.append((enabled, size, seconds))
+        del issues
+    youtrack.value_pool.enabled = True
+    (_, plain, plain_time), (_, pooled, pooled_time) = rows
+    report('%d issues' % count, [
+        ('without pool', '%.1f MB, %.1f s' % (plain / 2.0 ** 20, plain_time)),
+        ('with pool', '%.1f MB, %.1f s' % (pooled / 2.0 ** 20, pooled_time)),
+        ('saved', '%.1f MB (%.0f%%), %.0f bytes per issue' % (
+            (plain - pooled) / 2.0 ** 20, 100.0 * (plain - pooled) / plain, float(plain - pooled) / count)),
+        ('pooled values', str(len(youtrack.value_pool)))])
+
+
+def main():
+    count = 100000
+    page_size = 100
+    opts, args = getopt.getopt(sys.argv[1:], 'n:p:')
+    for opt, val in opts:
+        if opt == '-n':
+            count = int(val)
+        elif opt == '-p':
+            page_size = int(val)
+    run(count, page_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Scaling of link sync with the number of bound issues: SafeCommandExecutor.importLinks
+checks both ends of every link against ids permitted by IssueBinder.
+
+    python -m benchmarks.links [-n MAX_ISSUES]
+
+Every issue has a link to the next one. Links are checked against the view
+returned by IssueBinder and against a list of the same ids, the way they were
+checked before, which is run for small sizes only. Requests are not sent.
+"""
+import getopt
+import sys
+
+from youtrack import Link
+from sync.executing import SafeCommandExecutor
+from sync.links import IssueBinder
+from sync.logging import Logger
+from benchmarks.server import quiet
+from benchmarks.util import measure, report
+
+MAX_LIST_SIZE = 25000
+
+
+class NoYouTrack(object):
+    def __init__(self):
+        self.imported = 0
+        self.requests = 0
+
+    def importLinks(self, links):
+        self.imported += len(links)
+        self.requests += 1
+
+
+def make_links(count):
+    links = []
+    for i in range(1, count):
+        link = Link()
+        link.typeName = 'Relates'
+        link.source = 'M-%d' % i
+        link.target = 'M-%d' % (i + 1)
+        links.append(link)
+    return links
+
+
+def run(sizes):
+    rows = []
+    for count in sizes:
+        binder = IssueBinder(dict(('S-%d' % i, 'M-%d' % i) for i in range(1, count + 1)))
+        links = make_links(count)
+        yt = NoYouTrack()
+        with quiet():
+            logger = Logger(yt, None, 'root', 'root')
+            executor = SafeCommandExecutor(yt, logger)
+            result, seconds = measure(executor.importLinks, links, binder.getPermittedMasterIds())
+            requests = yt.requests
+            list_seconds = None
+            if count <= MAX_LIST_SIZE:
+                result, list_seconds = measure(executor.importLinks, links, list(binder.getPermittedMasterIds()))
+            logger.finalize()
+        rows.append(('%d issues' % count, '%6.2f s  %5.1f us/link  %4d requests    list: %s' % (
+            seconds, seconds * 1e6 / len(links), requests, '%.2f s' % list_seconds if list_seconds else '-')))
+    report('importLinks of a link per bound issue', rows)
+
+
+def main():
+    count = 400000
+    opts, args = getopt.getopt(sys.argv[1:], 'n:')
+    for opt, val in opts:
+        if opt == '-n':
+            count = int(val)
+    sizes = []
+    while count >= 5000:
+        sizes.insert(0, count)
+        count /= 4
+    run(sizes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Time of converting parsed issue xml into youtrack.Issue, compared with the
+previous implementation which searched the whole subtree for every field and
+scanned the issue four more times for links, tags and attachments.
+
+    python -m benchmarks.parsing [-n REPEAT] [-f ISSUE_XML]
+"""
+import getopt
+import os
+import sys
+import timeit
+from xml.dom import Node, minidom
+
+import youtrack
+from youtrack import value_pool
+from benchmarks.util import report
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'data', 'issue.xml')
+ROUNDS = 7
+
+
+class LegacyParsing(object):
+    """Field parsing as it was implemented before single pass traversal"""
+
+    def _updateFromAttrs(self, el):
+        if el.attributes is not None:
+            for i in range(el.attributes.length):
+                a = el.attributes.item(i)
+                name = value_pool.name(a.name)
+                setattr(self, name, value_pool.value(name, a.value))
+
+    def _updateFromChildren(self, el):
+        children = [e for e in el.childNodes if e.nodeType == Node.ELEMENT_NODE]
+        if children:
+            for c in children:
+                name = c.getAttribute('name')
+                value = None
+                if not len(name):
+                    continue
+                name = value_pool.name(name)
+                values = c.getElementsByTagName('value')
+                if (values is not None) and len(values):
+                    if values.length == 1:
+                        value = value_pool.value(name, self._text(values.item(0)))
+                    elif values.length > 1:
+                        value = [value_pool.value(name, self._text(value)) for value in values]
+                elif c.hasAttribute('value'):
+                    value = value_pool.value(name, c.getAttribute('value'))
+                if value is not None:
+                    setattr(self, name, value)
+                    if c.hasAttribute('xsi:type'):
+                        self._attribute_types[name] = value_pool.value('xsi:type', c.getAttribute('xsi:type'))
+
+    def _text(self, el):
+        return "".join([e.data for e in el.childNodes if e.nodeType == Node.TEXT_NODE])
+
+
+class LegacyComment(LegacyParsing, youtrack.Comment):
+    pass
+
+
+class LegacyLink(LegacyParsing, youtrack.Link):
+    pass
+
+
+class LegacyAttachment(LegacyParsing, youtrack.Attachment):
+    pass
+
+
+class LegacyIssue(LegacyParsing, youtrack.Issue):
+    """Issue which scans the whole tree for comments, links, tags and attachments"""
+
+    def __init__(self, xml=None, youtrack_=None):
+        youtrack.YouTrackObject.__init__(self, xml, youtrack_)
+        if xml is not None:
+            root = xml.documentElement if isinstance(xml, minidom.Document) else xml
+            self.comments = [LegacyComment(e, youtrack_) for e in root.childNodes
+                             if e.nodeType == Node.ELEMENT_NODE and e.tagName == 'comment']
+            if len(xml.getElementsByTagName('links')) > 0:
+                self.links = [LegacyLink(e, youtrack_) for e in xml.getElementsByTagName('issueLink')]
+            else:
+                self.links = None
+            if len(xml.getElementsByTagName('tag')) > 0:
+                self.tags = [self._text(e) for e in xml.getElementsByTagName('tag')]
+            else:
+                self.tags = None
+            if len(xml.getElementsByTagName('attachments')) > 0:
+                self.attachments = [LegacyAttachment(e, youtrack_) for e in xml.getElementsByTagName('fileUrl')]
+            else:
+                self.attachments = None
+            for m in ['fixedVersion', 'affectsVersion']: self._normilizeMultiple(m)
+            if hasattr(self, 'fixedInBuild') and (self.fixedInBuild == 'Next build'):
+                self.fixedInBuild = None
+
+
+def _fields(issue):
+    return dict((name, issue[name]) for name in issue if name not in ('comments', 'links', 'tags', 'attachments'))
+
+
+def run(fixture, repeat):
+    xml = minidom.parse(fixture)
+    legacy, current = LegacyIssue(xml), youtrack.Issue(xml)
+    assert _fields(legacy) == _fields(current), 'implementations disagree'
+    assert [_fields(c) for c in legacy.comments] == [_fields(c) for c in current.comments]
+    assert legacy.tags == current.tags
+
+    # runs are interleaved so that a busy machine affects both implementations alike
+    legacy_time = current_time = parse_time = float('inf')
+    for i in range(ROUNDS):
+        legacy_time = min(legacy_time, timeit.timeit(lambda: LegacyIssue(xml), number=repeat) / repeat)
+        current_time = min(current_time, timeit.timeit(lambda: youtrack.Issue(xml), number=repeat) / repeat)
+        parse_time = min(parse_time, timeit.timeit(lambda: minidom.parse(fixture), number=repeat) / repeat)
+    report('%s, best of %d x %d' % (os.path.basename(fixture), ROUNDS, repeat), [
+        ('minidom.parse', '%.3f ms' % (parse_time * 1000)),
+        ('legacy Issue()', '%.3f ms' % (legacy_time * 1000)),
+        ('single pass Issue()', '%.3f ms' % (current_time * 1000)),
+        ('speedup', '%.1fx' % (legacy_time / current_time))])
+
+
+def main():
+    repeat = 200
+    fixture = FIXTURE
+    opts, args = getopt.getopt(sys.argv[1:], 'n:f:')
+    for opt, val in opts:
+        if opt == '-n':
+            repeat = int(val)
+        elif opt == '-f':
+            fixture = val
+    run(fixture, repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Throughput of getIssues, importIssues, youtrack2youtrack and sync against
+youtrack.fake_server, so that regressions show up without YouTrack server.
+
+    python -m benchmarks.server [-i ISSUES] [-l LATENCY_MS] [-d DESCRIPTION_SIZE] [-c COMMENTS] [-w WORKERS]
+                                [SCENARIO ...]
+
+Scenarios are getIssues, importIssues, youtrack2youtrack and sync, all of
+them by default. sync merges issues by WORKERS threads, 1 by default.
+"""
+import getopt
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from youtrack.connection import Connection
+from youtrack.fake_server import FakeYouTrack
+from benchmarks.util import measure, report
+
+PROJECT = 'BM'
+PAGE_SIZE = 100
+
+
+@contextmanager
+def quiet():
+    """ Scripts print every issue and sync logger writes files into current directory """
+    directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    stdout = sys.stdout
+    os.chdir(directory)
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+
+
+def get_issues(source, target, count, options, workers):
+    yt = Connection(source.url, 'root', 'root')
+
+    def run():
+        start = 0
+        while len(yt.getIssues(PROJECT, '', start, PAGE_SIZE)):
+            start += PAGE_SIZE
+    return run
+
+
+def import_issues(source, target, count, options, workers):
+    yt = Connection(source.url, 'root', 'root')
+    pages = []
+    while True:
+        issues = yt.getIssues(PROJECT, '', len(pages) * PAGE_SIZE, PAGE_SIZE)
+        if not len(issues):
+            break
+        pages.append(issues)
+    target.store.addProject(PROJECT)
+    target_yt = Connection(target.url, 'root', 'root')
+
+    def run():
+        for issues in pages:
+            target_yt.importIssues(PROJECT, PROJECT + ' Assignees', issues)
+    return run
+
+
+def copy_project(source, target, count, options, workers):
+    from youtrack2youtrack import youtrack2youtrack
+
+    def run():
+        youtrack2youtrack(source.url, 'root', 'root', target.url, 'root', 'root', [PROJECT])
+    return run
+
+
+def sync(master, slave, count, options, workers):
+    from sync.links import IssueBinder
+    from sync.logging import Logger
+    from sync.youtracks import YouTrackSynchronizer
+    # both sides have the same issues bound to each other, with different histories and comments
+    slave.store.generate(PROJECT, count, seed=1, **options)
+    for issue in slave.store.issues.values():
+        issue['fields']['Sync with'] = issue['fields']['numberInProject']
+    binder = IssueBinder(dict((issue_id, issue_id) for issue_id in slave.store.issues))
+
+    def run():
+        master_yt = Connection(master.url, 'root', 'root')
+        slave_yt = Connection(slave.url, 'root', 'root')
+        logger = Logger(master_yt, slave_yt, 'root', 'root')
+        now = datetime.now()
+        synchronizer = YouTrackSynchronizer(master_yt, slave_yt, logger, binder, PROJECT, ['state', 'priority'],
+                                            '', now - timedelta(hours=2), now, workers)
+        try:
+            synchronizer.sync()
+        finally:
+            logger.finalize()
+    return run
+
+
+SCENARIOS = [('getIssues', get_issues), ('importIssues', import_issues), ('youtrack2youtrack', copy_project),
+             ('sync', sync)]
+
+
+def run(names, count, latency, options, workers=1):
+    rows = []
+    for name, scenario in SCENARIOS:
+        if name not in names:
+            continue
+        source = FakeYouTrack(latency=latency).start()
+        target = FakeYouTrack(latency=latency).start()
+        try:
+            source.store.generate(PROJECT, count, **options)
+            action = scenario(source, target, count, options, workers)
+            requests = source.total_requests() + target.total_requests()
+            with quiet():
+                result, seconds = measure(action)
+            requests = source.total_requests() + target.total_requests() - requests
+        finally:
+            source.stop()
+            target.stop()
+        rows.append((name, '%6.2f s  %7.0f issues/s  %6d requests' % (seconds, count / seconds, requests)))
+    report('%d issues, %d ms latency' % (count, latency * 1000), rows)
+
+
+def main():
+    count = 1000
+    workers = 1
+    latency = 0.0
+    options = {'description_size': 500, 'comments': 3}
+    opts, args = getopt.getopt(sys.argv[1:], 'i:l:d:c:w:')
+    for opt, val in opts:
+        if opt == '-i':
+            count = int(val)
+        elif opt == '-l':
+            latency = float(val) / 1000
+        elif opt == '-d':
+            options['description_size'] = int(val)
+        elif opt == '-c':
+            options['comments'] = int(val)
+        elif opt == '-w':
+            workers = int(val)
+    run(args or [name for name, scenario in SCENARIOS], count, latency, options, workers)
+
+
+if __name__ == '__main__':
+    main()
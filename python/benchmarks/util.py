@@ -0,0 +1,46 @@
+import gc
+import sys
+import time
+
+
+def deep_size(root):
+    """ Size in bytes of all objects reachable from root. Objects shared between
+        several owners are counted once, so the result shows the effect of sharing.
+    """
+    seen = set()
+    size = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, type):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        else:
+            if hasattr(obj, '__dict__'):
+                stack.append(obj.__dict__)
+            for cls in type(obj).__mro__:
+                for slot in cls.__dict__.get('__slots__', ()):
+                    if hasattr(obj, slot):
+                        stack.append(getattr(obj, slot))
+    return size
+
+
+def measure(func, *args, **kwargs):
+    """Returns result of func and time it took in seconds"""
+    gc.collect()
+    started = time.time()
+    result = func(*args, **kwargs)
+    return result, time.time() - started
+
+
+def report(title, rows):
+    print title
+    width = max(len(name) for name, value in rows)
+    for name, value in rows:
+        print '  %s  %s' % (name.ljust(width), value)
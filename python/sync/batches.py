@@ -0,0 +1,50 @@
+import time
+
+
+class AdaptiveBatchSize(object):
+    """ Size of batches of an import request. It grows twice while batches are
+        imported faster than fast_seconds, and halves when a batch takes more
+        than slow_seconds or fails.
+    """
+
+    def __init__(self, size=100, minimum=1, maximum=1000, fast_seconds=1.0, slow_seconds=5.0):
+        self.size = size
+        self.minimum = minimum
+        self.maximum = maximum
+        self.fast_seconds = fast_seconds
+        self.slow_seconds = slow_seconds
+
+    def record(self, size, seconds):
+        if seconds > self.slow_seconds:
+            self.shrink()
+        elif seconds < self.fast_seconds and size >= self.size:
+            self.size = min(self.maximum, self.size * 2)
+
+    def shrink(self):
+        self.size = max(self.minimum, self.size / 2)
+
+
+def import_in_batches(items, import_batch, batch_size, on_error):
+    """ Calls import_batch for consecutive batches of items. A failed batch is
+        split in halves which are imported again, on_error(item, error) is
+        called for the items which fail alone.
+    """
+    start = 0
+    while start < len(items):
+        batch = items[start:start + batch_size.size]
+        start += len(batch)
+        pending = [batch]
+        while pending:
+            batch = pending.pop()
+            started = time.time()
+            try:
+                import_batch(batch)
+            except Exception, e:
+                if len(batch) == 1:
+                    on_error(batch[0], e)
+                else:
+                    batch_size.shrink()
+                    middle = len(batch) / 2
+                    pending += [batch[middle:], batch[:middle]]
+                continue
+            batch_size.record(len(batch), time.time() - started)
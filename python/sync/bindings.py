@@ -0,0 +1,111 @@
+from __future__ import absolute_import
+import sqlite3
+import threading
+
+
+class _Ids(object):
+    """ Bound ids of one side, checked by index instead of loading them """
+
+    def __init__(self, binder, column):
+        self._binder = binder
+        self._column = column
+
+    def __contains__(self, issue_id):
+        return self._binder._one('SELECT 1 FROM binding WHERE %s = ?' % self._column, issue_id) is not None
+
+    def __iter__(self):
+        return iter([row[0] for row in self._binder._all('SELECT %s FROM binding' % self._column)])
+
+    def __len__(self):
+        return self._binder._one('SELECT count(*) FROM binding')
+
+    def __nonzero__(self):
+        return self._binder._one('SELECT 1 FROM binding LIMIT 1') is not None
+
+
+class _Map(_Ids):
+    """ Read only dict of bindings from one side to the other """
+
+    def __init__(self, binder, column, other):
+        _Ids.__init__(self, binder, column)
+        self._other = other
+
+    def __getitem__(self, issue_id):
+        value = self.get(issue_id)
+        if value is None:
+            raise KeyError(issue_id)
+        return value
+
+    def get(self, issue_id, default=None):
+        value = self._binder._one('SELECT %s FROM binding WHERE %s = ?' % (self._other, self._column), issue_id)
+        return default if value is None else value
+
+    has_key = _Ids.__contains__
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [row[0] for row in self._binder._all('SELECT %s FROM binding' % self._other)]
+
+    def items(self):
+        return self._binder._all('SELECT %s, %s FROM binding' % (self._column, self._other))
+
+
+class SqliteIssueBinder(object):
+    """ IssueBinder keeping bindings in SQLite database file, indexed both ways.
+        Opening it doesn't read the bindings and every new binding is committed
+        at once, so size of the map doesn't matter and nothing is lost when
+        sync is interrupted.
+    """
+
+    def __init__(self, file_name):
+        self._lock = threading.Lock()
+        # lookups come from threads merging issues, see YouTrackSynchronizer
+        self._db = sqlite3.connect(file_name, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS binding (slave_id TEXT PRIMARY KEY, master_id TEXT NOT NULL UNIQUE)')
+        self._db.commit()
+        self.s_to_m = _Map(self, 'slave_id', 'master_id')
+        self.m_to_s = _Map(self, 'master_id', 'slave_id')
+
+    def _one(self, sql, *args):
+        with self._lock:
+            row = self._db.execute(sql, [unicode(arg) for arg in args]).fetchone()
+        return row[0] if row is not None else None
+
+    def _all(self, sql):
+        with self._lock:
+            return self._db.execute(sql).fetchall()
+
+    def slaveIssueIdToMasterIssueId(self, slave_issue_id):
+        return self.s_to_m[slave_issue_id]
+
+    def masterIssueIdToSlaveIssueId(self, master_issue_id):
+        return self.m_to_s[master_issue_id]
+
+    def addBinding(self, master_id, slave_id):
+        self.addBindings([(master_id, slave_id)])
+
+    def addBindings(self, pairs):
+        """ Adds (master id, slave id) pairs in one transaction """
+        with self._lock:
+            with self._db:
+                self._db.executemany('INSERT OR REPLACE INTO binding (master_id, slave_id) VALUES (?, ?)',
+                                     ((unicode(m_id), unicode(s_id)) for m_id, s_id in pairs))
+
+    def getPermittedMasterIds(self):
+        return _Ids(self, 'master_id')
+
+    def getPermittedSlaveIds(self):
+        return _Ids(self, 'slave_id')
+
+    def checkSlaveId(self, id):
+        return id in self.s_to_m
+
+    def checkMasterId(self, id):
+        return id in self.m_to_s
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+import json
+import sys
+import threading
+import time
+from youtrack import ChangeField, IssueChange
+
+
+def get_in_milliseconds(_datetime):
+    return int(round(1e+3*time.mktime(_datetime.timetuple()) + 1e-3*_datetime.microsecond))
+
+
+def _to_list(change):
+    return [change.updated, change.updater_name,
+            [[field.name, field.old_value, field.new_value] for field in change.fields], change.comments]
+
+
+def _from_list(item, yt):
+    change = IssueChange(None, yt)
+    change.updated, change.updater_name, fields, change.comments = item
+    for name, old_value, new_value in fields:
+        field = ChangeField(None, yt)
+        field.name, field.old_value, field.new_value = name, old_value, new_value
+        change.fields.append(field)
+    return change
+
+
+class ChangeFeed(object):
+    """ Changes of issues of one YouTrack in time windows of sync runs.
+
+        YouTrack REST API returns whole history of an issue, so the feed keeps
+        for every issue the watermark, its updated time when history was
+        downloaded, and the changes after the last window. History is
+        downloaded again only for issues updated after their watermark, and
+        with history saved between runs the cost of sync depends on the
+        number of changes since the last run instead of history length.
+        Windows are expected to move forward only.
+    """
+
+    def __init__(self, yt, history=None):
+        self.yt = yt
+        # issue id -> [watermark, changes as lists]
+        self._history = dict(history) if history else {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+
+    def changes(self, issue_id, start=None, finish=None, updated=None):
+        """ Changes made after start and before finish, updated is the updated
+            field of the issue when it's known.
+        """
+        after_ms = get_in_milliseconds(start) if start else 0
+        before_ms = get_in_milliseconds(finish) if finish else sys.maxint
+        with self._lock:
+            cached = self._history.get(issue_id)
+        if cached is not None and updated is not None and int(updated) <= cached[0]:
+            self.hits += 1
+            changes = [_from_list(item, self.yt) for item in cached[1]]
+        else:
+            self.requests += 1
+            changes = self.yt.get_changes_for_issue(issue_id)
+            watermark = max([int(updated or 0)] + [change.updated for change in changes])
+            # changes before the window will not be asked for again
+            with self._lock:
+                self._history[issue_id] = [watermark, [_to_list(change) for change in changes
+                                                       if change.updated > after_ms]]
+        return [change for change in changes if after_ms < change.updated < before_ms]
+
+    def history(self, since=None):
+        """ Watermarks and changes of issues, without changes made before since,
+            which later windows don't reach. Watermarks are kept, so that history
+            of an issue which doesn't change isn't downloaded again.
+        """
+        with self._lock:
+            if since is None:
+                return dict(self._history)
+            since_ms = get_in_milliseconds(since)
+            return dict((issue_id, [watermark, [item for item in changes if item[0] > since_ms]])
+                        for issue_id, (watermark, changes) in self._history.items())
+
+
+def read_history(file_name):
+    """ Histories of master and slave feeds saved by write_history """
+    try:
+        with open(file_name, 'r') as history_file:
+            history = json.load(history_file)
+        return history.get('master', {}), history.get('slave', {})
+    except IOError:
+        return {}, {}
+
+
+def write_history(file_name, master_feed, slave_feed, since=None):
+    """ since is the start of the window of the run, changes made before it are dropped """
+    with open(file_name, 'w') as history_file:
+        json.dump({'master': master_feed.history(since), 'slave': slave_feed.history(since)}, history_file)
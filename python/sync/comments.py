@@ -1,35 +1,133 @@
-from youtrack import YouTrackException
+from __future__ import absolute_import
+import hashlib
+import json
+import threading
+from sync.users import UserSynchronizer, utf8encode
 
-COMPARISON_LENGTH = 10
 COMMAND = 'comment'
 
+
+def fingerprint(comment):
+    """ Hash of author and full text, a comment and its copy made by sync have the same one """
+    return hashlib.sha1(utf8encode(getattr(comment, 'author', '')) + '\0' +
+                        utf8encode(getattr(comment, 'text', '') or '')).hexdigest()[:20]
+
+
+def _created(comment):
+    return int(getattr(comment, 'created', 0) or 0)
+
+
+def numbered_fingerprints(comments):
+    """ Comments in order of creation with their fingerprints. A comment repeating
+        an earlier one of the same author gets the number of the repetition, so
+        that "+1" written twice is copied twice.
+    """
+    counts = {}
+    result = []
+    for comment in sorted(comments, key=_created):
+        comment_print = fingerprint(comment)
+        counts[comment_print] = counts.get(comment_print, 0) + 1
+        if counts[comment_print] > 1:
+            comment_print = '%s#%d' % (comment_print, counts[comment_print])
+        result.append((comment, comment_print))
+    return result
+
+
+class CommentIndex(object):
+    """ Comments of synchronized issues seen by previous runs. For every master
+        issue it keeps creation time of the newest comment handled in master
+        and in slave, and fingerprints of comments already synchronized, so
+        that only newer comments are compared and copies are not copied back.
+    """
+
+    def __init__(self, entries=None):
+        # master issue id -> [master watermark, slave watermark, fingerprints]
+        self._entries = dict(entries) if entries else {}
+        self._lock = threading.Lock()
+
+    def get(self, master_id):
+        with self._lock:
+            entry = self._entries.get(master_id)
+        if entry is None:
+            return 0, 0, set()
+        return entry[0], entry[1], set(entry[2])
+
+    def put(self, master_id, master_watermark, slave_watermark, fingerprints):
+        with self._lock:
+            self._entries[master_id] = [master_watermark, slave_watermark, sorted(fingerprints)]
+
+    def entries(self):
+        with self._lock:
+            return dict(self._entries)
+
+
+def read_comment_index(file_name):
+    try:
+        with open(file_name, 'r') as index_file:
+            return CommentIndex(json.load(index_file))
+    except IOError:
+        return CommentIndex()
+
+
+def write_comment_index(file_name, index):
+    with open(file_name, 'w') as index_file:
+        json.dump(index.entries(), index_file)
+
+
 class CommentSynchronizer(object):
-    def __init__(self, master, slave, master_executor, slave_executor):
+    def __init__(self, master, slave, master_executor, slave_executor, index=None, user_sync=None):
         self.master = master
         self.slave = slave
         self.executors = {master : master_executor, slave : slave_executor}
+        self.index = index if index is not None else CommentIndex()
+        if user_sync is None:
+            user_sync = UserSynchronizer(master, slave, master_executor, slave_executor)
+        self.user_sync = user_sync
+
+    def syncComments(self, master_id, slave_id, master_issue=None, slave_issue=None):
+        slave_comments = self._get_comments(self.slave, slave_id, slave_issue)
+        master_comments = self._get_comments(self.master, master_id, master_issue)
+        master_watermark, slave_watermark, synced = self.index.get(master_id)
+        if not any(_created(cm) > master_watermark for cm in master_comments) and \
+                not any(_created(cm) > slave_watermark for cm in slave_comments):
+            return
+        master_numbered = numbered_fingerprints(master_comments)
+        slave_numbered = numbered_fingerprints(slave_comments)
+        master_prints = set(cm_print for cm, cm_print in master_numbered)
+        slave_prints = set(cm_print for cm, cm_print in slave_numbered)
+        master_new = [(cm, cm_print) for cm, cm_print in master_numbered if _created(cm) > master_watermark]
+        slave_new = [(cm, cm_print) for cm, cm_print in slave_numbered if _created(cm) > slave_watermark]
+        slave_watermark = self._sync_new_comments(self.master, self.slave, master_id, slave_new, master_prints, synced,
+                                                  slave_watermark)
+        master_watermark = self._sync_new_comments(self.slave, self.master, slave_id, master_new, slave_prints, synced,
+                                                   master_watermark)
+        self.index.put(master_id, master_watermark, slave_watermark, synced)
+
+    def _sync_new_comments(self, to_yt, from_yt, issue_id, new_comments, existing_prints, synced, watermark):
+        """ Copies comments which are neither in to_yt nor synchronized before, returns the new watermark.
+            new_comments are pairs of comments and their numbered fingerprints.
+        """
+        failed = []
+        for cm, cm_print in new_comments:
+            if cm_print in existing_prints or cm_print in synced:
+                synced.add(cm_print)
+            elif self._sync_comment(to_yt, from_yt, issue_id, cm.text, cm.author):
+                synced.add(cm_print)
+            elif cm.text:
+                failed.append(_created(cm))
+        if len(failed):
+            # failed comments are compared again next run
+            return max(watermark, min(failed) - 1)
+        return max([watermark] + [_created(cm) for cm, cm_print in new_comments])
 
-    def syncComments(self, master_id, slave_id):
-        slave_comments = self.slave.getComments(slave_id)
-        master_comments = self.master.getComments(master_id)
-        if len(slave_comments) or len(master_comments):
-            master_texts = set([cm.text[0:COMPARISON_LENGTH] for cm in master_comments])
-            slave_texts = set([cm.text[0:COMPARISON_LENGTH] for cm in slave_comments])
-            slave_unique = [cm for cm in slave_comments if cm.text[0:COMPARISON_LENGTH] not in master_texts]
-            master_unique = [cm for cm in master_comments if cm.text[0:COMPARISON_LENGTH] not in slave_texts]
-            for cm in slave_unique:
-                self._sync_comment(self.master, self.slave, master_id, cm.text, cm.author)
-            for cm in master_unique:
-                self._sync_comment(self.slave, self.master, slave_id, cm.text, cm.author)
+    def _get_comments(self, yt, issue_id, issue):
+        # issues loaded with getIssue(s) already carry their comments
+        if issue is not None and issue.id == issue_id:
+            return issue.getComments()
+        return yt.getComments(issue_id)
 
     def _sync_comment(self, to_yt, from_yt, issue_id, comment_text, run_as):
         if comment_text is not None and comment_text != '':
-            self._try_to_sync_user(to_yt, from_yt, run_as)
-            self.executors[to_yt].executeCommand(issue_id, COMMAND, comment=comment_text, run_as=run_as)
-
-    def _try_to_sync_user(self, to_yt, from_yt, login):
-        try:
-            to_yt.getUser(login)
-        except YouTrackException:
-            user_to_import = from_yt.getUser(login)
-            self.executors[to_yt].executeUserImport(user_to_import)
+            self.user_sync.syncUser(to_yt, from_yt, run_as)
+            return self.executors[to_yt].executeCommand(issue_id, COMMAND, comment=comment_text, run_as=run_as)
+        return False
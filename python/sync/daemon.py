@@ -0,0 +1,172 @@
+from __future__ import absolute_import
+import BaseHTTPServer
+import json
+import threading
+import time
+from youtrack import metrics
+
+
+class SyncStatus(object):
+    """ Health of repeated sync: number of cycles and failures, duration of the
+        last cycle and lag, which is the age of the newest sync that succeeded.
+    """
+
+    def __init__(self, name=''):
+        self.name = name
+        self.cycles = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.last_success = None
+        self.last_cycle_seconds = None
+        self.running = False
+        self._lock = threading.Lock()
+
+    def started(self):
+        with self._lock:
+            self.running = True
+
+    def succeeded(self, started, seconds):
+        """ started is time of the beginning of the cycle, changes made before it are synchronized """
+        with self._lock:
+            self.running = False
+            self.cycles += 1
+            self.consecutive_failures = 0
+            self.last_success = started
+            self.last_cycle_seconds = seconds
+
+    def failed(self, error, seconds):
+        with self._lock:
+            self.running = False
+            self.cycles += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = unicode(error)
+            self.last_cycle_seconds = seconds
+
+    def healthy(self):
+        return self.consecutive_failures == 0 and self.last_success is not None
+
+    def as_dict(self):
+        with self._lock:
+            return {'name': self.name, 'healthy': self.healthy(),
+                    'running': self.running, 'cycles': self.cycles, 'failures': self.failures,
+                    'consecutive_failures': self.consecutive_failures, 'last_error': self.last_error,
+                    'last_success': self.last_success, 'last_cycle_seconds': self.last_cycle_seconds,
+                    'lag_seconds': time.time() - self.last_success if self.last_success is not None else None}
+
+
+def to_prometheus(statuses):
+    """ Gauges of sync statuses in Prometheus text format """
+    gauges = [('sync_healthy', 'healthy', 'gauge'), ('sync_cycles_total', 'cycles', 'counter'),
+              ('sync_failures_total', 'failures', 'counter'), ('sync_lag_seconds', 'lag_seconds', 'gauge'),
+              ('sync_last_cycle_seconds', 'last_cycle_seconds', 'gauge')]
+    lines = []
+    values = [status.as_dict() for status in statuses]
+    for gauge, key, kind in gauges:
+        lines.append('# TYPE %s %s' % (gauge, kind))
+        for value in values:
+            if value[key] is not None:
+                lines.append('%s{sync="%s"} %s' % (gauge, value['name'], float(value[key])))
+    return '\n'.join(lines) + '\n'
+
+
+class SyncDaemon(object):
+    """ Calls run every poll_interval seconds, or at once when triggered, until stopped """
+
+    def __init__(self, run, poll_interval, status=None):
+        self.run = run
+        self.poll_interval = poll_interval
+        self.status = status if status is not None else SyncStatus()
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def trigger(self):
+        self._wake.set()
+
+    def stop(self):
+        """ Stops after the current cycle """
+        self._stopped = True
+        self._wake.set()
+
+    def serve(self, cycles=None):
+        while not self._stopped and cycles != 0:
+            self._wake.clear()
+            self.runOnce()
+            if cycles is not None:
+                cycles -= 1
+            if not self._stopped and cycles != 0:
+                self._wake.wait(self.poll_interval)
+
+    def runOnce(self):
+        started = time.time()
+        self.status.started()
+        try:
+            self.run()
+        except Exception, e:
+            self.status.failed(e, time.time() - started)
+            print e
+            return False
+        self.status.succeeded(started, time.time() - started)
+        return True
+
+
+class _StatusHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?')[0].rstrip('/')
+        if path == '/status':
+            statuses = [daemon.status.as_dict() for daemon in self.server.daemons]
+            healthy = all(status['healthy'] for status in statuses)
+            self._reply(200 if healthy else 503, 'application/json', json.dumps(statuses))
+        elif path == '/metrics':
+            self._reply(200, 'text/plain; version=0.0.4',
+                        to_prometheus([daemon.status for daemon in self.server.daemons]) + metrics.to_prometheus())
+        else:
+            self._reply(404, 'text/plain', 'not found\n')
+
+    def do_POST(self):
+        if self.path.split('?')[0].rstrip('/') == '/sync':
+            if self.server.trigger is not None:
+                self.server.trigger()
+            else:
+                for daemon in self.server.daemons:
+                    daemon.trigger()
+            self._reply(200, 'text/plain', 'triggered\n')
+        else:
+            self._reply(404, 'text/plain', 'not found\n')
+
+    def _reply(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StatusServer(object):
+    """ Serves GET /status with json statuses of daemons, answering 503 when one
+        of them is failing, GET /metrics in Prometheus format with request
+        metrics of connections, and POST /sync starting the next cycle at once,
+        which can be called by a workflow or any other hook. Daemons run by
+        a scheduler are triggered by the trigger function of the scheduler.
+    """
+
+    def __init__(self, daemons, port, host='', trigger=None):
+        self._server = BaseHTTPServer.HTTPServer((host, port), _StatusHandler)
+        self._server.daemons = daemons
+        self._server.trigger = trigger
+        self.port = self._server.server_address[1]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='sync-status')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -1,3 +1,6 @@
+import threading
+from collections import OrderedDict
+from sync.batches import AdaptiveBatchSize, import_in_batches
 from youtrack import YouTrackException
 
 LOGGED_COMMENT_LENGTH = 10
@@ -7,11 +10,16 @@ class SafeCommandExecutor(object):
         self.yt = yt
         self.logger = logger
         self.debug_mode = False
+        self.link_batch_size = AdaptiveBatchSize()
+        # issue id -> key -> (part of command, run_as), see queueCommand
+        self._pending = {}
+        self._lock = threading.Lock()
 
     def setDebugMode(self, on):
         self.debug_mode = on
 
     def executeCommand(self, issue_id, command, comment=None, run_as=None):
+        """ Returns True when the command was applied """
         if command != '':
             try:
                 if not self.debug_mode:
@@ -20,17 +28,59 @@ class SafeCommandExecutor(object):
                     self.logger.logAction(issue_id, self.yt, 'added comment: \"' + comment[0:LOGGED_COMMENT_LENGTH] + '...\"', run_as)
                 else:
                     self.logger.logAction(issue_id, self.yt, 'applied command: \"' + command + '\"', run_as)
+                return not self.debug_mode
             except Exception, e:
                 self.logger.logError(e, issue_id, self.yt, 'failed to apply command: \"' + command + '\"', run_as)
+        return False
+
+    def queueCommand(self, issue_id, key, command, run_as=None):
+        """ Queues a part of command setting key (a field) of the issue. It replaces the part
+            queued for the same key before, empty command just drops it. Applied by flush.
+        """
+        with self._lock:
+            pending = self._pending.setdefault(issue_id, OrderedDict())
+            pending.pop(key, None)
+            if command.strip() != '':
+                pending[key] = (command.strip(), run_as)
+
+    def flush(self, issue_id):
+        """ Applies parts queued for the issue as one command per user they are run as.
+            When the command fails, its parts are applied one by one. Returns True when
+            everything was applied.
+        """
+        with self._lock:
+            pending = self._pending.pop(issue_id, {})
+        commands = OrderedDict()
+        for command, run_as in pending.values():
+            commands.setdefault(run_as, []).append(command)
+        applied = True
+        for run_as, parts in commands.items():
+            if len(parts) == 1:
+                applied = self.executeCommand(issue_id, parts[0], run_as=run_as) and applied
+                continue
+            command = ' '.join(parts)
+            try:
+                if not self.debug_mode:
+                    self.yt.executeCommand(issue_id, command, run_as=run_as)
+                self.logger.logAction(issue_id, self.yt, 'applied command: \"' + command + '\"', run_as)
+                applied = applied and not self.debug_mode
+            except Exception:
+                # find the wrong part, the rest is applied anyway
+                for part in parts:
+                    applied = self.executeCommand(issue_id, part, run_as=run_as) and applied
+        return applied
 
     def executeUserImport(self, user):
+        """ Returns True when the user was imported """
         if user:
             try:
                 if not self.debug_mode:
                     self.yt.importUsers([user])
                 self.logger.logAction('Import user', self.yt, 'imported user: \"' + str(user.login) + '\"')
+                return not self.debug_mode
             except YouTrackException, e:
                 self.logger.logError(e, 'Import user', self.yt, 'failed to import user: \"' + user.login + '\" - could not find in opposite youtrack')
+        return False
 
     def createIssue(self, project_id, summary, description, issue_from_id):
         try:
@@ -46,7 +96,7 @@ class SafeCommandExecutor(object):
             return None
 
     def importLinks(self, links, permitted_issue_ids):
-        maxLinks = 100
+        """ permitted_issue_ids should check ids in constant time, like a set or IssueBinder.getPermittedSlaveIds() """
         links_to_import = []
         for link in links:
             if link.target not in permitted_issue_ids:
@@ -57,11 +107,7 @@ class SafeCommandExecutor(object):
                 self.logger.logError(None, 'Links', self.yt, message)
             else:
                 links_to_import.append(link)
-                if len(links_to_import) == maxLinks:
-                    self._import_links_batch(links_to_import)
-                    links_to_import = []
-        if len(links_to_import):
-            self._import_links_batch(links_to_import)
+        import_in_batches(links_to_import, self._import_links_batch, self.link_batch_size, self._link_failed)
 
     def _import_links_batch(self, links_to_import):
         if not self.debug_mode:
@@ -70,6 +116,9 @@ class SafeCommandExecutor(object):
             message = 'imported ' + self._getPrettyLink(link)
             self.logger.logAction('Links', self.yt, message)
 
+    def _link_failed(self, link, error):
+        self.logger.logError(error, 'Links', self.yt, 'failed to import link ' + self._getPrettyLink(link))
+
     def _getPrettyLink(self, link):
            return link.typeName + ' link: ' + link.source + '->' + link.target
 
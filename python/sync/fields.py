@@ -1,64 +1,80 @@
-import time
-import sys
-from sync.states import get_command_for_state_change, get_event
-from youtrack import YouTrackException
+from sync.changes import ChangeFeed
+from sync.states import get_event, get_transition
+from sync.users import UserSynchronizer
 
 PRIORITY_MAPPING= {'0':'Show-stopper', '1':'Critical', '2':'Major', '3':'Normal', '4':'Minor'}
 
-def get_issue_changes(yt, issue_id, start=None, finish=None):
-     result = yt.get_changes_for_issue(issue_id)
-     after_ms = get_in_milliseconds(start) if start else 0
-     before_ms = get_in_milliseconds(finish) if finish else sys.maxint
-     new_changes = []
-     for change in result:
-         change_time = change['updated']
-         if (change_time > after_ms) and (change_time < before_ms):
-             new_changes.append(change)
-     return new_changes
-
-def get_in_milliseconds(_datetime):
-    return int(round(1e+3*time.mktime(_datetime.timetuple()) + 1e-3*_datetime.microsecond))
+def _updated(issue, issue_id):
+    return getattr(issue, 'updated', None) if issue is not None and issue.id == issue_id else None
 
 class AsymmetricFieldsSynchronizer(object):
-    def __init__(self, master, slave, master_executor, slave_executor, fields_to_sync):
+    def __init__(self, master, slave, master_executor, slave_executor, fields_to_sync, master_history=None, slave_history=None, user_sync=None):
         self.master = master
         self.slave = slave
         self.executors = {master : master_executor, slave : slave_executor}
         self.fields_to_sync = fields_to_sync
+        self.master_feed = ChangeFeed(master, master_history)
+        self.slave_feed = ChangeFeed(slave, slave_history)
+        if user_sync is None:
+            user_sync = UserSynchronizer(master, slave, master_executor, slave_executor)
+        self.user_sync = user_sync
 
-    def syncFields(self, master_issue_id, slave_issue_id, last_run, current_run):
-        #sync fields
-        slave_changes = get_issue_changes(self.slave, slave_issue_id, last_run, current_run)
-        master_changes = get_issue_changes(self.master, master_issue_id, last_run, current_run)
+    def syncFields(self, master_issue_id, slave_issue_id, last_run, current_run, master_issue=None, slave_issue=None):
+        #sync fields, history is requested only for issues updated since it was seen
+        slave_changes = self.slave_feed.changes(slave_issue_id, last_run, current_run, _updated(slave_issue, slave_issue_id))
+        master_changes = self.master_feed.changes(master_issue_id, last_run, current_run, _updated(master_issue, master_issue_id))
         #field changes made in master should rewrite any field changes in slave
         changed_fields = self._apply_changes_to_issue(self.slave, self.master, slave_issue_id, master_changes)
         self._apply_changes_to_issue(self.master, self.slave, master_issue_id, slave_changes, fields_to_ignore=changed_fields)
 
     def _apply_changes_to_issue(self, to_yt, from_yt, issue_id, changes, fields_to_ignore=None):
+        """ Changes are queued, so that the final value of every field is applied at once """
         if not fields_to_ignore: fields_to_ignore = []
         changed_fields = set()
+        state_chain = {}
         for change in changes:
-            command, run_as = self._convert_change_to_command(issue_id, change, changed_fields, fields_to_ignore, from_yt, to_yt)
-            self.executors[to_yt].executeCommand(issue_id, command, run_as=run_as)
+            self._queue_change(issue_id, change, changed_fields, fields_to_ignore, from_yt, to_yt, state_chain)
+        self.executors[to_yt].flush(issue_id)
         return changed_fields
 
-    def _convert_change_to_command(self, issue_id, change, changed_fields, fields_to_ignore, from_yt, to_yt):
+    def _queue_change(self, issue_id, change, changed_fields, fields_to_ignore, from_yt, to_yt, state_chain):
         run_as = change.updater_name
-        self._try_to_sync_user(to_yt, from_yt, run_as)
-        command = ''
+        self.user_sync.syncUser(to_yt, from_yt, run_as)
+        executor = self.executors[to_yt]
         for field in change.fields:
             field_name = field.name.lower()
             if field.name != 'links' and field_name in self.fields_to_sync and field_name not in fields_to_ignore:
                 try:
-                    command += self._create_command(field, field_name, to_yt == self.master)
+                    if to_yt == self.master and field_name == 'state':
+                        self._queue_state_change(executor, issue_id, field, run_as, state_chain)
+                    else:
+                        command = self.get_command_set_value_to_field(field_name, field.new_value)
+                        if command != '':
+                            executor.queueCommand(issue_id, field_name, command, run_as)
                     changed_fields.add(field_name)
                 except Exception, error:
-                    self.executors[to_yt].getLogger().logError(error, issue_id, to_yt, error.message)
-        return command, run_as
+                    executor.getLogger().logError(error, issue_id, to_yt, error.message)
 
-    def _create_command(self, field, field_name, in_master):
-        new_value = [get_event(field)] if in_master and field_name == 'state' else field.new_value
-        return self.get_command_set_value_to_field(field_name, new_value)
+    def _queue_state_change(self, executor, issue_id, field, run_as, state_chain):
+        """ State of master is changed by events of its state machine. Events of consecutive
+            changes are replaced by one from the state before the first of them to the final one,
+            or by none when the state comes back.
+        """
+        new = field.new_value[0] if len(field.new_value) == 1 else None
+        first = state_chain.get('from')
+        if first is not None and new:
+            if first == new:
+                executor.queueCommand(issue_id, 'state', '', run_as)
+                return
+            event = get_transition(first, new)
+            if event:
+                executor.queueCommand(issue_id, 'state', 'state ' + event, run_as)
+                return
+            # no shortcut, states before this change have to be reached first
+            executor.flush(issue_id)
+            del state_chain['from']
+        executor.queueCommand(issue_id, 'state', 'state ' + get_event(field), run_as)
+        state_chain['from'] = field.old_value[0]
 
     def get_command_set_value_to_field(self, field_name, new_value):
         command = ""
@@ -68,10 +84,3 @@ class AsymmetricFieldsSynchronizer(object):
                     new_field_value = PRIORITY_MAPPING[new_field_value]
                 command += field_name + " " + new_field_value + " "
         return command
-
-    def _try_to_sync_user(self, to_yt, from_yt, login):
-        try:
-            to_yt.getUser(login)
-        except YouTrackException:
-            user_to_import = from_yt.getUser(login)
-            self.executors[to_yt].executeUserImport(user_to_import)
@@ -1,22 +1,27 @@
 import time
 from sync.comments import CommentSynchronizer
 from sync.fields import AsymmetricFieldsSynchronizer
+from sync.users import UserSynchronizer
+from youtrack import Issue
 
 class AsymmetricIssueMerger(object):
-    def __init__(self, master, slave, master_executor, slave_executor, issue_binder, link_synchronizer, fields_to_sync, last_run, current_run, project_id):
+    def __init__(self, master, slave, master_executor, slave_executor, issue_binder, link_synchronizer, fields_to_sync, last_run, current_run, project_id, master_history=None, slave_history=None, comment_index=None, user_caches=None):
         self.master = master
         self.slave = slave
         self.master_executor = master_executor
         self.slave_executor = slave_executor
         self.last_run = last_run
         self.current_run = current_run
-        self.comment_sync = CommentSynchronizer(master, slave, master_executor, slave_executor)
-        self.field_sync = AsymmetricFieldsSynchronizer(master, slave, master_executor, slave_executor, fields_to_sync)
+        master_users, slave_users = user_caches if user_caches else (None, None)
+        # one cache of known users for comments and changes
+        self.user_sync = UserSynchronizer(master, slave, master_executor, slave_executor, master_users, slave_users)
+        self.comment_sync = CommentSynchronizer(master, slave, master_executor, slave_executor, comment_index, self.user_sync)
+        self.field_sync = AsymmetricFieldsSynchronizer(master, slave, master_executor, slave_executor, fields_to_sync, master_history, slave_history, self.user_sync)
         self.issue_binder = issue_binder
         self.link_synchronizer = link_synchronizer
         self.project_id = project_id
 
-    def sync(self, master_issue_id, slave_issue_id):
+    def sync(self, master_issue_id, slave_issue_id, master_issue=None, slave_issue=None):
         _master_issue_id = master_issue_id
         _slave_issue_id =  slave_issue_id
         _result = None
@@ -27,26 +32,37 @@ class AsymmetricIssueMerger(object):
             elif not slave_issue_id and master_issue_id:
                 _slave_issue_id = self.issue_binder.masterIssueIdToSlaveIssueId(master_issue_id)
                 _result = _slave_issue_id
-            self._sync(_master_issue_id, _slave_issue_id, self.last_run, self.current_run)
+            self._sync(_master_issue_id, _slave_issue_id, self.last_run, self.current_run, master_issue, slave_issue)
         except KeyError, error:
             print error
         return _result
 
-    def _sync(self, master_issue_id, slave_issue_id, last_run, current_run):
-        self.field_sync.syncFields(master_issue_id, slave_issue_id, last_run, current_run)
-        self.comment_sync.syncComments(master_issue_id, slave_issue_id)
+    def _sync(self, master_issue_id, slave_issue_id, last_run, current_run, master_issue=None, slave_issue=None):
+        self.field_sync.syncFields(master_issue_id, slave_issue_id, last_run, current_run, master_issue, slave_issue)
+        self.comment_sync.syncComments(master_issue_id, slave_issue_id, master_issue, slave_issue)
         self.link_synchronizer.collectLinksToSyncById(master_issue_id, slave_issue_id)
 
+    def _created_issue(self, yt, issue_id):
+        # just created issue has no comments, there is no need to request them
+        issue = Issue(None, yt)
+        issue.id = issue_id
+        issue.comments = []
+        return issue
+
     def clone_issue_to_master(self, issue_from):
         safe_summary = issue_from.summary if hasattr(issue_from, 'summary') else ''
         safe_description = issue_from.description if hasattr(issue_from, 'description') else ''
         created_issue_id = self.master_executor.createIssue(self.project_id, safe_summary, safe_description, issue_from.id)
-        if created_issue_id: self._sync(created_issue_id, issue_from.id, None, self.current_run)
+        if created_issue_id:
+            self._sync(created_issue_id, issue_from.id, None, self.current_run,
+                self._created_issue(self.master, created_issue_id), issue_from)
         return created_issue_id
 
     def clone_issue_to_slave(self, issue_from):
         safe_summary = issue_from.summary if hasattr(issue_from, 'summary') else ''
         safe_description = issue_from.description if hasattr(issue_from, 'description') else ''
         created_issue_id = self.slave_executor.createIssue(self.project_id, safe_summary, safe_description, issue_from.id)
-        if created_issue_id: self._sync(issue_from.id, created_issue_id, None, self.current_run)
+        if created_issue_id:
+            self._sync(issue_from.id, created_issue_id, None, self.current_run,
+                issue_from, self._created_issue(self.slave, created_issue_id))
         return created_issue_id
\ No newline at end of file
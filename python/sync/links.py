@@ -1,4 +1,6 @@
 import copy
+import threading
+from youtrack.compact import compact
 
 class LinkImporter(object):
     def __init__(self, target, project_id=None, query=None):
@@ -47,7 +49,8 @@ class LinkImporter(object):
         self.created_issue_ids.add(issue.id)
 
     def collectLinks(self, links):
-        self.links += links
+        # links of all imported projects are kept until the end, records take much less memory
+        self.links += [compact(link) for link in links]
 
     def importLinks(self, links):
         maxLinks = 100
@@ -88,6 +91,7 @@ class LinkSynchronizer(object):
         self.masterExecutor = master_executor
         self.master_links = []
         self.slave_links = []
+        self._lock = threading.Lock()
 
     def collectLinksToSyncById(self, master_issue_id, slave_issue_id):
 
@@ -97,8 +101,10 @@ class LinkSynchronizer(object):
         to_master_links = set([self._convertSlaveLinkForMaster(link) for link in slave_links if self.check_slave_link(link)]) - set(master_links)
         to_slave_links = set([self._convertMasterLinkForSlave(link) for link in master_links if self.check_master_link(link)]) - set(slave_links)
 
-        self.master_links += to_master_links
-        self.slave_links += to_slave_links
+        # links of every synchronized issue are kept until the end of the run
+        with self._lock:
+            self.master_links += [compact(link) for link in to_master_links]
+            self.slave_links += [compact(link) for link in to_slave_links]
 
     def _convertSlaveLinkForMaster(self, slave_link):
         link_copy = copy.copy(slave_link)
@@ -130,6 +136,8 @@ class IssueBinder(object):
         self.m_to_s = {}
         for s_id , m_id in s_to_m.items():
             self.m_to_s[m_id] = s_id
+        # both maps change together when issues are synchronized concurrently
+        self._lock = threading.Lock()
 
     def slaveIssueIdToMasterIssueId(self, slave_issue_id):
         return unicode(self.s_to_m[str(slave_issue_id)])
@@ -138,14 +146,16 @@ class IssueBinder(object):
         return unicode(self.m_to_s[str(master_issue_id)])
 
     def addBinding(self, master_id, slave_id):
-        self.s_to_m[slave_id] = master_id
-        self.m_to_s[master_id] = slave_id
+        with self._lock:
+            self.s_to_m[slave_id] = master_id
+            self.m_to_s[master_id] = slave_id
 
     def getPermittedMasterIds(self):
-        return self.m_to_s.keys()
+        # view checks ids in constant time, keys() would be a list
+        return self.m_to_s.viewkeys()
 
     def getPermittedSlaveIds(self):
-        return self.s_to_m.keys()
+        return self.s_to_m.viewkeys()
 
     def checkSlaveId(self, id):
         return self.s_to_m.has_key(id)
@@ -1,3 +1,9 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
 from datetime import datetime
 
 LOGGING = True
@@ -6,44 +12,189 @@ error_file_name_format = 'error_%d_%m_%Y'
 MASTER_NAME = "Master"
 SLAVE_NAME = "Slave"
 UNDEFINED = "Undefined"
+MAX_LOG_SIZE = 50 * 1024 * 1024
+LOG_BACKUPS = 5
+# seconds between writes of queued records
+WRITE_INTERVAL = 0.1
+# records waiting for the writer, callers wait when there are more
+MAX_QUEUED_RECORDS = 100000
+
+
+def _utf8(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    try:
+        return str(value)
+    except UnicodeError:
+        return unicode(value).encode('utf-8')
+
+
+def _text(value):
+    return value.decode('utf-8', 'replace') if isinstance(value, str) else value
+
+
+class _RotatingFile(object):
+    """ File in the directory named by date with name_format, moved to name.1,
+        name.2 ... when it grows over max_bytes
+    """
+
+    def __init__(self, name_format, max_bytes, backups, directory=''):
+        self.name_format = name_format
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.directory = directory
+        self.file = None
+        self._open(self._name())
+
+    def _name(self):
+        return os.path.join(self.directory, datetime.now().strftime(self.name_format))
+
+    def _open(self, name):
+        if self.file is not None:
+            self.file.close()
+        self.file = open(name, 'a')
+        self.size = os.fstat(self.file.fileno()).st_size
+
+    def write(self, lines):
+        name = self._name()
+        if name != self.file.name:
+            self._open(name)
+        start = 0
+        for i, line in enumerate(lines):
+            self.size += len(line)
+            if self.max_bytes and self.size > self.max_bytes:
+                self.file.writelines(lines[start:i + 1])
+                self.rotate()
+                start = i + 1
+        self.file.writelines(lines[start:])
+        self.file.flush()
+
+    def rotate(self):
+        name = self.file.name
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists('%s.%d' % (name, i)):
+                os.rename('%s.%d' % (name, i), '%s.%d' % (name, i + 1))
+        if self.backups:
+            os.rename(name, name + '.1')
+        else:
+            os.remove(name)
+        self.file = None
+        self._open(name)
+
+    def close(self):
+        self.file.close()
+
 
 class Logger(object):
-    def __init__(self, master, slave, master_root_login, slave_root_login):
-        today = datetime.now()
-        self.log_file = open(today.strftime(log_file_name_format), 'w')
-        self.error_file = open(today.strftime(error_file_name_format), 'w')
+    """ Records are queued by the caller and written by a background thread as
+        JSON lines, errors go to the error file too. Logging doesn't wait for
+        the files or the console, finalize writes what is left. When the writer
+        falls behind by max_queued records, callers wait for it, no record is lost.
+    """
+
+    def __init__(self, master, slave, master_root_login, slave_root_login, max_bytes=MAX_LOG_SIZE, backups=LOG_BACKUPS,
+                 directory='', max_queued=MAX_QUEUED_RECORDS):
+        self._log = _RotatingFile(log_file_name_format, max_bytes, backups, directory)
+        self._errors = _RotatingFile(error_file_name_format, max_bytes, backups, directory)
         self.master = master
         self.slave = slave
         self.master_root_login = master_root_login
         self.slave_root_login = slave_root_login
+        # appending to deque is thread safe and doesn't take a lock
+        self._queue = deque()
+        self.max_queued = max_queued
+        self._drained = threading.Event()
+        self._wake = threading.Event()
+        self._second = None
+        self._stopped = threading.Event()
+        self._writer = threading.Thread(target=self._write_records, name='sync-logger')
+        self._writer.daemon = True
+        self._writer.start()
 
+    @property
+    def log_file(self):
+        return self._log.file
+
+    @property
+    def error_file(self):
+        return self._errors.file
 
     def logAction(self, action_name, yt, message, run_as=None):
-        line = self._prepare_line(action_name, yt, message, run_as)
-        print line
-        try:
-            if LOGGING: self.log_file.write(str(line) + '\n')
-        except UnicodeError, e:
-            print e
+        self._put(self._record('action', action_name, yt, message, run_as))
 
     def logError(self, error, action_name, yt, message, run_as=None):
         if LOGGING:
-            line = self._prepare_line(action_name, yt, message, run_as)
-            try:
-                self.log_file.write(str(line) + '\n')
-                self.error_file.write(str(line) + '\n')
-                self.error_file.write(str(error) + '\n')
-                self.error_file.write('---------------------------------------------------------\n')
-                print line
-                print error
-            except UnicodeError, e:
-                print e
+            self._put(self._record('error', action_name, yt, message, run_as, error))
+
+    def _put(self, record):
+        while len(self._queue) >= self.max_queued and self._writer.is_alive():
+            self._drained.clear()
+            self._wake.set()
+            self._drained.wait(WRITE_INTERVAL)
+        self._queue.append(record)
 
     def finalize(self):
-        self.log_file.close()
-        self.error_file.close()
+        self._stopped.set()
+        self._wake.set()
+        self._writer.join()
+        self._log.close()
+        self._errors.close()
 
-    def _prepare_line(self, action_name, yt, message, run_as):
-        yt_name = UNDEFINED if None else MASTER_NAME if yt == self.master else SLAVE_NAME
+    def _record(self, level, action_name, yt, message, run_as, error=None):
+        yt_name = UNDEFINED if yt is None else MASTER_NAME if yt == self.master else SLAVE_NAME
         user_login = (self.master_root_login if yt == self.master else self.slave_root_login) if run_as is None else run_as
-        return '[Sync, ' + action_name + ' in ' + yt_name + '] ' + message + ' on behalf of ' + user_login
\ No newline at end of file
+        return level, time.time(), action_name, yt_name, message, user_login, error
+
+    def _write_records(self):
+        while True:
+            # callers waiting for the full queue wake the writer up
+            self._wake.wait(WRITE_INTERVAL)
+            self._wake.clear()
+            stopped = self._stopped.is_set()
+            records = []
+            while self._queue:
+                records.append(self._queue.popleft())
+            self._drained.set()
+            if len(records):
+                try:
+                    self._write(records)
+                except Exception, e:
+                    # losing lines is better than stopping the writer
+                    sys.stderr.write('Sync logger lost %d records: %s\n' % (len(records), _utf8(e)))
+            if stopped:
+                return
+
+    def _write(self, records):
+        console = []
+        lines = []
+        errors = []
+        for level, logged, action_name, yt_name, message, user_login, error in records:
+            action_name, message, user_login = _utf8(action_name), _utf8(message), _utf8(user_login)
+            console.append('[Sync, ' + action_name + ' in ' + yt_name + '] ' + message + ' on behalf of ' + user_login)
+            record = {'time': self._time(logged), 'level': level, 'action': action_name, 'youtrack': yt_name,
+                      'message': message, 'run_as': user_login}
+            if level == 'error':
+                record['error'] = _utf8(error) if error is not None else None
+                console.append(_utf8(error))
+            try:
+                line = json.dumps(record) + '\n'
+            except UnicodeDecodeError:
+                line = json.dumps(dict((key, _text(value)) for key, value in record.items())) + '\n'
+            lines.append(line)
+            if level == 'error':
+                errors.append(line)
+        sys.stdout.write('\n'.join(console) + '\n')
+        if LOGGING:
+            self._log.write(lines)
+            if len(errors):
+                self._errors.write(errors)
+
+    def _time(self, logged):
+        second = int(logged)
+        if second != self._second:
+            self._second = second
+            self._second_text = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(second))
+        return '%s.%06d' % (self._second_text, (logged - second) * 1000000)
@@ -0,0 +1,152 @@
+from __future__ import absolute_import
+import heapq
+import json
+import threading
+import time
+from sync.users import UserCache
+from youtrack.connection import Connection
+from youtrack.ratelimit import RateLimiter
+
+
+class YouTrackPool(object):
+    """ Connections, rate limiters and known users of YouTrack servers shared by
+        several syncs. All requests to a server from all syncs go through one
+        RateLimiter, rates maps urls to rates of RateLimiter. Known users are
+        saved in user_cache_file_name by url. Failed requests of all connections
+        are repeated by retry_policy, without it they are not.
+    """
+
+    def __init__(self, rates=None, user_cache_file_name=None, retry_policy=None):
+        self.rates = dict((url.rstrip('/'), url_rates) for url, url_rates in (rates or {}).items())
+        self.user_cache_file_name = user_cache_file_name
+        self.retry_policy = retry_policy
+        self._limiters = {}
+        self._connections = {}
+        self._user_caches = {}
+        self._lock = threading.Lock()
+        if user_cache_file_name is not None:
+            try:
+                with open(user_cache_file_name, 'r') as cache_file:
+                    for url, entries in json.load(cache_file).items():
+                        self._user_caches[url] = UserCache(entries)
+            except IOError:
+                pass
+
+    def limiter(self, url):
+        url = url.rstrip('/')
+        with self._lock:
+            if url not in self._limiters:
+                self._limiters[url] = RateLimiter(self.rates.get(url))
+            return self._limiters[url]
+
+    def connect(self, url, login, password, role):
+        """ Connection of the login to the url, shared by syncs in which the server
+            has the same role. Master and slave of a sync are different connections
+            even for the same server, they are told apart by identity.
+        """
+        key = (url.rstrip('/'), login, role)
+        limiter = self.limiter(url)
+        with self._lock:
+            if key not in self._connections:
+                self._connections[key] = Connection(url, login, password, retry_policy=self.retry_policy,
+                                                    rate_limiter=limiter)
+            return self._connections[key]
+
+    def userCache(self, url):
+        url = url.rstrip('/')
+        with self._lock:
+            if url not in self._user_caches:
+                self._user_caches[url] = UserCache()
+            return self._user_caches[url]
+
+    def save(self):
+        if self.user_cache_file_name is None:
+            return
+        with self._lock:
+            entries = dict((url, cache.entries()) for url, cache in self._user_caches.items())
+            with open(self.user_cache_file_name, 'w') as cache_file:
+                json.dump(entries, cache_file)
+
+
+class SyncScheduler(object):
+    """ Runs SyncDaemons on a bounded number of threads. A daemon runs again
+        its poll_interval after its previous run, or once if poll_interval is
+        None, and never twice at once. When more daemons are due than there
+        are threads, the one which waits longest goes first.
+    """
+
+    def __init__(self, daemons, workers):
+        self.daemons = daemons
+        self.workers = workers
+        self._due = [(0, i, daemon) for i, daemon in enumerate(daemons)]
+        self._sequence = len(daemons)
+        self._running = 0
+        self._triggered = 0
+        self._stopped = False
+        self._condition = threading.Condition()
+
+    def trigger(self):
+        """ Makes all daemons due now, running ones run again when they finish """
+        with self._condition:
+            self._triggered = time.time()
+            self._due = [(0, sequence, daemon) for due, sequence, daemon in self._due]
+            heapq.heapify(self._due)
+            self._condition.notify_all()
+
+    def stop(self):
+        """ Stops after the current runs """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def serve(self):
+        threads = [threading.Thread(target=self._work, name='sync-%d' % i)
+                   for i in range(min(self.workers, len(self.daemons)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            # joined with timeout, so that signals are handled meanwhile
+            while thread.is_alive():
+                thread.join(0.5)
+
+    def _work(self):
+        while True:
+            daemon = self._next()
+            if daemon is None:
+                return
+            started = time.time()
+            try:
+                daemon.runOnce()
+            finally:
+                self._done(daemon, started)
+
+    def _next(self):
+        with self._condition:
+            while not self._stopped:
+                wait = None
+                if len(self._due):
+                    due, sequence, daemon = self._due[0]
+                    wait = due - time.time()
+                    if wait <= 0:
+                        heapq.heappop(self._due)
+                        self._running += 1
+                        return daemon
+                elif not self._running:
+                    # every daemon ran once and none runs again
+                    return None
+                self._condition.wait(wait)
+            return None
+
+    def _done(self, daemon, started):
+        with self._condition:
+            self._running -= 1
+            if self._triggered > started:
+                self._push(0, daemon)
+            elif daemon.poll_interval is not None:
+                self._push(time.time() + daemon.poll_interval, daemon)
+            self._condition.notify_all()
+
+    def _push(self, due, daemon):
+        self._sequence += 1
+        heapq.heappush(self._due, (due, self._sequence, daemon))
@@ -64,11 +64,15 @@ advanced_state_machine = {
     "Wait for Reply -> Invalid" : inv
 }
 
+def get_transition(old, new):
+    """ Event moving an issue from old to new state, None if there is no such transition """
+    return advanced_state_machine.get(old + ' -> ' + new)
+
 def get_event(field):
     old = field.old_value[0] if len(field.old_value) == 1 else None
     new = field.new_value[0] if len(field.new_value) == 1 else None
     if not old or not new : raise ValueError('State can not have multiple value')
-    event = advanced_state_machine.get(old + ' -> ' + new)
+    event = get_transition(old, new)
     if not event: raise LookupError("failed to apply change: State:" + old + "->" + new + " - state machine doesn't allow this transition")
     return event
 
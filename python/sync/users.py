@@ -1,6 +1,12 @@
+from __future__ import absolute_import
+import json
+import threading
+import time
 import youtrack
 
 PROHIBITED = '/'
+USER_TTL = 24 * 3600
+MISSING_USER_TTL = 3600
 
 def utf8encode(source):
     if isinstance(source, unicode):
@@ -113,3 +119,79 @@ class UserImporter(object):
         failed = 1 in [c in login for c in PROHIBITED]
         if failed: print "Could not import user [" + login + "], login contains prohibited chars: " + PROHIBITED
         return not failed
+
+
+class UserCache(object):
+    """ Logins known to exist in a YouTrack, or to be missing there and not
+        importable. Entries expire after ttl and missing_ttl seconds.
+    """
+
+    def __init__(self, entries=None, ttl=USER_TTL, missing_ttl=MISSING_USER_TTL):
+        # login -> [exists, time of check]
+        self._entries = dict(entries) if entries else {}
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self._lock = threading.Lock()
+
+    def get(self, login):
+        """ True or False for known logins, None when the login should be checked """
+        with self._lock:
+            entry = self._entries.get(login)
+        if entry is None:
+            return None
+        exists, checked = entry
+        if time.time() - checked > (self.ttl if exists else self.missing_ttl):
+            return None
+        return exists
+
+    def put(self, login, exists):
+        with self._lock:
+            self._entries[login] = [exists, time.time()]
+
+    def entries(self):
+        with self._lock:
+            return dict(self._entries)
+
+
+def read_user_caches(file_name):
+    """ Master and slave caches saved by write_user_caches """
+    try:
+        with open(file_name, 'r') as cache_file:
+            caches = json.load(cache_file)
+        return UserCache(caches.get('master')), UserCache(caches.get('slave'))
+    except IOError:
+        return UserCache(), UserCache()
+
+
+def write_user_caches(file_name, master_cache, slave_cache):
+    with open(file_name, 'w') as cache_file:
+        json.dump({'master': master_cache.entries(), 'slave': slave_cache.entries()}, cache_file)
+
+
+class UserSynchronizer(object):
+    """ Imports authors of synchronized changes and comments missing in the other YouTrack """
+
+    def __init__(self, master, slave, master_executor, slave_executor, master_cache=None, slave_cache=None):
+        self.executors = {master : master_executor, slave : slave_executor}
+        self.caches = {master : master_cache if master_cache is not None else UserCache(),
+                       slave : slave_cache if slave_cache is not None else UserCache()}
+
+    def syncUser(self, to_yt, from_yt, login):
+        cache = self.caches[to_yt]
+        known = cache.get(login)
+        if known is not None:
+            return
+        try:
+            to_yt.getUser(login)
+            cache.put(login, True)
+            return
+        except youtrack.YouTrackException:
+            pass
+        try:
+            user_to_import = from_yt.getUser(login)
+        except youtrack.YouTrackException, e:
+            self.executors[to_yt].getLogger().logError(e, 'Import user', to_yt,
+                                                       'failed to import user: \"' + utf8encode(login) + '\" - could not find in opposite youtrack')
+            cache.put(login, False)
+            return
+        cache.put(login, bool(self.executors[to_yt].executeUserImport(user_to_import)))
@@ -1,8 +1,11 @@
+from datetime import timedelta
+from multiprocessing.pool import ThreadPool
 from sync.executing import SafeCommandExecutor
 from sync.issues import AsymmetricIssueMerger
 from sync.links import LinkSynchronizer
+from youtrack import YouTrackException
 
-query_time_format = '%m-%dT%H:%M:%S'
+query_time_format = '%Y-%m-%dT%H:%M:%S'
 batch = 100
 tag = "sync"
 master_sync_field_name = 'Sync with'
@@ -12,10 +15,18 @@ def get_formatted_for_query(_datetime):
     return _datetime.strftime(query_time_format)
 
 def get_advanced_query(query, _last_run, _current_run):
-    return query + ' updated: ' + get_formatted_for_query(_last_run) + " .. " + get_formatted_for_query(_current_run)
+    # query has 1 second accuracy, changes are filtered by exact time afterwards
+    return query + ' updated: ' + get_formatted_for_query(_last_run) + " .. " + get_formatted_for_query(_current_run + timedelta(seconds=1))
 
 class YouTrackSynchronizer(object):
-    def __init__(self, master, slave, logger, issue_binder, project_id, fields_to_sync, query, last_run=None, current_run=None):
+    def __init__(self, master, slave, logger, issue_binder, project_id, fields_to_sync, query, last_run=None, current_run=None, workers=1, change_history=None, comment_index=None, user_caches=None):
+        """ With workers > 1 updated issues are merged concurrently by that many threads,
+            every issue by one thread. Issues are still imported one by one.
+            change_history is a pair of master and slave histories of sync.changes.ChangeFeed
+            saved by the previous run, comment_index is sync.comments.CommentIndex,
+            user_caches is a pair of sync.users.UserCache of master and slave.
+        """
+        master_history, slave_history = change_history if change_history else (None, None)
         self.slave = None
         self.master = master
         self.slave = slave
@@ -27,8 +38,21 @@ class YouTrackSynchronizer(object):
         self.last_run = last_run
         self.current_run = current_run
         self.project_id = project_id
+        self.workers = workers
+        self._counterparts = {}
         self.link_synchronizer = LinkSynchronizer(self.master_executor, self.slave_executor, self.issue_binder)
-        self.issue_synchronizer = AsymmetricIssueMerger(master, slave, self.master_executor, self.slave_executor, self.issue_binder, self.link_synchronizer, fields_to_sync, last_run, current_run, project_id)
+        self.issue_synchronizer = AsymmetricIssueMerger(master, slave, self.master_executor, self.slave_executor, self.issue_binder, self.link_synchronizer, fields_to_sync, last_run, current_run, project_id, master_history, slave_history, comment_index, user_caches)
+
+    def getChangeFeeds(self):
+        field_sync = self.issue_synchronizer.field_sync
+        return field_sync.master_feed, field_sync.slave_feed
+
+    def getCommentIndex(self):
+        return self.issue_synchronizer.comment_sync.index
+
+    def getUserCaches(self):
+        caches = self.issue_synchronizer.user_sync.caches
+        return caches[self.master], caches[self.slave]
 
     def setDebugMode(self, on):
         self.master_executor.setDebugMode(on)
@@ -44,24 +68,25 @@ class YouTrackSynchronizer(object):
             log_header='[Sync, Importing new issues from slave to master]')
 
         #2. synchronize sync-issues in master which have no synchronized clone in slave
-        sync_set = set(self.issue_binder.s_to_m.values())
         imported_master_ids_set = self._apply_to_issues(self._get_tagged_in_master,
             self._import_to_slave,
-            excluded_ids=sync_set,
+            excluded_ids=self.issue_binder.m_to_s,
             log_header='[Sync, Importing new issues from master to slave]')
 
         #3. synchronize sync-issues updated in slave which have synchronized clone in master
         updated_slave_ids_set = self._apply_to_issues(self._get_updated_in_slave_from_last_run,
             self._sync_to_master,
             excluded_ids=imported_slave_ids_set,
-            log_header='[Sync, Merging sync issues updated in slave]')
+            log_header='[Sync, Merging sync issues updated in slave]',
+            prefetch=self._prefetch_master_counterparts, concurrent=True)
 
         #4. synchronize sync-issues updated in master which have synchronized clone in slave (if clone hasn't been updated)
         updated_master_ids_set = self._slave_ids_set_to_sync_ids_set(updated_slave_ids_set) | imported_master_ids_set
         self._apply_to_issues(self._get_updated_in_master_from_last_run,
             self._sync_to_slave,
             excluded_ids=updated_master_ids_set,
-            log_header='[Sync, Merging sync issues updated in master and unchanged in slave]')
+            log_header='[Sync, Merging sync issues updated in master and unchanged in slave]',
+            prefetch=self._prefetch_slave_counterparts, concurrent=True)
 
         #5. synchronize links
         self.link_synchronizer.syncCollectedLinks()
@@ -92,26 +117,62 @@ class YouTrackSynchronizer(object):
             self._mark_issues_as_sync(master_issue.numberInProject, master_issue.id, slave_issue_id)
 
     def _sync_to_master(self, slave_issue):
-        self.issue_synchronizer.sync(None, slave_issue.id)
+        master_issue = self._counterparts.get(self.issue_binder.s_to_m.get(str(slave_issue.id)))
+        self.issue_synchronizer.sync(None, slave_issue.id, master_issue, slave_issue)
 
     def _sync_to_slave(self, master_issue):
-        self.issue_synchronizer.sync(master_issue.id, None)
-
-    def _apply_to_issues(self, issues_getter, action, excluded_ids=None, log_header=''):
+        slave_issue = self._counterparts.get(self.issue_binder.m_to_s.get(str(master_issue.id)))
+        self.issue_synchronizer.sync(master_issue.id, None, master_issue, slave_issue)
+
+    def _prefetch_master_counterparts(self, slave_issues):
+        ids = [self.issue_binder.s_to_m[str(issue.id)] for issue in slave_issues
+               if self.issue_binder.checkSlaveId(str(issue.id))]
+        self._counterparts = self._get_issues_by_ids(self.master, ids)
+
+    def _prefetch_slave_counterparts(self, master_issues):
+        ids = [self.issue_binder.m_to_s[str(issue.id)] for issue in master_issues
+               if self.issue_binder.checkMasterId(str(issue.id))]
+        self._counterparts = self._get_issues_by_ids(self.slave, ids)
+
+    def _get_issues_by_ids(self, yt, ids):
+        # one request per batch instead of a comments request per issue
+        if not len(ids):
+            return {}
+        issues = yt.getIssues(self.project_id, 'issue id: ' + ', '.join(ids), 0, len(ids))
+        return dict((issue.id, issue) for issue in issues)
+
+    def _apply_to_issues(self, issues_getter, action, excluded_ids=None, log_header='', prefetch=None,
+                         concurrent=False):
         if not issues_getter or not action: return
         start = 0
         print log_header + ' started...'
         issues = issues_getter(start, batch)
         processed_issue_ids_set = set([])
-        while len(issues):
-            for issue in issues:
-                sync_id = str(issue.id)
-                if not (excluded_ids and sync_id in excluded_ids):
-                    action(issue)
-                    processed_issue_ids_set.add(sync_id)
-            print log_header + ' processed ' + str(start + len(issues)) + ' issues'
-            start += batch
-            issues = issues_getter(start, batch)
+        pool = ThreadPool(self.workers) if concurrent and self.workers > 1 else None
+        try:
+            while len(issues):
+                if prefetch:
+                    prefetch(issues)
+                to_process = []
+                for issue in issues:
+                    sync_id = str(issue.id)
+                    if not (excluded_ids and sync_id in excluded_ids):
+                        to_process.append(issue)
+                        processed_issue_ids_set.add(sync_id)
+                if pool is None:
+                    for issue in to_process:
+                        action(issue)
+                else:
+                    # the whole batch is merged before the next one replaces prefetched counterparts
+                    pool.map(action, to_process, 1)
+                print log_header + ' processed ' + str(start + len(issues)) + ' issues'
+                start += batch
+                issues = issues_getter(start, batch)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        self._counterparts = {}
         print log_header + ' action applied to ' + str(len(processed_issue_ids_set)) + ' issues'
         return processed_issue_ids_set
 
@@ -133,14 +194,20 @@ class YouTrackSynchronizer(object):
 
     def _mark_issues_as_sync(self, master_issue_number, master_issue_id, slave_issue_id):
         self.master_executor.executeCommand(master_issue_id, "tag " + tag)
-        self.slave_executor.executeCommand(slave_issue_id, "tag " + tag)
-        self.slave_executor.executeCommand(slave_issue_id, master_sync_field_name + " " + master_issue_number)
+        self.slave_executor.queueCommand(slave_issue_id, 'tag', "tag " + tag)
+        self.slave_executor.queueCommand(slave_issue_id, master_sync_field_name, master_sync_field_name + " " + master_issue_number)
+        self.slave_executor.flush(slave_issue_id)
         self.issue_binder.addBinding(master_issue_id, slave_issue_id)
 
     def _create_and_attach_sync_field(self, yt, project_id, sync_field_name):
         sync_field_created = any(field.name == sync_field_name for field in yt.getCustomFields())
         if not sync_field_created:
-            yt.createCustomFieldDetailed(sync_field_name, "integer", False, True)
+            try:
+                yt.createCustomFieldDetailed(sync_field_name, "integer", False, True)
+            except YouTrackException, e:
+                #created meanwhile by sync of another project in the same youtrack
+                if e.response.status != 409:
+                    raise
         sync_field_attached = any(field.name == sync_field_name for field in yt.getProjectCustomFields(project_id))
         if not sync_field_attached:
             yt.createProjectCustomFieldDetailed(project_id, sync_field_name, empty_field_text)
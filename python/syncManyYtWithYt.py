@@ -0,0 +1,97 @@
+import ConfigParser
+import os
+from sync.daemon import StatusServer, SyncDaemon, SyncStatus
+from sync.orchestrator import SyncScheduler, YouTrackPool
+from syncYtWithYt import SyncPair, default_max_retries, handle_signals, read_settings
+from youtrack.retry import RetryPolicy
+
+config_file_name = 'sync_pairs'
+user_cache_file_name = 'sync_users'
+section_name = 'Pairs'
+default_workers = 4
+
+def main():
+    config = ConfigParser.RawConfigParser()
+    try:
+        config.read(config_file_name)
+        pair_config_file_names = [name.strip() for name in config.get(section_name, 'configs').split(',')]
+        if config.has_option(section_name, 'workers'):
+            workers = config.getint(section_name, 'workers')
+        else:
+            workers = default_workers
+        if config.has_option(section_name, 'poll_interval'):
+            poll_interval = config.getfloat(section_name, 'poll_interval')
+        else:
+            poll_interval = None
+        if config.has_option(section_name, 'status_port'):
+            status_port = config.getint(section_name, 'status_port')
+        else:
+            status_port = None
+        if config.has_option(section_name, 'max_retries'):
+            max_retries = config.getint(section_name, 'max_retries')
+        else:
+            max_retries = default_max_retries
+        rates = read_rates(config)
+    except BaseException, e:
+        print e
+        return
+
+    youtracks = YouTrackPool(rates, user_cache_file_name, RetryPolicy(max_retries=max_retries))
+    pairs = read_pairs(pair_config_file_names, youtracks)
+    scheduler = make_scheduler(pairs, workers, poll_interval)
+    server = StatusServer(scheduler.daemons, status_port, trigger=scheduler.trigger).start() if status_port else None
+    handle_signals(scheduler)
+    try:
+        scheduler.serve()
+    finally:
+        if server is not None:
+            server.stop()
+        for pair in pairs:
+            pair.close()
+
+def read_pairs(pair_config_file_names, youtracks):
+    """ Pairs of the configs. A pair keeps sync map, histories and logs in the
+        directory of its config under fixed names, so every config has to be in
+        a directory of its own, configs in a directory taken by another one are skipped.
+    """
+    pairs = []
+    directories = {}
+    for pair_config_file_name in pair_config_file_names:
+        directory = os.path.dirname(os.path.abspath(pair_config_file_name))
+        if directory in directories:
+            print "skipped %s, its directory is used by %s" % (pair_config_file_name, directories[directory])
+            continue
+        pair_config = ConfigParser.RawConfigParser()
+        pair_config.read(pair_config_file_name)
+        settings = read_settings(pair_config)
+        if settings is None:
+            print "skipped " + pair_config_file_name
+            continue
+        try:
+            pairs.append(SyncPair(pair_config_file_name, pair_config, settings, youtracks))
+        except BaseException, e:
+            print e
+            print "skipped " + pair_config_file_name
+            continue
+        directories[directory] = pair_config_file_name
+    return pairs
+
+def read_rates(config):
+    """ Requests per second by request class of RateLimiter, in a section named by url of YouTrack """
+    rates = {}
+    for url in config.sections():
+        if url != section_name:
+            rates[url] = dict((name, config.getfloat(url, name)) for name in config.options(url))
+    return rates
+
+def make_scheduler(pairs, workers, poll_interval=None):
+    """ Scheduler of the pairs, which run every poll_interval seconds unless their
+        configs say otherwise, or once without it
+    """
+    daemons = [SyncDaemon(pair.run, pair.settings['poll_interval'] or poll_interval,
+                          SyncStatus(os.path.relpath(pair.config_file_name)))
+               for pair in pairs]
+    return SyncScheduler(daemons, workers)
+
+if __name__ == "__main__":
+    main()
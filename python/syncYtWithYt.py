@@ -1,9 +1,17 @@
 #import sys
+import os
+import signal
+from sync.bindings import SqliteIssueBinder
+from sync.changes import read_history, write_history
+from sync.comments import read_comment_index, write_comment_index
+from sync.daemon import StatusServer, SyncDaemon, SyncStatus
 from sync.links import IssueBinder
 from sync.logging import Logger
+from sync.users import read_user_caches, write_user_caches
 from sync.youtracks import YouTrackSynchronizer
 from youtrack import YouTrackException
 from youtrack.connection import Connection
+from youtrack.retry import RetryPolicy
 from youtrack2youtrack import youtrack2youtrack
 from datetime import datetime
 from datetime import timedelta
@@ -11,9 +19,14 @@ import ConfigParser
 import csv
 
 sync_map_file_name = 'sync_map'
+change_history_file_name = 'sync_changes'
+comment_index_file_name = 'sync_comments'
+user_cache_file_name = 'sync_users'
 config_file_name = 'sync_config'
 config_time_format = '%Y-%m-%d %H:%M:%S:%f'
 default_last_run = datetime(2012, 1, 1)
+#failed requests of sync are repeated unless the config says otherwise
+default_max_retries = 4
 section_name = 'Synchronization'
 csv.register_dialect('mapper', delimiter=':', quoting=csv.QUOTE_NONE)
 
@@ -26,126 +39,271 @@ def main():
 #        return
 
     config = ConfigParser.RawConfigParser()
+    config.read(config_file_name)
+    settings = read_settings(config)
+    if settings is None:
+        return
+
     try:
-        config.read(config_file_name)
-        master_url = config.get(section_name, 'master_url')
-        master_root_login = config.get(section_name, 'master_root_login')
-        master_root_password = config.get(section_name, 'master_root_password')
-        slave_url = config.get(section_name, 'slave_url')
-        slave_root_login = config.get(section_name, 'slave_root_login')
-        slave_root_password = config.get(section_name, 'slave_root_password')
-        project_id = config.get(section_name, 'project_id')
-        query = config.get(section_name, 'query')
-        fields_to_sync = [field.strip() for field in config.get(section_name, 'fields_to_sync').split(',')]
+        pair = SyncPair(config_file_name, config, settings)
     except BaseException, e:
         print e
         return
 
+    if settings['poll_interval']:
+        run_daemon(pair, settings['poll_interval'], settings['status_port'])
+        return
+
+    try:
+        pair.run()
+    except BaseException, e:
+            print e
+    finally:
+        pair.close()
+
+def read_settings(config):
+    """ Options of the config, None when they are wrong """
+    settings = {}
+    try:
+        for option in ('master_url', 'master_root_login', 'master_root_password',
+                       'slave_url', 'slave_root_login', 'slave_root_password', 'project_id', 'query'):
+            settings[option] = config.get(section_name, option)
+        settings['fields_to_sync'] = [field.strip() for field in config.get(section_name, 'fields_to_sync').split(',')]
+    except BaseException, e:
+        print e
+        return None
+
     try:
         last_run_str = config.get(section_name, 'last_run')
-        last_run = datetime.strptime(last_run_str, config_time_format)
+        settings['last_run'] = datetime.strptime(last_run_str, config_time_format)
     except BaseException:
-        last_run = default_last_run
+        settings['last_run'] = default_last_run
 
     try:
         if config.has_option(section_name, 'debug_mode'):
-            debug_mode = config.getboolean(section_name, 'debug_mode')
+            settings['debug_mode'] = config.getboolean(section_name, 'debug_mode')
         else:
-            debug_mode = False
+            settings['debug_mode'] = False
     except BaseException, e:
         print e
         print "debug_mode parameter should be set to 'True' or 'False'"
-        return
+        return None
 
     try:
-        slave_to_master_map = read_sync_map()
+        if config.has_option(section_name, 'workers'):
+            settings['workers'] = config.getint(section_name, 'workers')
+        else:
+            settings['workers'] = 1
     except BaseException, e:
         print e
-        return
+        print "workers parameter should be a number of threads merging issues"
+        return None
 
     try:
-        sync(master_url,
-            master_root_login,
-            master_root_password,
-            slave_url,
-            slave_root_login,
-            slave_root_password,
-            project_id,
-            query,
-            fields_to_sync,
-            slave_to_master_map,
-            last_run,
-            debug_mode)
+        if config.has_option(section_name, 'max_retries'):
+            settings['max_retries'] = config.getint(section_name, 'max_retries')
+        else:
+            settings['max_retries'] = default_max_retries
+    except BaseException, e:
+        print e
+        print "max_retries parameter should be a number of times a failed request is repeated"
+        return None
 
-        #query time format has 1 second accuracy, so set last run value
-        #as current time shifted by the 1 second forward to avoid
-        #applying of changes done by the previous script launch
-        last_run = datetime.now() + timedelta(seconds=1)
-        config.set(section_name, 'last_run', last_run.strftime(config_time_format))
-        with open(config_file_name, 'wb') as configfile:
-            config.write(configfile)
+    if config.has_option(section_name, 'sync_map_db'):
+        settings['sync_map_db'] = config.get(section_name, 'sync_map_db')
+    else:
+        settings['sync_map_db'] = None
 
+    try:
+        if config.has_option(section_name, 'poll_interval'):
+            settings['poll_interval'] = config.getfloat(section_name, 'poll_interval')
+        else:
+            settings['poll_interval'] = None
+        if config.has_option(section_name, 'status_port'):
+            settings['status_port'] = config.getint(section_name, 'status_port')
+        else:
+            settings['status_port'] = None
     except BaseException, e:
-            print e
+        print e
+        print "poll_interval should be a number of seconds between syncs and status_port a port number"
+        return None
+
+    return settings
 
-def read_sync_map():
+def write_config(config, file_name):
+    """ Replaces the config file at once, so that it is never left half written """
+    temporary_file_name = file_name + '.tmp'
+    with open(temporary_file_name, 'wb') as config_file:
+        config.write(config_file)
+        config_file.flush()
+        os.fsync(config_file.fileno())
     try:
-        with open(sync_map_file_name, 'r') as sync_map_file:
+        os.rename(temporary_file_name, file_name)
+    except OSError:
+        #rename doesn't replace files on Windows
+        os.remove(file_name)
+        os.rename(temporary_file_name, file_name)
+
+def read_sync_map(file_name=sync_map_file_name):
+    try:
+        with open(file_name, 'r') as sync_map_file:
             reader = csv.reader(sync_map_file, 'mapper')
             result = {}
             for row in reader:
               result[row[0]] = row[1]
             return result
     except IOError:
-        with open(sync_map_file_name, 'w') as sync_map_file:
+        with open(file_name, 'w') as sync_map_file:
             sync_map_file.write('')
         return {}
 
-def write_sync_map(ids_map):
-    with open(sync_map_file_name, 'w') as sync_map_file:
+def write_sync_map(ids_map, file_name=sync_map_file_name):
+    with open(file_name, 'w') as sync_map_file:
         writer = csv.writer(sync_map_file, 'mapper')
         for key in ids_map.keys():
             writer.writerow([key, ids_map[key]])
 
+def open_issue_binder(sync_map_db=None, sync_map=sync_map_file_name):
+    if sync_map_db is None:
+        return IssueBinder(read_sync_map(sync_map))
+    created = not os.path.exists(sync_map_db)
+    issue_binder = SqliteIssueBinder(sync_map_db)
+    if created and os.path.exists(sync_map):
+        #take over bindings made before the database was configured
+        issue_binder.addBindings((m_id, s_id) for s_id, m_id in read_sync_map(sync_map).items())
+    return issue_binder
+
+def save_issue_binder(issue_binder, sync_map=sync_map_file_name):
+    #database commits every binding at once
+    if not isinstance(issue_binder, SqliteIssueBinder):
+        write_sync_map(issue_binder.s_to_m, sync_map)
+
+def close_issue_binder(issue_binder, sync_map=sync_map_file_name):
+    if isinstance(issue_binder, SqliteIssueBinder):
+        issue_binder.close()
+    else:
+        write_sync_map(issue_binder.s_to_m, sync_map)
+
 def get_project(slave, project_id):
     try:
         return slave.getProject(project_id)
     except YouTrackException:
         return None
 
-def sync(master_url,
-         master_root_login,
-         master_root_password,
-         slave_url,
-         slave_root_login,
-         slave_root_password,
-         project_id,
-         query,
-         fields_to_sync,
-         slave_to_master_map,
-         last_run,
-         debug_mode):
-
-    issue_binder = IssueBinder(slave_to_master_map)
-
-    master = Connection(master_url, master_root_login, master_root_password)
-    slave = Connection(slave_url, slave_root_login, slave_root_password)
-    logger = Logger(master, slave, master_root_login, slave_root_login)
-
-    current_run = datetime.now()
-    synchronizer = YouTrackSynchronizer(master, slave, logger, issue_binder, project_id, fields_to_sync, query, last_run, current_run)
-    synchronizer.setDebugMode(debug_mode)
+class SyncPair(object):
+    """ Project synchronized between master and slave as the config says. Connections,
+        sync map, histories of changes, comment index and known users are loaded
+        once and kept between runs, their files are in the directory of the config
+        under fixed names, so a directory holds the config of one pair only.
+        With youtracks, sync.orchestrator.YouTrackPool, connections and known users
+        are shared with other pairs.
+    """
 
-    try:
-        if get_project(slave, project_id):
-            synchronizer.sync()
+    def __init__(self, config_file_name, config, settings, youtracks=None):
+        self.config_file_name = config_file_name
+        self.config = config
+        self.settings = settings
+        self.directory = os.path.dirname(os.path.abspath(config_file_name))
+        sync_map_db = settings['sync_map_db']
+        self.issue_binder = open_issue_binder(self._path(sync_map_db) if sync_map_db else None,
+                                              self._path(sync_map_file_name))
+        self.change_history = read_history(self._path(change_history_file_name))
+        self.comment_index = read_comment_index(self._path(comment_index_file_name))
+        self.youtracks = youtracks
+        if youtracks is None:
+            self.user_caches = read_user_caches(self._path(user_cache_file_name))
         else:
-            youtrack2youtrack(master_url, master_root_login, master_root_password, slave_url, slave_root_login, slave_root_password, [project_id], query)
-            synchronizer.syncAfterImport()
+            self.user_caches = youtracks.userCache(settings['master_url']), youtracks.userCache(settings['slave_url'])
+        self.master = None
+        self.slave = None
+        self.logger = None
+
+    def _path(self, file_name):
+        return os.path.join(self.directory, file_name)
+
+    def _connect(self):
+        settings = self.settings
+        if self.logger is None:
+            if self.youtracks is None:
+                retry_policy = RetryPolicy(max_retries=settings['max_retries'])
+                self.master = Connection(settings['master_url'], settings['master_root_login'], settings['master_root_password'],
+                                         retry_policy=retry_policy)
+                self.slave = Connection(settings['slave_url'], settings['slave_root_login'], settings['slave_root_password'],
+                                        retry_policy=retry_policy)
+            else:
+                self.master = self.youtracks.connect(settings['master_url'], settings['master_root_login'],
+                                                     settings['master_root_password'], 'master')
+                self.slave = self.youtracks.connect(settings['slave_url'], settings['slave_root_login'],
+                                                    settings['slave_root_password'], 'slave')
+            self.logger = Logger(self.master, self.slave, settings['master_root_login'], settings['slave_root_login'],
+                                 directory=self.directory)
+
+    def run(self):
+        """ Synchronizes changes made since the last run, saves the state and the time of the run """
+        settings = self.settings
+        project_id = settings['project_id']
+        self._connect()
+        current_run = datetime.now()
+        synchronizer = YouTrackSynchronizer(self.master, self.slave, self.logger, self.issue_binder, project_id,
+                                            settings['fields_to_sync'], settings['query'], settings['last_run'], current_run,
+                                            settings['workers'], self.change_history, self.comment_index, self.user_caches)
+        synchronizer.setDebugMode(settings['debug_mode'])
+
+        try:
+            if get_project(self.slave, project_id):
+                synchronizer.sync()
+            else:
+                youtrack2youtrack(settings['master_url'], settings['master_root_login'], settings['master_root_password'],
+                                  settings['slave_url'], settings['slave_root_login'], settings['slave_root_password'],
+                                  [project_id], settings['query'])
+                synchronizer.syncAfterImport()
+        finally:
+            #write dictionary of synchronized issues
+            save_issue_binder(self.issue_binder, self._path(sync_map_file_name))
+            #and histories of issues to request only new changes next time
+            write_history(self._path(change_history_file_name), *synchronizer.getChangeFeeds(), since=settings['last_run'])
+            self.change_history = tuple(feed.history(settings['last_run']) for feed in synchronizer.getChangeFeeds())
+            write_comment_index(self._path(comment_index_file_name), self.comment_index)
+            if self.youtracks is None:
+                write_user_caches(self._path(user_cache_file_name), *self.user_caches)
+            else:
+                self.youtracks.save()
+
+        #query time format has 1 second accuracy, so set last run value
+        #as current time shifted by the 1 second forward to avoid
+        #applying of changes done by the previous script launch
+        self.checkpoint(datetime.now() + timedelta(seconds=1))
+
+    def checkpoint(self, last_run):
+        self.settings['last_run'] = last_run
+        self.config.set(section_name, 'last_run', last_run.strftime(config_time_format))
+        write_config(self.config, self.config_file_name)
+
+    def close(self):
+        if self.logger is not None:
+            self.logger.finalize()
+        close_issue_binder(self.issue_binder, self._path(sync_map_file_name))
+
+def run_daemon(pair, poll_interval, status_port=None):
+    """ Runs the pair every poll_interval seconds until SIGTERM or Ctrl+C, SIGUSR1 or
+        POST /sync to the status server starts the next run at once
+    """
+    daemon = SyncDaemon(pair.run, poll_interval, SyncStatus(pair.settings['project_id']))
+    server = StatusServer([daemon], status_port).start() if status_port else None
+    handle_signals(daemon)
+    try:
+        daemon.serve()
     finally:
-        logger.finalize()
-        #write dictionary of synchronized issues
-        write_sync_map(issue_binder.s_to_m)
+        if server is not None:
+            server.stop()
+        pair.close()
+
+def handle_signals(daemon):
+    stop = lambda signum, frame: daemon.stop()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: daemon.trigger())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
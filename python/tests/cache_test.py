@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+import unittest
+import httplib2
+from youtrack.cache import ResponseCache
+from youtrack.connection import Connection
+
+GROUPS_XML = '<userGroups><userGroup name="developers" url="/admin/group/developers"/></userGroups>'
+
+
+class RevalidatingHttp(object):
+    """ Answers 304 to requests with matching If-None-Match """
+    def __init__(self):
+        self.requests = []
+
+    def request(self, url, method, headers=None, body=None):
+        self.requests.append((url, headers))
+        if headers.get('If-None-Match') == '"v1"':
+            return httplib2.Response({'status': 304, 'etag': '"v1"'}), ''
+        return httplib2.Response({'status': 200, 'content-type': 'application/xml', 'etag': '"v1"'}), GROUPS_XML
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def connection(self, cache, api_key='key'):
+        connection = Connection('http://localhost', api_key=api_key, cache=cache)
+        connection.http = RevalidatingHttp()
+        return connection
+
+    def test_revalidation(self):
+        cache = ResponseCache()
+        connection = self.connection(cache)
+        self.assertEqual(['developers'], [g.name for g in connection.getGroups()])
+        self.assertEqual(['developers'], [g.name for g in connection.getGroups()])
+        (first_url, first), (second_url, second) = connection.http.requests
+        self.assertFalse('If-None-Match' in first)
+        self.assertEqual('"v1"', second['If-None-Match'])
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+    def test_otherResourcesAreNotCached(self):
+        cache = ResponseCache()
+        connection = self.connection(cache)
+        connection._req('GET', '/issue/SB-1')
+        connection._req('GET', '/issue/SB-1')
+        self.assertEqual(0, len(cache))
+        self.assertFalse('If-None-Match' in connection.http.requests[1][1])
+
+    def test_usersDontShareEntries(self):
+        cache = ResponseCache()
+        self.connection(cache, 'first')._req('GET', '/admin/group')
+        connection = self.connection(cache, 'second')
+        connection._req('GET', '/admin/group')
+        self.assertFalse('If-None-Match' in connection.http.requests[0][1])
+
+    def test_diskStore(self):
+        self.connection(ResponseCache(self.directory))._req('GET', '/admin/group')
+        cache = ResponseCache(self.directory)
+        connection = self.connection(cache)
+        response, content = connection._req('GET', '/admin/group')
+        self.assertEqual(GROUPS_XML, content)
+        self.assertEqual('application/xml', response['content-type'])
+        self.assertEqual(1, cache.hits)
+
+    def test_unicodeKey(self):
+        login, url = u'\u0438\u0432\u0430\u043d', u'/admin/group/\u0433\u0440\u0443\u043f\u043f\u0430'
+        self.assertEqual(ResponseCache.key(login.encode('utf-8'), url.encode('utf-8')), ResponseCache.key(login, url))
+
+    def test_lru(self):
+        cache = ResponseCache(max_entries=2)
+        response = httplib2.Response({'status': 200, 'etag': '"v1"'})
+        for key in ('a', 'b', 'c'):
+            cache.put(key, response, key)
+            cache.get('a')
+        self.assertEqual('a', cache.get('a').content)
+        self.assertEqual(None, cache.get('b'))
+        self.assertEqual('c', cache.get('c').content)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import threading
+import unittest
+from xml.dom import minidom
+import youtrack
+from youtrack.compact import compact_issue, compact_issues, get_schema, CompactIssue
+from issue_test import ISSUE_XML, ISSUE_WITHOUT_COMMENTS_XML
+
+
+class CompactIssueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.issue = youtrack.Issue(minidom.parseString(ISSUE_XML), None)
+
+    def test_values(self):
+        record = compact_issue(self.issue)
+        self.assertTrue(isinstance(record, CompactIssue))
+        self.assertEqual(u'SB-1', record.id)
+        self.assertEqual(u'Test issue', record['summary'])
+        self.assertEqual([u'sync'], record.tags)
+        self.assertEqual(['first', 'second'], [c.text for c in record.getComments()])
+        self.assertTrue('Priority' in record)
+        self.assertFalse('Assignee' in record)
+        self.assertRaises(AttributeError, getattr, record, 'Assignee')
+
+    def test_materialize(self):
+        connection = object()
+        issue = compact_issue(self.issue).materialize(connection)
+        self.assertTrue(isinstance(issue, youtrack.Issue))
+        self.assertTrue(issue.youtrack is connection)
+        self.assertEqual(self.issue.summary, issue.summary)
+        self.assertEqual(self.issue._attribute_types, issue._attribute_types)
+        self.assertEqual(sorted(self.issue), sorted(issue))
+        self.assertTrue(issue.getComments()[0].youtrack is connection)
+
+    def test_schemaIsShared(self):
+        other = youtrack.Issue(minidom.parseString(ISSUE_WITHOUT_COMMENTS_XML), None)
+        first, second = compact_issues([self.issue, other])
+        self.assertTrue(first.schema is second.schema)
+        self.assertEqual(u'2', second.numberInProject)
+        self.assertFalse('summary' in second)
+
+    def test_unicode(self):
+        self.issue.summary = u'Привет'
+        record = compact_issue(self.issue)
+        self.assertEqual(self.issue.summary, record.summary)
+        self.assertTrue(isinstance(record.summary, unicode))
+
+    def test_recordsReadAlternately(self):
+        other = youtrack.Issue(minidom.parseString(ISSUE_WITHOUT_COMMENTS_XML), None)
+        first, second = compact_issues([self.issue, other])
+        for i in range(2):
+            self.assertEqual([u'SB-1', u'2', [u'sync']], [first.id, second.numberInProject, first.tags])
+            self.assertEqual(['first', 'second'], [c.text for c in first.getComments()])
+
+    def test_concurrentSchema(self):
+        schema = get_schema(youtrack.Issue, 'CONCURRENT')
+        def add(thread):
+            for i in range(500):
+                schema.add('field%d_%d' % (i, thread % 2))
+        threads = [threading.Thread(target=add, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1000, len(schema.names))
+        self.assertEqual(range(1000), sorted(schema.position(name) for name in schema.names))
+
+
+if __name__ == '__main__':
+    unittest.main()
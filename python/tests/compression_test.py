@@ -0,0 +1,115 @@
+import BaseHTTPServer
+import gzip
+import mimetools
+import threading
+import unittest
+import zlib
+from StringIO import StringIO
+import httplib2
+from youtrack.compression import CompressionStats, compress, decoding_response
+from youtrack.connection import Connection
+
+BODY = '<issues>%s</issues>' % ('<issue id="SB-1"><field name="summary"><value>Test</value></field></issue>' * 100)
+
+
+class FakeResponse(StringIO):
+    def __init__(self, content, headers):
+        StringIO.__init__(self, content)
+        self.headers = mimetools.Message(StringIO(''.join('%s: %s\r\n' % h for h in headers) + '\r\n'))
+
+    def info(self):
+        return self.headers
+
+
+class FakeHttp(object):
+    def __init__(self, response, content):
+        self.response = response
+        self.content = content
+        self.requests = []
+
+    def request(self, url, method, headers=None, body=None):
+        self.requests.append((headers, body))
+        return httplib2.Response(self.response), self.content
+
+
+class GzipHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        content = compress(BODY)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CompressionTest(unittest.TestCase):
+
+    def response(self, content, encoding):
+        return FakeResponse(content, [('Content-Type', 'text/xml'), ('Content-Length', str(len(content))),
+                                      ('Content-Encoding', encoding)])
+
+    def test_gzip(self):
+        stats = CompressionStats()
+        content = compress(BODY)
+        f = decoding_response(self.response(content, 'gzip'), stats)
+        self.assertEqual(BODY[:10], f.read(10))
+        self.assertEqual(BODY[10:], f.read())
+        self.assertEqual('', f.read())
+        self.assertFalse('content-length' in f.info().dict)
+        self.assertEqual('text/xml', f.info().type)
+        self.assertEqual(len(content), stats.received)
+        self.assertEqual(len(BODY) - len(content), stats.saved)
+
+    def test_deflate(self):
+        for content in (zlib.compress(BODY), zlib.compress(BODY)[2:-4]):
+            self.assertEqual(BODY, decoding_response(self.response(content, 'deflate')).read())
+
+    def test_identity(self):
+        response = FakeResponse(BODY, [('Content-Length', str(len(BODY)))])
+        self.assertTrue(decoding_response(response) is response)
+
+    def test_statsOfThreads(self):
+        stats = CompressionStats()
+
+        def count():
+            for i in range(10000):
+                stats.add_response(1, 3)
+        threads = [threading.Thread(target=count) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((40000, 80000), (stats.received, stats.saved))
+
+    def test_compressedUpload(self):
+        connection = Connection('http://localhost', api_key='key', compress_uploads=True)
+        connection.http = FakeHttp({'status': 200, '-content-length': '100'}, 'x' * 1000)
+        connection._req('PUT', '/import/SB/issues', BODY)
+        connection._req('PUT', '/admin/project/SB', BODY)
+        (import_headers, import_body), (admin_headers, admin_body) = connection.http.requests
+        self.assertEqual('gzip', import_headers['Content-Encoding'])
+        self.assertEqual(BODY, gzip.GzipFile(fileobj=StringIO(import_body)).read())
+        self.assertEqual(BODY, admin_body)
+        self.assertEqual(len(BODY) - len(import_body) + 2 * 900, connection.compression.saved)
+
+    def test_compressedResponse(self):
+        server = BaseHTTPServer.HTTPServer(('localhost', 0), GzipHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            connection = Connection('http://localhost:%d' % server.server_address[1], api_key='key')
+            response, content = connection._req('GET', '/issue/SB-1')
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(BODY, content)
+        self.assertEqual(len(compress(BODY)), connection.compression.received)
+        self.assertEqual(len(BODY) - len(compress(BODY)), connection.compression.saved)
+
+
+if __name__ == '__main__':
+    unittest.main()
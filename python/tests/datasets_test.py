@@ -0,0 +1,50 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from benchmarks import datasets
+
+
+class DatasetsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_prefixIsTheSame(self):
+        small = list(datasets.Dataset(10, seed=3))
+        large = list(datasets.Dataset(100, seed=3))
+        self.assertEqual(small, large[:10])
+        self.assertNotEqual(small, list(datasets.Dataset(10, seed=4)))
+
+    def test_attachmentSizes(self):
+        dataset = datasets.Dataset(50, attachments=3)
+        output = os.path.join(self.directory, 'issues.csv')
+        datasets.write_csv(dataset, output)
+        with open(output + '.attachments.csv', 'rb') as f:
+            paths = set(row[-1] for row in csv.reader(f))
+        self.assertTrue(len(paths) > 1)
+        sizes = dict((os.path.basename(path), os.path.getsize(path)) for path in paths)
+        for issue in dataset:
+            written = [sizes['content%d.bin' % content] for name, author, created, content in issue['attachments']]
+            self.assertEqual(written, [a['filesize'] for a in datasets.redmine_issue(dataset, issue)['attachments']])
+            self.assertEqual(written, [a['size'] for a in datasets.jira_issue(dataset, issue)['fields']['attachment']])
+
+    def test_jira(self):
+        dataset = datasets.Dataset(20)
+        output = os.path.join(self.directory, 'issues.jira')
+        datasets.write_jira(dataset, output)
+        with open(output) as f:
+            issues = [json.loads(line) for line in f]
+        self.assertEqual(['BENCH-%d' % i for i in range(1, 21)], [issue['key'] for issue in issues])
+        for issue in issues:
+            for link in issue['fields']['issuelinks']:
+                self.assertTrue(int(link['outwardIssue']['key'].split('-')[1]) < int(issue['key'].split('-')[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
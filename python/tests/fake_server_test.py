@@ -0,0 +1,50 @@
+import unittest
+import youtrack
+from youtrack.connection import Connection
+from youtrack.fake_server import FakeYouTrack
+
+
+class FakeServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeYouTrack().start()
+        self.server.store.generate('SB', 30, comments=2, links=1)
+        self.yt = Connection(self.server.url, 'root', 'root')
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_getIssues(self):
+        issues = self.yt.getIssues('SB', '', 20, 20)
+        self.assertEqual(['SB-%d' % n for n in range(21, 31)], [issue.id for issue in issues])
+        self.assertEqual(2, len(issues[0].getComments()))
+        self.assertEqual(['SB-3', 'SB-7'], [i.id for i in self.yt.getIssues('SB', 'issue id: SB-3, SB-7', 0, 10)])
+        self.assertRaises(youtrack.YouTrackException, self.yt.getIssue, 'SB-100')
+
+    def test_importIssues(self):
+        self.yt.createProjectDetailed('TS', 'Target', '', 'root')
+        issues = self.yt.getIssues('SB', '', 0, 5)
+        self.yt.importIssues('TS', 'TS Assignees', issues)
+        imported = self.yt.getIssue('TS-4')
+        self.assertEqual(issues[3].summary, imported.summary)
+        self.assertEqual([c.text for c in issues[3].getComments()], [c.text for c in imported.getComments()])
+        self.assertEqual(1, self.server.requests['PUT /import/{project}/issues'])
+
+    def test_executeCommand(self):
+        self.yt.executeCommand('SB-2', 'State Fixed tag sync', comment='done', run_as='user1')
+        issue = self.yt.getIssue('SB-2')
+        self.assertEqual('Fixed', issue.State)
+        self.assertEqual(['sync'], issue.tags[-1:])
+        self.assertEqual(('done', 'user1'), (issue.comments[-1].text, issue.comments[-1].author))
+        change = self.yt.get_changes_for_issue('SB-2')[-1]
+        self.assertEqual(('user1', ['Fixed']), (change.updater_name, change.fields[0].new_value))
+        self.assertEqual(1, len(self.yt.getIssues('SB', 'tag: sync', 0, 10)))
+        self.assertRaises(youtrack.YouTrackException, self.yt.executeCommand, 'SB-2', 'no such field')
+
+    def test_relogin(self):
+        self.server.sessions.clear()
+        self.assertEqual('SB-1', self.yt.getIssue('SB-1').id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+from xml.dom import minidom
+import youtrack
+
+ISSUE_XML = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<issue id="SB-1" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+    <field name="projectShortName"><value>SB</value></field>
+    <field name="numberInProject"><value>1</value></field>
+    <field name="summary"><value>Test issue</value></field>
+    <field name="reporterName"><value>root</value></field>
+    <field xsi:type="CustomFieldValue" name="Priority"><value>Normal</value></field>
+    <comment id="1-1" author="root" issueId="SB-1" deleted="false" text="first" created="1267030230127"><replies/></comment>
+    <comment id="1-2" author="guest" issueId="SB-1" deleted="false" text="second" created="1267030230128"><replies/></comment>
+    <tag cssClass="c1">sync</tag>
+</issue>
+"""
+
+ISSUE_WITHOUT_COMMENTS_XML = """<issue id="SB-2">
+    <field name="projectShortName"><value>SB</value></field>
+    <field name="numberInProject"><value>2</value></field>
+</issue>
+"""
+
+ISSUE_WITH_LINKS_XML = """<issue id="SB-3">
+    <field name="projectShortName"><value>SB</value></field>
+    <field name="fixedVersion"><value>1.0, 2.0</value></field>
+    <links>
+        <issueLink typeName="Depend" source="SB-3" target="SB-4"/>
+        <issueLink typeName="Relates" source="SB-5" target="SB-3"/>
+    </links>
+    <attachments>
+        <fileUrl url="http://localhost/_persistent/a.png?file=1" name="a.png"/>
+    </attachments>
+</issue>
+"""
+
+
+class CountingConnection(object):
+    def __init__(self):
+        self.requested_comments = []
+
+    def getComments(self, id):
+        self.requested_comments.append(id)
+        return []
+
+
+class IssueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.con = CountingConnection()
+
+    def test_embeddedComments(self):
+        issue = youtrack.Issue(minidom.parseString(ISSUE_XML), self.con)
+        comments = issue.getComments()
+        self.assertEqual(['first', 'second'], [c.text for c in comments])
+        self.assertEqual(['root', 'guest'], [c.author for c in comments])
+        self.assertEqual('1267030230128', comments[1].created)
+        self.assertEqual([], self.con.requested_comments)
+
+    def test_issueWithoutComments(self):
+        xml = minidom.parseString(ISSUE_WITHOUT_COMMENTS_XML)
+        issue = youtrack.Issue(xml.documentElement, self.con)
+        self.assertEqual([], issue.getComments())
+        self.assertEqual([], self.con.requested_comments)
+
+    def test_commentsAreLoadedOnDemand(self):
+        issue = youtrack.Issue(minidom.parseString(ISSUE_XML), self.con)
+        issue.comments = None
+        issue.getComments()
+        issue.getComments()
+        self.assertEqual(['SB-1'], self.con.requested_comments)
+
+    def test_fields(self):
+        issue = youtrack.Issue(minidom.parseString(ISSUE_XML), self.con)
+        self.assertEqual('SB-1', issue.id)
+        self.assertEqual('Test issue', issue.summary)
+        self.assertEqual('Normal', issue.Priority)
+        self.assertEqual(['sync'], issue.tags)
+        self.assertEqual(['Priority'], issue._attribute_types.keys())
+
+    def test_linksAndAttachments(self):
+        issue = youtrack.Issue(minidom.parseString(ISSUE_WITH_LINKS_XML), self.con)
+        self.assertEqual(['SB-4', 'SB-3'], [l.target for l in issue.getLinks()])
+        self.assertEqual(['SB-4'], [l.target for l in issue.getLinks(True)])
+        self.assertEqual('/_persistent/a.png?file=1', issue.getAttachments()[0].url)
+        self.assertEqual(['1.0', '2.0'], issue.fixedVersion)
+        self.assertEqual(None, issue.tags)
+
+    def test_valuesAreShared(self):
+        first = youtrack.Issue(minidom.parseString(ISSUE_XML), self.con)
+        second = youtrack.Issue(minidom.parseString(ISSUE_XML), self.con)
+        self.assertTrue(first.Priority is second.Priority)
+        self.assertTrue(first.reporterName is second.reporterName)
+        self.assertFalse(first.summary is second.summary)
+        self.assertEqual(str, type(first._attribute_types.keys()[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
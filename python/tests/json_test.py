@@ -0,0 +1,82 @@
+import json
+import unittest
+import httplib2
+import youtrack
+from youtrack import xmlbackend
+from youtrack.connection import Connection
+from issue_test import ISSUE_XML
+
+ISSUE_JSON = json.dumps({
+    'id': 'SB-1', 'entityId': '78-1',
+    'field': [
+        {'name': 'projectShortName', 'value': 'SB'},
+        {'name': 'numberInProject', 'value': '1'},
+        {'name': 'summary', 'value': 'Test issue'},
+        {'name': 'reporterName', 'value': 'root'},
+        {'name': 'Priority', 'value': ['Normal'], 'valueId': ['Normal'], 'color': {'bg': '#fff', 'fg': '#000'}}],
+    'comment': [
+        {'id': '1-1', 'author': 'root', 'issueId': 'SB-1', 'deleted': False, 'text': 'first',
+         'created': 1267030230127, 'updated': None, 'replies': []},
+        {'id': '1-2', 'author': 'guest', 'issueId': 'SB-1', 'deleted': False, 'text': 'second',
+         'created': 1267030230128, 'updated': None, 'replies': []}],
+    'tag': [{'value': 'sync', 'cssClass': 'c1'}]})
+
+
+class FakeHttp(object):
+    def __init__(self, content_type, content):
+        self.content_type = content_type
+        self.content = content
+        self.requests = []
+
+    def request(self, url, method, headers=None, body=None):
+        self.requests.append((url, headers))
+        return httplib2.Response({'status': 200, 'content-type': self.content_type}), self.content
+
+
+def _fields(obj):
+    return dict((name, obj[name]) for name in obj if name not in ('youtrack', 'entityId', 'comments'))
+
+
+class JsonTest(unittest.TestCase):
+
+    def connection(self, content_type, content):
+        connection = Connection('http://localhost', api_key='key', prefer_json=True)
+        connection.http = FakeHttp(content_type, content)
+        return connection
+
+    def test_issueIsTheSameAsFromXml(self):
+        expected = youtrack.Issue(xmlbackend.parseString(ISSUE_XML), None)
+        issue = youtrack.Issue(json.loads(ISSUE_JSON), None)
+        self.assertEqual(_fields(expected), _fields(issue))
+        self.assertEqual(expected._attribute_types, issue._attribute_types)
+        self.assertEqual([(c.id, c.author, c.text, c.created, c.deleted) for c in expected.getComments()],
+                         [(c.id, c.author, c.text, c.created, c.deleted) for c in issue.getComments()])
+
+    def test_issueList(self):
+        connection = self.connection('application/json;charset=UTF-8', '[%s]' % ISSUE_JSON)
+        issues = connection.getIssues('SB', '', 0, 10)
+        self.assertEqual(['SB-1'], [issue.id for issue in issues])
+        self.assertEqual('Normal', issues[0].Priority)
+        url, headers = connection.http.requests[0]
+        self.assertEqual('application/json', headers['Accept'].split(',')[0])
+
+    def test_wrappedList(self):
+        connection = self.connection('application/json', json.dumps(
+            {'issueLink': [{'typeName': 'Depend', 'source': 'SB-1', 'target': 'SB-2'},
+                           {'typeName': 'Relates', 'source': 'SB-3', 'target': 'SB-1'}]}))
+        self.assertEqual([('Depend', 'SB-2')], [(l.typeName, l.target) for l in connection.getLinks('SB-1', True)])
+
+    def test_xmlFallback(self):
+        connection = self.connection('application/xml', '<users><user login="root"/><user login="guest"/></users>')
+        self.assertEqual(['root', 'guest'], [user.login for user in connection.getUsersTen(0)])
+
+    def test_xmlByDefault(self):
+        connection = self.connection('application/xml', ISSUE_XML)
+        connection.prefer_json = False
+        self.assertEqual('Normal', connection.getIssue('SB-1').Priority)
+        url, headers = connection.http.requests[0]
+        self.assertFalse('Accept' in headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from StringIO import StringIO
+from youtrack.memory import MemoryProfiler
+
+
+class Leaked(object):
+    pass
+
+
+class MemoryProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output = StringIO()
+        self.profiler = MemoryProfiler(self.output, interval=2, top=5)
+
+    def tearDown(self):
+        self.profiler.stop()
+
+    def test_phases(self):
+        self.profiler.phase('users')
+        self.assertEqual('', self.output.getvalue())
+        leaked = [Leaked() for i in range(10000)]
+        self.profiler.phase('issues')
+        report = self.output.getvalue()
+        self.assertTrue('after phase users' in report)
+        self.assertTrue('+10000' in report and 'Leaked' in report, report)
+
+    def test_pages(self):
+        self.profiler.phase('issues')
+        for start in range(0, 100, 20):
+            self.profiler.page('issues %d' % start)
+        self.profiler.stop()
+        labels = [line for line in self.output.getvalue().splitlines() if line.startswith('===')]
+        self.assertEqual(['issues 20', 'issues 60', 'phase issues'], [label.split('after ')[1] for label in labels])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from youtrack.connection import Connection
+from youtrack.metrics import Metrics, dump, endpoint_template, get_metrics, to_prometheus
+from youtrack.retry import RetryPolicy
+from retry_test import FlakyHttp
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_endpointTemplates(self):
+        for method, url, template in [
+                ('GET', '/issue/SB-1', 'GET /issue/{id}'),
+                ('GET', '/issue/SB-1/comment', 'GET /issue/{id}/comment'),
+                ('GET', '/issue/byproject/SB?after=0&max=10', 'GET /issue/byproject/{project}'),
+                ('GET', '/issue?filter=a', 'GET /issue'),
+                ('POST', '/issue/SB-1/execute?command=x', 'POST /issue/{id}/execute'),
+                ('PUT', '/import/SB/issues?test=false', 'PUT /import/{project}/issues'),
+                ('PUT', '/import/issue/SB-1/workitems', 'PUT /import/issue/{id}/workitems'),
+                ('GET', '/admin/user/?start=10', 'GET /admin/user'),
+                ('GET', '/admin/user/root/group', 'GET /admin/user/{login}/group'),
+                ('GET', '/admin/customfield/field', 'GET /admin/customfield/field'),
+                ('GET', '/admin/customfield/field/Fix%20versions', 'GET /admin/customfield/field/{field}'),
+                ('GET', '/admin/project/SB/customfield/Priority', 'GET /admin/project/{project}/customfield/{field}'),
+                ('GET', '/admin/customfield/versionBundle/Versions', 'GET /admin/customfield/versionBundle/{bundle}')]:
+            self.assertEqual(template, endpoint_template(method, url))
+
+    def test_connectionStats(self):
+        policy = RetryPolicy(jitter=0)
+        policy.sleep = lambda seconds: None
+        connection = Connection('http://localhost/', api_key='key', retry_policy=policy, metrics=Metrics())
+        connection.http = FlakyHttp(503, 200, 200)
+        connection._req('GET', '/issue/SB-1')
+        connection._req('PUT', '/import/SB/issues', '<issues/>')
+        stats = connection.stats()
+        self.assertEqual(['GET /issue/{id}', 'PUT /import/{project}/issues'], sorted(stats))
+        issue = stats['GET /issue/{id}']
+        self.assertEqual((2, 1, {'503': 1, '200': 1}), (issue['calls'], issue['retries'], issue['statuses']))
+        self.assertEqual(len('content') * 2, issue['bytes_in'])
+        self.assertEqual(len('<issues/>'), stats['PUT /import/{project}/issues']['bytes_out'])
+        self.assertEqual(2, sum(issue['latency_buckets'].values()))
+
+    def test_sharedByServer(self):
+        self.assertTrue(get_metrics('http://test') is get_metrics('http://test'))
+        self.assertTrue(Connection('http://test/', api_key='key').metrics is get_metrics('http://test'))
+
+    def test_dump(self):
+        metrics = Metrics('http://localhost')
+        metrics.record('GET', '/issue/SB-1', 0.3, 200, 0, 100)
+        metrics.record('GET', '/issue/SB-2', 40.0, None)
+        text = to_prometheus([metrics])
+        labels = 'endpoint="GET /issue/{id}",server="http://localhost"'
+        self.assertTrue('youtrack_requests_total{%s,status="200"} 1' % labels in text)
+        self.assertTrue('youtrack_requests_total{%s,status="error"} 1' % labels in text)
+        self.assertTrue('youtrack_request_duration_seconds_bucket{%s,le="0.5"} 1' % labels in text)
+        self.assertTrue('youtrack_request_duration_seconds_bucket{%s,le="+Inf"} 2' % labels in text)
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'metrics.json')
+            dump(path, [metrics])
+            with open(path) as f:
+                self.assertEqual(2, json.load(f)[0]['endpoints']['GET /issue/{id}']['calls'])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import threading
+import unittest
+from youtrack.ratelimit import RateLimiter, TokenBucket, endpoint_class
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.now += seconds
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_endpointClasses(self):
+        self.assertEqual('read', endpoint_class('GET', '/issue/SB-1'))
+        self.assertEqual('write', endpoint_class('PUT', '/issue'))
+        self.assertEqual('import', endpoint_class('PUT', '/import/SB/issues'))
+        self.assertEqual('execute', endpoint_class('POST', '/issue/SB-1/execute?command=fixed'))
+
+    def test_bucket(self):
+        bucket = TokenBucket(10, capacity=5, clock=self.clock, sleep=self.clock.sleep)
+        started = self.clock.now
+        for i in range(25):
+            bucket.acquire()
+        # the burst of 5 requests goes at once, the rest at 10 per second
+        self.assertAlmostEqual(2.0, self.clock.now - started)
+
+    def test_setRate(self):
+        bucket = TokenBucket(10, capacity=5, clock=self.clock, sleep=self.clock.sleep)
+        for i in range(5):
+            bucket.acquire()
+        self.clock.now += 0.2
+        # two tokens were added at the old rate
+        bucket.set_rate(1)
+        started = self.clock.now
+        for i in range(3):
+            bucket.acquire()
+        self.assertAlmostEqual(1.0, self.clock.now - started)
+
+    def test_classesAreIndependent(self):
+        limiter = RateLimiter({'read': 1, 'write': None}, clock=self.clock, sleep=self.clock.sleep)
+        limiter.acquire('GET', '/issue/SB-1')
+        for i in range(100):
+            limiter.acquire('POST', '/issue/SB-1')
+        self.assertEqual(0.0, limiter.waited)
+        limiter.acquire('GET', '/issue/SB-1')
+        self.assertAlmostEqual(1.0, limiter.waited)
+
+    def test_slowdown(self):
+        limiter = RateLimiter({'import': 4}, latency_target=1.0, clock=self.clock, sleep=self.clock.sleep)
+        for i in range(20):
+            limiter.record('PUT', '/import/SB/issues', 5.0)
+        self.assertAlmostEqual(0.4, limiter.rate('import'))
+        for i in range(100):
+            limiter.record('PUT', '/import/SB/issues', 0.1)
+        self.assertAlmostEqual(4.0, limiter.rate('import'))
+        limiter.record('PUT', '/import/SB/issues', 0.1, 503)
+        self.assertAlmostEqual(2.0, limiter.rate('import'))
+
+    def test_threads(self):
+        bucket = TokenBucket(100, capacity=1, clock=self.clock, sleep=self.clock.sleep)
+        threads = [threading.Thread(target=lambda: [bucket.acquire() for i in range(50)]) for t in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertTrue(self.clock.now - 1000.0 >= 1.98)
+
+
+if __name__ == '__main__':
+    unittest.main()
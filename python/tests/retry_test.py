@@ -0,0 +1,94 @@
+import errno
+import socket
+import sys
+import traceback
+import unittest
+import httplib2
+import youtrack
+from youtrack.connection import Connection
+from youtrack.retry import RetryPolicy
+
+
+class FlakyHttp(object):
+    """ Replays the given answers, an exception instance is raised """
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.requests = 0
+
+    def request(self, url, method, headers=None, body=None):
+        self.requests += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        status, headers = answer if isinstance(answer, tuple) else (answer, {})
+        return httplib2.Response(dict(headers, status=status)), 'content'
+
+
+class RetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.delays = []
+        self.policy = RetryPolicy(max_retries=3, delay=1.0, backoff=2.0, jitter=0.0)
+        self.policy.sleep = self.delays.append
+
+    def connection(self, *answers):
+        connection = Connection('http://localhost', api_key='key', retry_policy=self.policy)
+        connection.http = FlakyHttp(*answers)
+        return connection
+
+    def test_backoff(self):
+        connection = self.connection(socket.timeout(), 502, 503, 200)
+        self.assertEqual('content', connection._req('GET', '/issue/SB-1')[1])
+        self.assertEqual([1.0, 2.0, 4.0], self.delays)
+
+    def test_maxRetries(self):
+        connection = self.connection(503, 503, 503, 503, 200)
+        self.assertRaises(youtrack.YouTrackException, connection._req, 'GET', '/issue/SB-1')
+        self.assertEqual(4, connection.http.requests)
+
+    def test_retryAfter(self):
+        connection = self.connection((429, {'retry-after': '7'}), 200)
+        connection._req('POST', '/issue/SB-1/execute?command=fixed', '')
+        self.assertEqual([7.0], self.delays)
+
+    def test_nonIdempotentRequests(self):
+        connection = self.connection(503, 200)
+        self.assertRaises(youtrack.YouTrackException, connection._req, 'POST', '/issue/SB-1/execute', '')
+        refused = socket.error(errno.ECONNREFUSED, 'Connection refused')
+        connection = self.connection(socket.error(errno.ECONNRESET, 'Connection reset'), 200)
+        self.assertRaises(socket.error, connection._req, 'PUT', '/issue', '')
+        connection = self.connection(refused, 200)
+        self.assertEqual(200, connection._req('PUT', '/issue', '')[0].status)
+        connection = self.connection(503, 200)
+        self.assertEqual(200, connection._req('PUT', '/import/SB/issues', '<issues/>')[0].status)
+
+    def test_tracebackOfLastError(self):
+        connection = self.connection(*[socket.timeout()] * 4)
+        try:
+            connection._req('GET', '/issue/SB-1')
+            self.fail()
+        except socket.timeout:
+            # the traceback goes down to the request which failed
+            self.assertEqual('request', traceback.extract_tb(sys.exc_info()[2])[-1][2])
+
+    def test_noRetriesByDefault(self):
+        connection = Connection('http://localhost', api_key='key')
+        connection.http = FlakyHttp(503, 200)
+        self.assertRaises(youtrack.YouTrackException, connection._req, 'GET', '/issue/SB-1')
+        self.assertEqual(1, connection.http.requests)
+
+    def test_budget(self):
+        self.policy.budget = 2
+        connection = self.connection(503, 503, 200, 503, 200)
+        connection._req('GET', '/issue/SB-1')
+        self.assertRaises(youtrack.YouTrackException, connection._req, 'GET', '/issue/SB-2')
+        self.assertEqual(2, self.policy.retries)
+
+    def test_jitter(self):
+        policy = RetryPolicy(delay=1.0, backoff=2.0, jitter=0.5)
+        for i in range(20):
+            self.assertTrue(2.0 <= policy.get_delay(2) <= 4.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
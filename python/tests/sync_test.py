@@ -0,0 +1,419 @@
+import ConfigParser
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+import urllib2
+from datetime import datetime, timedelta
+from StringIO import StringIO
+from youtrack import ChangeField, IssueChange, Link, YouTrackException
+from youtrack.compact import CompactRecord
+from youtrack.connection import Connection
+from youtrack.fake_server import FakeYouTrack
+from sync.bindings import SqliteIssueBinder
+from sync.changes import ChangeFeed, read_history, write_history
+from sync.comments import CommentSynchronizer, read_comment_index, write_comment_index
+from sync.daemon import StatusServer, SyncDaemon
+from sync.executing import SafeCommandExecutor
+from sync.fields import AsymmetricFieldsSynchronizer
+from sync.links import IssueBinder, LinkImporter
+from sync.logging import Logger
+from sync.orchestrator import SyncScheduler, YouTrackPool
+from sync.users import UserCache, UserSynchronizer, read_user_caches, write_user_caches
+from sync.youtracks import YouTrackSynchronizer
+import syncManyYtWithYt
+import syncYtWithYt
+
+
+class SynchronizerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        self.stdout = sys.stdout
+        os.chdir(self.directory)
+        sys.stdout = StringIO()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def _sync(self, workers, binder=None):
+        """ Commands applied to slave and master after sync of two differently changed projects """
+        master = FakeYouTrack().start()
+        slave = FakeYouTrack().start()
+        try:
+            master.store.generate('SB', 40, comments=2, links=1)
+            slave.store.generate('SB', 40, comments=2, links=1, seed=1)
+            for issue in slave.store.issues.values():
+                issue['fields']['Sync with'] = issue['fields']['numberInProject']
+            if binder is None:
+                binder = IssueBinder({})
+            for issue_id in slave.store.issues:
+                binder.addBinding(issue_id, issue_id)
+            master_yt = Connection(master.url, 'root', 'root')
+            slave_yt = Connection(slave.url, 'root', 'root')
+            logger = Logger(master_yt, slave_yt, 'root', 'root')
+            now = datetime.now()
+            YouTrackSynchronizer(master_yt, slave_yt, logger, binder, 'SB', ['state', 'priority'], '',
+                                 now - timedelta(hours=2), now, workers).sync()
+            logger.finalize()
+            return sorted(master.store.commands), sorted(slave.store.commands)
+        finally:
+            master.stop()
+            slave.stop()
+
+    def test_concurrentMerge(self):
+        master_commands, slave_commands = self._sync(1)
+        self.assertTrue(len(master_commands) and len(slave_commands))
+        self.assertEqual((master_commands, slave_commands), self._sync(4))
+        self.assertEqual((master_commands, slave_commands), self._sync(4, SqliteIssueBinder('sync_map.db')))
+
+    def test_sqliteBinder(self):
+        binder = SqliteIssueBinder('sync_map.db')
+        self.assertFalse(binder.m_to_s)
+        binder.addBindings([('M-1', 'S-1'), ('M-2', 'S-2')])
+        binder.addBinding('M-3', 'S-3')
+        binder.close()
+        binder = SqliteIssueBinder('sync_map.db')
+        self.assertEqual(u'M-2', binder.slaveIssueIdToMasterIssueId('S-2'))
+        self.assertEqual(u'S-3', binder.masterIssueIdToSlaveIssueId('M-3'))
+        self.assertRaises(KeyError, binder.slaveIssueIdToMasterIssueId, 'S-4')
+        self.assertTrue(binder.checkMasterId('M-1') and not binder.checkSlaveId('M-1'))
+        self.assertTrue('S-1' in binder.getPermittedSlaveIds())
+        self.assertEqual(3, len(binder.m_to_s))
+        self.assertEqual(None, binder.s_to_m.get('S-5'))
+        binder.close()
+
+    def test_changeFeed(self):
+        server = FakeYouTrack().start()
+        try:
+            server.store.generate('SB', 3, changes=2)
+            yt = Connection(server.url, 'root', 'root')
+            start, finish = datetime.now() - timedelta(hours=2), datetime.now() + timedelta(minutes=1)
+            feed = ChangeFeed(yt)
+            updated = yt.getIssue('SB-1').updated
+            changes = feed.changes('SB-1', start, finish, updated)
+            self.assertEqual(2, len(changes))
+            requests = server.requests['GET /issue/{id}/changes']
+            write_history('history', feed, ChangeFeed(yt))
+            feed = ChangeFeed(yt, read_history('history')[0])
+            self.assertEqual([(c.updated, c.fields[0].new_value) for c in changes],
+                             [(c.updated, c.fields[0].new_value) for c in feed.changes('SB-1', start, finish, updated)])
+            self.assertEqual(requests, server.requests['GET /issue/{id}/changes'])
+            yt.executeCommand('SB-1', 'State Fixed')
+            self.assertEqual(3, len(feed.changes('SB-1', start, finish, yt.getIssue('SB-1').updated)))
+            self.assertEqual((1, 1), (feed.hits, feed.requests))
+            # changes before the next window are not saved, watermarks are
+            write_history('history', feed, ChangeFeed(yt), since=finish)
+            watermark, changes = read_history('history')[0]['SB-1']
+            self.assertEqual((feed.history()['SB-1'][0], []), (watermark, changes))
+        finally:
+            server.stop()
+
+    def test_importLinksInBatches(self):
+        class YouTrack(object):
+            def __init__(self):
+                self.batches = []
+
+            def importLinks(self, links):
+                if 'M-13' in [link.target for link in links]:
+                    raise YouTrackException('/import/links', {'status': 400}, '')
+                self.batches.append(len(links))
+        yt = YouTrack()
+        logger = Logger(yt, None, 'root', 'root')
+        executor = SafeCommandExecutor(yt, logger)
+        executor.link_batch_size.size = 8
+        links = []
+        for i in range(1, 40):
+            link = Link()
+            link.typeName, link.source, link.target = 'Relates', 'M-%d' % i, 'M-%d' % (i + 1)
+            links.append(link)
+        executor.importLinks(links, set('M-%d' % i for i in range(1, 40)))
+        logger.finalize()
+        self.assertEqual(37, sum(yt.batches))
+        self.assertEqual([8, 2, 1, 4, 8, 8, 6], yt.batches)
+        with open(logger.error_file.name) as errors:
+            self.assertEqual(2, errors.read().count('failed to import link'))
+
+    def test_collectedLinksAreCompact(self):
+        source = FakeYouTrack().start()
+        target = FakeYouTrack().start()
+        try:
+            source.store.generate('SB', 30, comments=0, links=2)
+            source_yt = Connection(source.url, 'root', 'root')
+            importer = LinkImporter(Connection(target.url, 'root', 'root'))
+            issues = source_yt.getIssues('SB', '', 0, 30)
+            for issue in issues:
+                importer.collectLinks(issue.getLinks(True))
+            self.assertTrue(len(importer.links))
+            self.assertTrue(all(isinstance(link, CompactRecord) for link in importer.links))
+            importer.addAvailableIssues(issues)
+            importer.importCollectedLinks()
+            self.assertEqual(sorted(source.store.links), sorted(target.store.links))
+        finally:
+            source.stop()
+            target.stop()
+
+    def test_commentIndex(self):
+        master = FakeYouTrack().start()
+        slave = FakeYouTrack().start()
+        try:
+            master.store.generate('SB', 1, comments=2)
+            slave.store.generate('SB', 1, comments=1, seed=1)
+            master.store.addComment(master.store.issue('SB-1'), 'user1', 'Fixed in build 1')
+            slave.store.addComment(slave.store.issue('SB-1'), 'user1', 'Fixed in build 2')
+            master_yt = Connection(master.url, 'root', 'root')
+            slave_yt = Connection(slave.url, 'root', 'root')
+            logger = Logger(master_yt, slave_yt, 'root', 'root')
+            comment_sync = CommentSynchronizer(master_yt, slave_yt, SafeCommandExecutor(master_yt, logger),
+                                               SafeCommandExecutor(slave_yt, logger))
+            comment_sync.syncComments('SB-1', 'SB-1')
+            texts = sorted(c.text for c in master_yt.getComments('SB-1'))
+            self.assertEqual(5, len(texts))
+            self.assertEqual(texts, sorted(c.text for c in slave_yt.getComments('SB-1')))
+            write_comment_index('comments', comment_sync.index)
+            comment_sync.index = read_comment_index('comments')
+            commands = len(master.store.commands) + len(slave.store.commands)
+            comment_sync.syncComments('SB-1', 'SB-1')
+            self.assertEqual(commands, len(master.store.commands) + len(slave.store.commands))
+            slave.store.addComment(slave.store.issue('SB-1'), 'user2', 'Fixed in build 1')
+            comment_sync.syncComments('SB-1', 'SB-1')
+            self.assertEqual(6, len(master_yt.getComments('SB-1')))
+            # the same author writes the same text twice, both are copied
+            for i in range(2):
+                slave.store.addComment(slave.store.issue('SB-1'), 'user2', 'ping', created=int(time.time() * 1000) + i)
+            comment_sync.syncComments('SB-1', 'SB-1')
+            self.assertEqual(2, [c.text for c in master_yt.getComments('SB-1')].count('ping'))
+            comment_sync.syncComments('SB-1', 'SB-1')
+            self.assertEqual(2, [c.text for c in slave_yt.getComments('SB-1')].count('ping'))
+            logger.finalize()
+        finally:
+            master.stop()
+            slave.stop()
+
+    def test_userCache(self):
+        master = FakeYouTrack().start()
+        slave = FakeYouTrack().start()
+        try:
+            master.store.addUser('newcomer')
+            master_yt = Connection(master.url, 'root', 'root')
+            slave_yt = Connection(slave.url, 'root', 'root')
+            logger = Logger(master_yt, slave_yt, 'root', 'root')
+            executors = SafeCommandExecutor(master_yt, logger), SafeCommandExecutor(slave_yt, logger)
+            requests = lambda: (master.requests.get('GET /admin/user/{login}', 0),
+                                slave.requests.get('GET /admin/user/{login}', 0))
+            user_sync = UserSynchronizer(master_yt, slave_yt, *executors)
+            for i in range(3):
+                user_sync.syncUser(slave_yt, master_yt, 'root')
+                user_sync.syncUser(slave_yt, master_yt, 'newcomer')
+                user_sync.syncUser(slave_yt, master_yt, 'nobody')
+            self.assertEqual((2, 3), requests())
+            self.assertTrue('newcomer' in slave.store.users)
+            write_user_caches('users', user_sync.caches[master_yt], user_sync.caches[slave_yt])
+            slave_cache = read_user_caches('users')[1]
+            self.assertEqual([True, True, False], [slave_cache.get(login) for login in ('root', 'newcomer', 'nobody')])
+            slave_cache.missing_ttl = -1
+            user_sync = UserSynchronizer(master_yt, slave_yt, executors[0], executors[1], UserCache(), slave_cache)
+            user_sync.syncUser(slave_yt, master_yt, 'newcomer')
+            user_sync.syncUser(slave_yt, master_yt, 'nobody')
+            self.assertEqual((3, 4), requests())
+            logger.finalize()
+        finally:
+            master.stop()
+            slave.stop()
+
+    def test_coalescedCommands(self):
+        def change(author, *fields):
+            issue_change = IssueChange()
+            issue_change.updater_name = author
+            for name, old, new in fields:
+                field = ChangeField()
+                field.name, field.old_value, field.new_value = name, [old], [new]
+                issue_change.fields.append(field)
+            return issue_change
+        master = FakeYouTrack().start()
+        slave = FakeYouTrack().start()
+        try:
+            master.store.generate('SB', 2, changes=0)
+            slave.store.generate('SB', 2, changes=0)
+            master_yt = Connection(master.url, 'root', 'root')
+            slave_yt = Connection(slave.url, 'root', 'root')
+            logger = Logger(master_yt, slave_yt, 'root', 'root')
+            master_executor = SafeCommandExecutor(master_yt, logger)
+            field_sync = AsymmetricFieldsSynchronizer(master_yt, slave_yt, master_executor,
+                                                      SafeCommandExecutor(slave_yt, logger), ['state', 'priority'])
+            changes = [change('user1', ('State', 'Submitted', 'Open'), ('Priority', 'Normal', 'Major')),
+                       change('user1', ('State', 'Open', 'In Progress')),
+                       change('user2', ('State', 'In Progress', 'Fixed'), ('Priority', 'Major', 'Critical'))]
+            field_sync._apply_changes_to_issue(slave_yt, master_yt, 'SB-1', changes)
+            field_sync._apply_changes_to_issue(master_yt, slave_yt, 'SB-1', changes)
+            changes = [change('user1', ('State', 'Open', 'Fixed')), change('user2', ('State', 'Fixed', 'Open'))]
+            field_sync._apply_changes_to_issue(master_yt, slave_yt, 'SB-2', changes)
+            self.assertEqual([('SB-1', 'state Fixed priority Critical', None, 'user2')], slave.store.commands)
+            self.assertEqual([('SB-1', 'state fix priority Critical', None, 'user2')], master.store.commands)
+            master_executor.queueCommand('SB-2', 'wrong', 'wrong Field')
+            master_executor.queueCommand('SB-2', 'priority', 'priority Major')
+            self.assertFalse(master_executor.flush('SB-2'))
+            self.assertEqual(u'Major', master.store.issue('SB-2')['fields']['Priority'])
+            logger.finalize()
+        finally:
+            master.stop()
+            slave.stop()
+
+    def test_logger(self):
+        logger = Logger('master', 'slave', 'root', 'admin', max_bytes=4000, backups=2)
+        for i in range(100):
+            logger.logAction('SB-%d' % i, 'slave', u'applied command: "State \u0444"')
+            if i % 10 == 0:
+                logger.logError(ValueError('wrong'), 'SB-%d' % i, 'master', 'failed to apply command', 'user1')
+        logger.finalize()
+        name = logger.log_file.name
+        self.assertEqual([True, True, True, False], [os.path.exists(name + suffix) for suffix in ('', '.1', '.2', '.3')])
+        with open(name) as log:
+            last = json.loads(log.readlines()[-1])
+        self.assertEqual((u'SB-99', u'Slave', u'admin', u'applied command: "State \u0444"'),
+                         (last['action'], last['youtrack'], last['run_as'], last['message']))
+        with open(logger.error_file.name) as errors:
+            errors = [json.loads(line) for line in errors]
+        self.assertEqual(10, len(errors))
+        self.assertEqual((u'SB-90', u'Master', u'user1', u'wrong'),
+                         (errors[-1]['action'], errors[-1]['youtrack'], errors[-1]['run_as'], errors[-1]['error']))
+
+    def test_loggerQueueIsFull(self):
+        logger = Logger('master', 'slave', 'root', 'admin', max_queued=5)
+        for i in range(50):
+            logger.logAction('SB-%d' % i, 'slave', 'applied command')
+            if i % 5 == 0:
+                logger.logError(ValueError('wrong'), 'SB-%d' % i, 'master', 'failed to apply command')
+            self.assertTrue(len(logger._queue) <= 5)
+        logger.finalize()
+        with open(logger.log_file.name) as log:
+            self.assertEqual(60, len(log.readlines()))
+        with open(logger.error_file.name) as errors:
+            self.assertEqual(['SB-%d' % i for i in range(0, 50, 5)], [json.loads(line)['action'] for line in errors])
+
+    def test_daemon(self):
+        runs = []
+        def run():
+            runs.append(len(runs))
+            if len(runs) == 2:
+                raise ValueError('master is down')
+            if len(runs) == 4:
+                # changes made during a run are synchronized by the next one without waiting
+                urllib2.urlopen(url + '/sync', '')
+        daemon = SyncDaemon(run, 0)
+        server = StatusServer([daemon], 0).start()
+        url = 'http://127.0.0.1:%d' % server.port
+        try:
+            daemon.serve(cycles=2)
+            self.assertRaises(urllib2.HTTPError, urllib2.urlopen, url + '/status')
+            daemon.serve(cycles=1)
+            status = json.loads(urllib2.urlopen(url + '/status').read())[0]
+            self.assertEqual((3, 1, 0, u'master is down'), (status['cycles'], status['failures'],
+                                                           status['consecutive_failures'], status['last_error']))
+            self.assertTrue('sync_lag_seconds' in urllib2.urlopen(url + '/metrics').read())
+            daemon.poll_interval = 60
+            daemon.serve(cycles=2)
+            self.assertEqual(5, len(runs))
+        finally:
+            server.stop()
+
+    def _pair_config(self, master, slave, project_id, directory):
+        """ Config of sync of the project bound in master and slave """
+        master.store.generate(project_id, 5, comments=1)
+        slave.store.generate(project_id, 5, comments=1, seed=1)
+        issue_ids = [issue_id for issue_id in slave.store.issues if issue_id.startswith(project_id + '-')]
+        for issue_id in issue_ids:
+            issue = slave.store.issue(issue_id)
+            issue['fields']['Sync with'] = issue['fields']['numberInProject']
+        syncYtWithYt.write_sync_map(dict((issue_id, issue_id) for issue_id in issue_ids),
+                                    os.path.join(directory, syncYtWithYt.sync_map_file_name))
+        config = ConfigParser.RawConfigParser()
+        config.add_section(syncYtWithYt.section_name)
+        for option, value in (('master_url', master.url), ('slave_url', slave.url), ('project_id', project_id),
+                              ('master_root_login', 'root'), ('master_root_password', 'root'),
+                              ('slave_root_login', 'root'), ('slave_root_password', 'root'),
+                              ('query', ''), ('fields_to_sync', 'state, priority')):
+            config.set(syncYtWithYt.section_name, option, value)
+        syncYtWithYt.write_config(config, os.path.join(directory, 'sync_config'))
+        config = ConfigParser.RawConfigParser()
+        config.read(os.path.join(directory, 'sync_config'))
+        return config
+
+    def test_syncPair(self):
+        master = FakeYouTrack().start()
+        slave = FakeYouTrack().start()
+        try:
+            master.store.generate('SB', 5, comments=1)
+            slave.store.generate('SB', 5, comments=1, seed=1)
+            config = self._pair_config(master, slave, 'SB', '.')
+            pair = syncYtWithYt.SyncPair('sync_config', config, syncYtWithYt.read_settings(config))
+            try:
+                pair.run()
+                pair.run()
+            finally:
+                pair.close()
+            self.assertEqual((1, 1), (master.requests['POST /user/login'], slave.requests['POST /user/login']))
+            self.assertEqual(syncYtWithYt.default_max_retries, pair.master.retry_policy.max_retries)
+            config.read('sync_config')
+            self.assertEqual(pair.settings['last_run'], syncYtWithYt.read_settings(config)['last_run'])
+            self.assertEqual(['sync_changes', 'sync_comments', 'sync_config', 'sync_map', 'sync_users'],
+                             sorted(name for name in os.listdir('.') if name.startswith('sync_')))
+        finally:
+            master.stop()
+            slave.stop()
+
+    def test_scheduler(self):
+        runs = []
+        def daemon(name):
+            def run():
+                runs.append(name)
+                if len(runs) == 7:
+                    scheduler.stop()
+            return SyncDaemon(run, 0)
+        scheduler = SyncScheduler([daemon('a'), daemon('b'), daemon('c')], 1)
+        scheduler.serve()
+        self.assertEqual(['a', 'b', 'c', 'a', 'b', 'c', 'a'], runs)
+        scheduler = SyncScheduler([SyncDaemon(lambda: runs.append('once'), None) for i in range(4)], 2)
+        scheduler.serve()
+        self.assertEqual(4, runs.count('once'))
+
+    def test_orchestrator(self):
+        master = FakeYouTrack().start()
+        slave = FakeYouTrack().start()
+        try:
+            youtracks = YouTrackPool({master.url: {'execute': 100}}, 'sync_users')
+            for project_id in ('SA', 'SB'):
+                os.mkdir(project_id)
+                self._pair_config(master, slave, project_id, project_id)
+            shutil.copy(os.path.join('SA', 'sync_config'), os.path.join('SA', 'other_config'))
+            # the second config in SA would share state files with the first one
+            pairs = syncManyYtWithYt.read_pairs([os.path.join('SA', 'sync_config'), os.path.join('SB', 'sync_config'),
+                                                 os.path.join('SA', 'other_config')], youtracks)
+            self.assertEqual([os.path.join('SA', 'sync_config'), os.path.join('SB', 'sync_config')],
+                             [pair.config_file_name for pair in pairs])
+            try:
+                syncManyYtWithYt.make_scheduler(pairs, 2).serve()
+            finally:
+                for pair in pairs:
+                    pair.close()
+            self.assertEqual([True, True], [pair.settings['last_run'] > syncYtWithYt.default_last_run for pair in pairs])
+            self.assertEqual((1, 1), (master.requests['POST /user/login'], slave.requests['POST /user/login']))
+            self.assertTrue(pairs[0].master is pairs[1].master and pairs[0].master is not pairs[1].slave)
+            self.assertEqual(100, youtracks.limiter(master.url).rates['execute'])
+            self.assertTrue(pairs[0].master.rate_limiter is youtracks.limiter(master.url))
+            self.assertTrue(any(name.startswith('log_') for name in os.listdir('SA')))
+            with open('sync_users') as users:
+                self.assertEqual(sorted([master.url, slave.url]), sorted(json.load(users)))
+        finally:
+            master.stop()
+            slave.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
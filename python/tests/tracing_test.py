@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import httplib2
+import youtrack
+from youtrack.connection import Connection
+from youtrack.retry import RetryPolicy
+from youtrack.tracing import FileExporter, Tracer
+from retry_test import FlakyHttp
+
+
+class ListExporter(object):
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span.as_dict())
+
+    def close(self):
+        pass
+
+
+class TracingTest(unittest.TestCase):
+
+    def setUp(self):
+        policy = RetryPolicy(jitter=0)
+        policy.sleep = lambda seconds: None
+        self.connection = Connection('http://localhost', api_key='key', retry_policy=policy)
+
+    def test_hooks(self):
+        calls = []
+        hooks = self.connection.hooks
+        hooks.before_request.append(lambda c, method, url, headers, body: calls.append(('before', url)))
+        hooks.after_response.append(lambda c, method, url, response, seconds, error: calls.append(
+            ('after', response.status)))
+        hooks.on_retry.append(lambda c, method, url, retry_count, delay, response, error: calls.append(
+            ('retry', retry_count, delay)))
+        self.connection.http = FlakyHttp(503, 200)
+        self.connection._req('GET', '/issue/SB-1')
+        self.assertEqual([('before', '/issue/SB-1'), ('after', 503), ('retry', 0, 1.0),
+                          ('before', '/issue/SB-1'), ('after', 200)], calls)
+
+    def test_spans(self):
+        exporter = ListExporter()
+        tracer = Tracer(exporter)
+        tracer.instrument(self.connection)
+        self.connection.http = FlakyHttp(429, 200, 200)
+        with tracer.span('sync', project='SB'):
+            self.connection.executeCommand('SB-1', 'fixed')
+            self.connection._req('GET', '/issue/SB-2')
+        names = [span['name'] for span in exporter.spans]
+        self.assertEqual(['POST /issue/{id}/execute', 'POST /issue/{id}/execute', 'executeCommand',
+                          'GET /issue/{id}', 'sync'], names)
+        first, second, command, get, sync = exporter.spans
+        self.assertEqual('ERROR', first['status']['code'])
+        self.assertEqual(command['spanId'], first['parentSpanId'])
+        self.assertEqual(sync['spanId'], command['parentSpanId'])
+        self.assertEqual(sync['spanId'], get['parentSpanId'])
+        self.assertFalse('parentSpanId' in sync)
+        self.assertEqual(1, len(set(span['traceId'] for span in exporter.spans)))
+        self.assertEqual(['retry'], [event['name'] for event in command['events']])
+        self.assertEqual({'issue': 'SB-1', 'command': 'fixed'}, command['attributes'])
+
+    def test_failedOperation(self):
+        exporter = ListExporter()
+        Tracer(exporter).instrument(self.connection)
+        self.connection.http = FlakyHttp(400)
+        self.assertRaises(youtrack.YouTrackException, self.connection.executeCommand, 'SB-1', 'fixed')
+        self.assertEqual(['ERROR', 'ERROR'], [span['status']['code'] for span in exporter.spans])
+
+    def test_notRetryableError(self):
+        exporter = ListExporter()
+        tracer = Tracer(exporter)
+        tracer.instrument(self.connection)
+        self.connection.http = FlakyHttp(httplib2.ServerNotFoundError('localhost'))
+        self.assertRaises(httplib2.ServerNotFoundError, self.connection.executeCommand, 'SB-1', 'fixed')
+        self.assertEqual(['POST /issue/{id}/execute', 'executeCommand'], [span['name'] for span in exporter.spans])
+        self.assertEqual(['ERROR', 'ERROR'], [span['status']['code'] for span in exporter.spans])
+        self.assertEqual(None, tracer.current())
+
+    def test_fileExporter(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'trace.jsonl')
+            tracer = Tracer(FileExporter(path))
+            with tracer.span('first'):
+                pass
+            with self.connection.span('untraced'):
+                pass
+            tracer.close()
+            with open(path) as f:
+                self.assertEqual(['first'], [json.loads(line)['name'] for line in f])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
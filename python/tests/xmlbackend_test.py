@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import unittest
+from xml.dom import minidom
+import youtrack
+from youtrack import xmlbackend
+from issue_test import ISSUE_XML, ISSUE_WITH_LINKS_XML
+
+IMPORT_RESULT_XML = """<importResult>
+    <item id="1" imported="true"/>
+    <item id="2" imported="false"><error fieldName="Type" value="Bug">unknown value</error></item>
+</importResult>
+"""
+
+
+def _fields(obj):
+    return dict((name, obj[name]) for name in obj
+                if name not in ('youtrack', 'comments', 'links', 'attachments', 'xmlns:xsi'))
+
+
+class XmlBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.default = xmlbackend.backend
+
+    def tearDown(self):
+        xmlbackend.use(self.default)
+
+    def backends(self):
+        for name in xmlbackend.available():
+            xmlbackend.use(name)
+            yield name
+
+    def test_issueIsTheSame(self):
+        for xml in (ISSUE_XML, ISSUE_WITH_LINKS_XML):
+            expected = youtrack.Issue(minidom.parseString(xml), None)
+            for name in self.backends():
+                issue = youtrack.Issue(xmlbackend.parseString(xml), None)
+                self.assertEqual(_fields(expected), _fields(issue), name)
+                self.assertEqual(expected._attribute_types, issue._attribute_types, name)
+                self.assertEqual([_fields(c) for c in expected.getComments()],
+                                 [_fields(c) for c in issue.getComments()], name)
+                self.assertEqual([_fields(l) for l in expected.links or []],
+                                 [_fields(l) for l in issue.links or []], name)
+
+    def test_domSubset(self):
+        for name in self.backends():
+            xml = xmlbackend.parseString(IMPORT_RESULT_XML)
+            items = xml.getElementsByTagName('item')
+            self.assertEqual(2, len(items), name)
+            self.assertEqual(u'2', items[1].attributes['id'].value, name)
+            self.assertEqual(u'false', items[1].getAttribute('imported'), name)
+            self.assertEqual(u'', items[0].getAttribute('missing'), name)
+            self.assertEqual([], list(items[0].getElementsByTagName('item')), name)
+            self.assertEqual(1, len(xml.getElementsByTagName('importResult')), name)
+            error = items[1].getElementsByTagName('error')[0]
+            self.assertEqual(u'unknown value', youtrack._text(error), name)
+            self.assertTrue(isinstance(error.toxml(), unicode), name)
+            self.assertEqual(minidom.parseString(error.toxml()).documentElement.getAttribute('fieldName'), 'Type')
+
+    def test_unicode(self):
+        content = u'<error>Значение</error>'.encode('utf-8')
+        for name in self.backends():
+            self.assertEqual(u'Значение', youtrack.YouTrackError(xmlbackend.parseString(content)).error, name)
+
+    @unittest.skipUnless('lxml' in xmlbackend.available(), 'lxml is not installed')
+    def test_lxmlUnicode(self):
+        xmlbackend.use('lxml')
+        content = u'<?xml version="1.0" encoding="UTF-8"?><error>Значение</error>'
+        self.assertEqual(u'Значение', youtrack.YouTrackError(xmlbackend.parseString(content)).error)
+
+    def test_unknownBackend(self):
+        self.assertRaises(ValueError, xmlbackend.use, 'sax')
+
+
+if __name__ == '__main__':
+    unittest.main()
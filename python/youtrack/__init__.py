@@ -4,9 +4,12 @@ YouTrack 2.0 REST API
 
 import re
 from xml.dom import Node
-from xml.dom.minidom import Document
-from xml.dom import minidom
 from xml.sax.saxutils import escape, quoteattr
+from youtrack import xmlbackend
+
+ELEMENT_NODE = Node.ELEMENT_NODE
+TEXT_NODE = Node.TEXT_NODE
+DOCUMENT_NODE = Node.DOCUMENT_NODE
 
 
 EXISTING_FIELD_TYPES = {
@@ -24,6 +27,72 @@ EXISTING_FIELD_TYPES = {
 
 EXISTING_FIELDS = ['numberInProject', 'projectShortName'] + EXISTING_FIELD_TYPES.keys()
 
+# fields which values are (almost) never repeated across issues
+UNIQUE_FIELDS = frozenset(['id', 'entityId', 'issueId', 'numberInProject', 'summary', 'description', 'text',
+                           'created', 'updated', 'resolved', 'url', 'historyUpdated'])
+
+
+class ValuePool(object):
+    """ Makes equal field names and short field values of parsed objects share one string.
+        Values like state, priority, type, subsystem or user logins are repeated in almost
+        every issue, so keeping one copy of them saves a lot of memory for large exports.
+    """
+    def __init__(self, max_size=100000, max_length=40):
+        self.enabled = True
+        self.max_size = max_size
+        self.max_length = max_length
+        self._names = {}
+        self._values = {}
+
+    def name(self, name):
+        pooled = self._names.get(name)
+        if pooled is None:
+            pooled = name.encode('utf-8') if isinstance(name, unicode) else name
+            pooled = intern(pooled)
+            self._names[name] = pooled
+        return pooled
+
+    def value(self, name, value):
+        if not self.enabled:
+            return value
+        pooled = self._values.get(value)
+        if pooled is not None:
+            return pooled
+        if name in UNIQUE_FIELDS or len(value) > self.max_length or value.isdigit():
+            return value
+        if len(self._values) < self.max_size:
+            self._values[value] = value
+        return value
+
+    def clear(self):
+        self._names.clear()
+        self._values.clear()
+
+    def __len__(self):
+        return len(self._values)
+
+value_pool = ValuePool()
+
+def _text(el):
+    nodes = el.childNodes
+    if len(nodes) == 1 and nodes[0].nodeType == TEXT_NODE:
+        return nodes[0].data
+    return "".join([e.data for e in nodes if e.nodeType == TEXT_NODE])
+
+
+def _json_text(value):
+    # json scalars are converted into the strings xml representation has
+    if value is None or isinstance(value, basestring):
+        return value
+    if isinstance(value, bool):
+        return u'true' if value else u'false'
+    if isinstance(value, dict):
+        return _json_text(value.get('value'))
+    if isinstance(value, (int, long, float)):
+        return unicode(value)
+    return None
+
+
 class YouTrackException(Exception):
     def __init__(self, url, response, content):
         self.response = response
@@ -37,7 +106,7 @@ class YouTrackException(Exception):
             ct = response["content-type"]
             if ct is not None and ct.find('text/html') == -1:
                 try:
-                    xml = minidom.parseString(content)
+                    xml = xmlbackend.parseString(content)
                     self.error = YouTrackError(xml, self)
                     msg += ": " + self.error.error
                 except:
@@ -62,43 +131,82 @@ class YouTrackObject(object):
     def _update(self, xml):
         if xml is None:
             return
-        if isinstance(xml, Document):
+        if isinstance(xml, dict):
+            self._updateFromJson(xml)
+            return
+        if xml.nodeType == DOCUMENT_NODE:
             xml = xml.documentElement
 
         self._updateFromAttrs(xml)
         self._updateFromChildren(xml)
 
+    def _updateFromJson(self, obj):
+        # attributes of an element are plain keys of json object, and fields
+        # are listed under 'field' key
+        pool_name, pool_value = value_pool.name, value_pool.value
+        for name, value in obj.iteritems():
+            if name == 'field':
+                for field in value:
+                    self._updateFromJsonField(field)
+            elif not isinstance(value, (list, dict)):
+                value = _json_text(value)
+                if value is not None:
+                    name = pool_name(name)
+                    setattr(self, name, pool_value(name, value))
+
     def _updateFromAttrs(self, el):
-        if el.attributes is not None:
-            for i in range(el.attributes.length):
-                a = el.attributes.item(i)
-                setattr(self, a.name, a.value)
+        attributes = el.attributes
+        if attributes is not None:
+            pool_name, pool_value = value_pool.name, value_pool.value
+            for name, value in attributes.items():
+                name = pool_name(name)
+                setattr(self, name, pool_value(name, value))
 
     def _updateFromChildren(self, el):
-        children = [e for e in el.childNodes if e.nodeType == Node.ELEMENT_NODE]
-        if children:
-            for c in children:
-                name = c.getAttribute('name')
-                value = None
-                if not len(name):
-                    continue
-                if isinstance(name, unicode):
-                    name = name.encode('utf-8')
-                values = c.getElementsByTagName('value')
-                if (values is not None) and len(values):
-                    if values.length == 1:
-                        value = self._text(values.item(0))
-                    elif values.length > 1:
-                        value = [self._text(value) for value in values]
-                elif c.hasAttribute('value'):
-                    value = c.getAttribute('value')
-                if value is not None:
-                    setattr(self, name, value)
-                    if c.hasAttribute('xsi:type'):
-                        self._attribute_types[name] = c.getAttribute('xsi:type')
+        for c in el.childNodes:
+            if c.nodeType == ELEMENT_NODE:
+                self._updateFromField(c)
+
+    def _updateFromField(self, c):
+        name = c.getAttribute('name')
+        if not name:
+            return
+        name = value_pool.name(name)
+        value = None
+        values = [v for v in c.childNodes if v.nodeType == ELEMENT_NODE and v.tagName == 'value']
+        if len(values) == 1:
+            value = value_pool.value(name, _text(values[0]))
+        elif values:
+            value = [value_pool.value(name, _text(v)) for v in values]
+        elif c.hasAttribute('value'):
+            value = value_pool.value(name, c.getAttribute('value'))
+        if value is not None:
+            setattr(self, name, value)
+            attr_type = c.getAttribute('xsi:type')
+            if attr_type:
+                self._attribute_types[name] = value_pool.value('xsi:type', attr_type)
+
+    def _updateFromJsonField(self, field):
+        name = field.get('name')
+        if not name:
+            return
+        name = value_pool.name(name)
+        value = field.get('value')
+        if isinstance(value, list):
+            values = [value_pool.value(name, v) for v in map(_json_text, value) if v is not None]
+            value = values[0] if len(values) == 1 else values or None
+        else:
+            value = _json_text(value)
+            if value is not None:
+                value = value_pool.value(name, value)
+        if value is not None:
+            setattr(self, name, value)
+            # json has no xsi:type, but only custom fields carry value ids
+            if 'valueId' in field:
+                self._attribute_types[name] = 'CustomFieldValue'
 
     def _text(self, el):
-        return "".join([e.data for e in el.childNodes if e.nodeType == Node.TEXT_NODE])
+        return _text(el)
 
     def __repr__(self):
         _repr = ''
@@ -143,22 +251,50 @@ class Issue(YouTrackObject):
     def __init__(self, xml=None, youtrack=None):
         YouTrackObject.__init__(self, xml, youtrack)
         if xml is not None:
-            if len(xml.getElementsByTagName('links')) > 0:
-                self.links = [Link(e, youtrack) for e in xml.getElementsByTagName('issueLink')]
-            else:
-                self.links = None
-            if len(xml.getElementsByTagName('tag')) > 0:
-                self.tags = [self._text(e) for e in xml.getElementsByTagName('tag')]
-            else:
-                self.tags = None
-            if len(xml.getElementsByTagName('attachments')) > 0:
-                self.attachments = [Attachment(e, youtrack) for e in xml.getElementsByTagName('fileUrl')]
-            else:
-                self.attachments = None
             for m in ['fixedVersion', 'affectsVersion']: self._normilizeMultiple(m)
             if hasattr(self, 'fixedInBuild') and (self.fixedInBuild == 'Next build'):
                 self.fixedInBuild = None
 
+    def _updateFromChildren(self, el):
+        # fields, comments, tags, links and attachments are collected in one walk;
+        # issue xml returned by /issue/{id} and /issue/byproject/{id} always
+        # contains all the comments, so getComments() doesn't need a request
+        comments = []
+        tags = None
+        links = None
+        attachments = None
+        for c in el.childNodes:
+            if c.nodeType != ELEMENT_NODE:
+                continue
+            tag_name = c.tagName
+            if tag_name == 'field':
+                self._updateFromField(c)
+            elif tag_name == 'comment':
+                comments.append(Comment(c, self.youtrack))
+            elif tag_name == 'tag':
+                if tags is None:
+                    tags = []
+                tags.append(_text(c))
+            elif tag_name == 'links':
+                links = [Link(e, self.youtrack) for e in c.childNodes
+                         if e.nodeType == Node.ELEMENT_NODE and e.tagName == 'issueLink']
+            elif tag_name == 'attachments':
+                attachments = [Attachment(e, self.youtrack) for e in c.childNodes
+                               if e.nodeType == Node.ELEMENT_NODE and e.tagName == 'fileUrl']
+            else:
+                self._updateFromField(c)
+        self.comments = comments
+        self.tags = tags
+        self.links = links
+        self.attachments = attachments
+
+    def _updateFromJson(self, obj):
+        YouTrackObject._updateFromJson(self, obj)
+        self.comments = [Comment(c, self.youtrack) for c in obj.get('comment') or []]
+        self.tags = [_json_text(t) for t in obj.get('tag') or []] or None
+        self.links = None
+        self.attachments = None
+
     def _normilizeMultiple(self, name):
         if hasattr(self, name):
             attrValue = self[name]
@@ -195,8 +331,7 @@ class Issue(YouTrackObject):
         return voters
 
     def getComments(self):
-        #TODO: do not make rest request if issue was initied with comments
-        if not hasattr(self, 'comments'):
+        if getattr(self, 'comments', None) is None:
             setattr(self, 'comments', self.youtrack.getComments(self.id))
         return self.comments
 
@@ -249,7 +384,7 @@ class IssueChange(YouTrackObject):
     def _update(self, xml):
         if xml is None:
             return
-        if isinstance(xml, Document):
+        if xml.nodeType == DOCUMENT_NODE:
             xml = xml.documentElement
 
         for field in xml.getElementsByTagName('field'):
@@ -275,6 +410,8 @@ class ChangeField(YouTrackObject):
         YouTrackObject.__init__(self, xml, youtrack)
 
     def _update(self, xml):
+        if xml is None:
+            return
         self.name = xml.getAttribute('name')
         old_value = xml.getElementsByTagName('oldValue')
         for value in old_value:
@@ -344,7 +481,7 @@ class UserRole(YouTrackObject):
     def _update(self, xml):
         if xml is None:
             return
-        if isinstance(xml, Document):
+        if xml.nodeType == DOCUMENT_NODE:
             xml = xml.documentElement
 
         self.name = xml.getAttribute("name")
@@ -406,7 +543,7 @@ class WorkItem(YouTrackObject):
     def _update(self, xml):
         if xml is None:
             return
-        if isinstance(xml, Document):
+        if xml.nodeType == DOCUMENT_NODE:
             xml = xml.documentElement
 
         self.url = xml.getAttribute('url')
@@ -446,7 +583,7 @@ class UserBundle(YouTrackObject):
     def _update(self, xml):
         if xml is None:
             return
-        if isinstance(xml, Document):
+        if xml.nodeType == DOCUMENT_NODE:
             xml = xml.documentElement
 
         self.name = xml.getAttribute("name")
@@ -499,7 +636,7 @@ class Bundle(YouTrackObject):
     def _update(self, xml):
         if xml is None:
             return
-        if isinstance(xml, Document):
+        if xml.nodeType == DOCUMENT_NODE:
             xml = xml.documentElement
 
         self.name = xml.getAttribute("name")
@@ -551,7 +688,7 @@ class BundleElement(YouTrackObject):
     def _update(self, xml):
         if xml is None:
             return
-        if isinstance(xml, Document):
+        if xml.nodeType == DOCUMENT_NODE:
             xml = xml.documentElement
 
         self.name = [e.data for e in xml.childNodes if e.nodeType == Node.TEXT_NODE][0]
@@ -659,7 +796,7 @@ class IntelliSense(YouTrackObject):
     def _update(self, xml):
         if not xml:
             return
-        if isinstance(xml, Document):
+        if xml.nodeType == DOCUMENT_NODE:
             xml = xml.documentElement
         for c in xml.childNodes:
             if c.tagName in ('suggest', 'recent'):
@@ -696,7 +833,7 @@ class GlobalTimeTrackingSettings(YouTrackObject):
     def _update(self, xml):
         if not xml:
             return
-        if isinstance(xml, Document):
+        if xml.nodeType == DOCUMENT_NODE:
             xml = xml.documentElement
         for e in xml.childNodes:
             self[e.tagName] = self._text(e)
@@ -706,7 +843,7 @@ class ProjectTimeTrackingSettings(YouTrackObject):
     def _update(self, xml):
         if not xml:
             return
-        if isinstance(xml, Document):
+        if xml.nodeType == DOCUMENT_NODE:
             xml = xml.documentElement
         self['Enabled'] = xml.getAttribute('enabled').lower() == 'true'
         self['EstimateField'] = None
@@ -0,0 +1,133 @@
+"""
+Conditional request cache for read-mostly resources.
+
+Custom fields, projects, roles and groups are read many times during an import
+or a sync, but rarely change. ResponseCache keeps GET responses of these
+resources which carry ETag or Last-Modified, and Connection revalidates them
+with If-None-Match and If-Modified-Since, so that a repeated read is answered
+with 304 and no body. Cookie and Cache-Control headers sent by Connection keep
+httplib2 own cache out of play, that's why it is done here.
+
+Entries are kept in memory in LRU order and, when a directory is given, on disk
+in httplib2.FileCache, so that the next run starts warm:
+
+    connection = Connection(url, login, password, cache=ResponseCache('.youtrack-cache'))
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import httplib2
+
+CACHEABLE_PREFIXES = ('/admin/customfield', '/admin/project', '/admin/role', '/admin/group')
+_HEADERS = ('content-type', 'etag', 'last-modified')
+
+
+def _utf8(value):
+    return value.encode('utf-8') if isinstance(value, unicode) else value
+
+
+class CachedResponse(object):
+    __slots__ = ('headers', 'content')
+
+    def __init__(self, headers, content):
+        self.headers = headers
+        self.content = content
+
+    def validators(self):
+        validators = {}
+        if 'etag' in self.headers:
+            validators['If-None-Match'] = self.headers['etag']
+        if 'last-modified' in self.headers:
+            validators['If-Modified-Since'] = self.headers['last-modified']
+        return validators
+
+    def response(self):
+        response = httplib2.Response(dict(self.headers, status='200'))
+        response.fromcache = True
+        return response
+
+    def dumps(self):
+        return json.dumps(self.headers) + '\n' + self.content
+
+    @staticmethod
+    def loads(value):
+        headers, content = value.split('\n', 1)
+        return CachedResponse(json.loads(headers), content)
+
+
+class ResponseCache(object):
+    def __init__(self, directory=None, max_entries=1000, prefixes=CACHEABLE_PREFIXES):
+        self.max_entries = max_entries
+        self.prefixes = tuple(prefixes)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = httplib2.FileCache(directory) if directory is not None else None
+
+    def accepts(self, url):
+        return url.startswith(self.prefixes)
+
+    @staticmethod
+    def key(identity, url, accept=None):
+        """ Responses depend on the permissions of the user and on the requested format """
+        return hashlib.sha1('\n'.join(_utf8(part) for part in (identity or '', accept or '', url))).hexdigest()
+
+    def hit(self):
+        """ Counts a response revalidated with 304 """
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        """ Counts a response sent again in full """
+        with self._lock:
+            self.misses += 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+                return entry
+        if self._disk is not None:
+            value = self._disk.get(key)
+            if value:
+                try:
+                    entry = CachedResponse.loads(value)
+                except ValueError:
+                    self._disk.delete(key)
+                    return None
+                self._remember(key, entry)
+                return entry
+        return None
+
+    def put(self, key, response, content):
+        """ Keeps the response if it can be revalidated """
+        headers = dict((h, response[h]) for h in _HEADERS if h in response)
+        if 'etag' not in headers and 'last-modified' not in headers:
+            return
+        entry = CachedResponse(headers, content)
+        self._remember(key, entry)
+        if self._disk is not None:
+            self._disk.set(key, entry.dumps())
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+        if self._disk is not None:
+            for key in keys:
+                self._disk.delete(key)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,227 @@
+"""
+Compact read-only representation of youtrack objects.
+
+YouTrackObject keeps every field in the instance dictionary together with the
+type dictionary and a reference to the connection. That is fine for a page of
+issues, but holding hundreds of thousands of them costs gigabytes. CompactRecord
+keeps the values in a single utf-8 string whose layout is described by a
+RecordSchema shared by all records of the same class and project, so the field
+names are stored once and there are no per-value string objects.
+
+    compact = compact_issue(issue)
+    compact.summary              # values are available without materialisation
+    issue = compact.materialize(connection)
+"""
+
+import re
+import threading
+import youtrack
+
+# Scalar unicode values of a record are kept utf-8 encoded in a single string
+# separated by zero bytes. Characters below \x04 are not allowed in xml, so
+# they are used as markers for values that are kept elsewhere.
+_SEPARATOR = '\x00'
+_ABSENT = '\x01'
+_NONE = '\x02'
+_EXTRA = '\x03'
+_RESERVED = re.compile(u'[\x00-\x03]')
+_MISSING = object()
+_schemas = {}
+# schemas are extended by threads parsing issues concurrently
+_lock = threading.Lock()
+# parts of the blob read last, so that reading all fields of a record splits it once
+_last = threading.local()
+
+
+class RecordSchema(object):
+    """Ordered set of field names shared by records of one class and project"""
+    __slots__ = ('cls', 'project', 'names', 'types', '_positions')
+
+    def __init__(self, cls, project):
+        self.cls = cls
+        self.project = project
+        self.names = []
+        self.types = {}
+        self._positions = {}
+
+    def position(self, name):
+        return self._positions.get(name)
+
+    def add(self, name):
+        position = self._positions.get(name)
+        if position is None:
+            with _lock:
+                position = self._positions.get(name)
+                if position is None:
+                    if isinstance(name, unicode):
+                        name = name.encode('utf-8')
+                    name = intern(name)
+                    position = len(self.names)
+                    self.names.append(name)
+                    self._positions[name] = position
+        return position
+
+
+def get_schema(cls, project):
+    key = (cls, project)
+    schema = _schemas.get(key)
+    if schema is None:
+        with _lock:
+            schema = _schemas.setdefault(key, RecordSchema(cls, project))
+    return schema
+
+
+def reset_schemas():
+    with _lock:
+        _schemas.clear()
+
+
+def _pack(value):
+    if isinstance(value, list):
+        return tuple(_pack(v) for v in value)
+    if isinstance(value, youtrack.YouTrackObject):
+        return compact(value)
+    return value
+
+
+def _unpack(value, connection=None):
+    if isinstance(value, tuple):
+        return [_unpack(v, connection) for v in value]
+    if isinstance(value, CompactRecord):
+        return value.materialize(connection)
+    return value
+
+
+class CompactRecord(object):
+    __slots__ = ('schema', 'blob', 'extras')
+
+    def __init__(self, schema, blob, extras=()):
+        self.schema = schema
+        self.blob = blob
+        self.extras = extras
+
+    def _items(self):
+        extras = iter(self.extras)
+        for name, part in zip(self.schema.names, self.blob.split(_SEPARATOR)):
+            if part == _ABSENT:
+                continue
+            elif part == _NONE:
+                yield name, None
+            elif part == _EXTRA:
+                yield name, next(extras)
+            else:
+                yield name, part.decode('utf-8')
+
+    def _parts(self):
+        """ Parts of the blob and indices of extras by position, kept for the last record read by the thread """
+        if getattr(_last, 'blob', None) is not self.blob:
+            parts = self.blob.split(_SEPARATOR)
+            extra_indices = []
+            extra_count = 0
+            for part in parts:
+                extra_indices.append(extra_count)
+                if part == _EXTRA:
+                    extra_count += 1
+            _last.parts = parts, extra_indices
+            _last.blob = self.blob
+        return _last.parts
+
+    def _value(self, name):
+        position = self.schema.position(name)
+        if position is None:
+            return _MISSING
+        parts, extra_indices = self._parts()
+        if position >= len(parts):
+            return _MISSING
+        part = parts[position]
+        if part == _ABSENT:
+            return _MISSING
+        elif part == _NONE:
+            return None
+        elif part == _EXTRA:
+            return self.extras[extra_indices[position]]
+        return part.decode('utf-8')
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name in CompactRecord.__slots__:
+            raise AttributeError(name)
+        value = self._value(name)
+        if value is _MISSING:
+            raise AttributeError(name)
+        return _unpack(value)
+
+    def __getitem__(self, key):
+        value = self._value(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return _unpack(value)
+
+    def __contains__(self, key):
+        return self._value(key) is not _MISSING
+
+    def __iter__(self):
+        for name, value in self._items():
+            yield name
+
+    def get(self, key, default=None):
+        value = self._value(key)
+        return default if value is _MISSING else _unpack(value)
+
+    def materialize(self, connection=None):
+        """Creates ordinary youtrack object bound to connection"""
+        cls = self.schema.cls
+        obj = cls.__new__(cls)
+        obj.youtrack = connection
+        obj._attribute_types = dict()
+        for name, value in self._items():
+            setattr(obj, name, _unpack(value, connection))
+            if name in self.schema.types:
+                obj._attribute_types[name] = self.schema.types[name]
+        return obj
+
+
+class CompactIssue(CompactRecord):
+    __slots__ = ()
+
+    def getComments(self):
+        return self.get('comments') or []
+
+    def getLinks(self, outwardOnly=False):
+        links = self.get('links') or []
+        return [l for l in links if l.source == self.id or not outwardOnly]
+
+
+def compact(obj, project=None):
+    """Converts youtrack object into compact record. Issues are grouped by project."""
+    if project is None:
+        project = getattr(obj, 'projectShortName', None)
+    schema = get_schema(obj.__class__, project)
+    values = {}
+    for name, value in obj.__dict__.items():
+        if name not in ('youtrack', '_attribute_types'):
+            values[schema.add(name)] = value
+    for name, attr_type in obj.__dict__.get('_attribute_types', {}).items():
+        schema.types.setdefault(schema.names[schema.add(name)], attr_type)
+    parts = []
+    extras = []
+    for position in range(max(values) + 1 if values else 0):
+        value = values.get(position, _MISSING)
+        if value is _MISSING:
+            parts.append(_ABSENT)
+        elif value is None:
+            parts.append(_NONE)
+        elif isinstance(value, unicode) and not _RESERVED.search(value):
+            parts.append(value.encode('utf-8'))
+        else:
+            parts.append(_EXTRA)
+            extras.append(_pack(value))
+    record_cls = CompactIssue if isinstance(obj, youtrack.Issue) else CompactRecord
+    return record_cls(schema, _SEPARATOR.join(parts), tuple(extras))
+
+
+def compact_issue(issue):
+    return compact(issue)
+
+
+def compact_issues(issues):
+    return [compact(issue) for issue in issues]
@@ -0,0 +1,145 @@
+"""
+Compression of request and response bodies.
+
+httplib2 asks for gzip or deflate encoded responses and decodes them itself,
+urllib2 used for attachments doesn't, so attachment responses are wrapped into
+DecompressingReader which decodes the body while it is read. Bodies of
+requests to /import/ can be gzipped too, if the server accepts that.
+
+CompressionStats counts the bytes which went over the wire and the bytes they
+stand for:
+
+    connection = Connection(url, login, password, compress_uploads=True)
+    ...
+    print connection.compression.saved
+"""
+
+import gzip
+import threading
+import zlib
+from StringIO import StringIO
+
+ACCEPT_ENCODING = 'gzip, deflate'
+ENCODINGS = ('gzip', 'deflate')
+CHUNK_SIZE = 64 * 1024
+# smaller bodies don't get any shorter
+MIN_SIZE = 1024
+
+
+class CompressionStats(object):
+    """ Counters are updated by all threads of the connection """
+
+    def __init__(self):
+        self.received = 0
+        self.received_decoded = 0
+        self.sent = 0
+        self.sent_raw = 0
+        self._lock = threading.Lock()
+
+    def add_response(self, wire_size, size):
+        with self._lock:
+            self.received += wire_size
+            self.received_decoded += size
+
+    def add_request(self, size, wire_size):
+        with self._lock:
+            self.sent += wire_size
+            self.sent_raw += size
+
+    @property
+    def saved(self):
+        with self._lock:
+            return self.received_decoded - self.received + self.sent_raw - self.sent
+
+    def __repr__(self):
+        return 'received %d bytes for %d, sent %d bytes for %d, saved %d bytes' % (
+            self.received, self.received_decoded, self.sent, self.sent_raw, self.saved)
+
+
+def compress(body):
+    """ gzip encoded body """
+    buf = StringIO()
+    f = gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6)
+    try:
+        f.write(body)
+    finally:
+        f.close()
+    return buf.getvalue()
+
+
+def _decompressor(encoding):
+    if encoding == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    return zlib.decompressobj()
+
+
+class DecompressingReader(object):
+    """ File-like wrapper of urllib2 response with gzip or deflate encoded body.
+        Content-Length and Content-Encoding headers are removed from info(),
+        because they describe the encoded body.
+    """
+
+    def __init__(self, response, stats=None):
+        self._response = response
+        self._stats = stats
+        self.headers = response.info()
+        self._encoding = self.headers.get('content-encoding')
+        for header in ('content-length', 'content-encoding'):
+            if header in self.headers:
+                del self.headers[header]
+        self._decompressor = _decompressor(self._encoding)
+        self._buffer = ''
+        self._eof = False
+        self._wire_size = 0
+        self._size = 0
+
+    def _decompress(self, data):
+        try:
+            return self._decompressor.decompress(data)
+        except zlib.error:
+            # some servers send raw deflate stream without zlib header
+            if self._encoding != 'deflate' or self._wire_size != len(data):
+                raise
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._decompressor.decompress(data)
+
+    def _fill(self, size):
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            data = self._response.read(CHUNK_SIZE)
+            if data:
+                self._wire_size += len(data)
+                data = self._decompress(data)
+            else:
+                data = self._decompressor.flush()
+                self._eof = True
+                if self._stats is not None:
+                    self._stats.add_response(self._wire_size, self._size + len(self._buffer) + len(data))
+            self._buffer += data
+
+    def read(self, size=-1):
+        self._fill(size)
+        if size < 0:
+            data, self._buffer = self._buffer, ''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self._size += len(data)
+        return data
+
+    def info(self):
+        return self.headers
+
+    def geturl(self):
+        return self._response.geturl()
+
+    def getcode(self):
+        return self._response.getcode()
+
+    def close(self):
+        self._response.close()
+
+
+def decoding_response(response, stats=None):
+    """ Wraps urllib2 response into DecompressingReader if its body is encoded """
+    if response.info().get('content-encoding') in ENCODINGS:
+        return DecompressingReader(response, stats)
+    return response
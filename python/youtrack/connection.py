@@ -1,8 +1,8 @@
 import calendar
 import time
 from datetime import datetime
+import httplib
 import httplib2
-from xml.dom import minidom
 import sys
 import youtrack
 from xml.dom import Node
@@ -12,7 +12,16 @@ from xml.sax.saxutils import escape, quoteattr
 import json
 import urllib2_file
 import tempfile
+import hashlib
+import shutil
 import functools
+import threading
+from youtrack.compact import compact_issues
+from youtrack import xmlbackend
+from youtrack.metrics import get_metrics
+from youtrack.tracing import NO_SPAN, Hooks, traced
+from youtrack.retry import NO_RETRY, RETRYABLE_ERRORS
+from youtrack.compression import ACCEPT_ENCODING, MIN_SIZE, CompressionStats, compress, decoding_response
 
 def urlquote(s):
     return urllib.quote(utf8encode(s), safe="")
@@ -35,10 +44,72 @@ def relogin_on_401(f):
     return wrapped
 
 
+# servers which can't send json for a resource still answer with xml
+JSON_ACCEPT = 'application/json, application/xml;q=0.9'
+
+
+def _is_json(response):
+    return response.get('content-type', '').find('application/json') != -1
+
+
+class _WireSizeResponse(httplib.HTTPResponse):
+    """ Keeps the size of the body as received in '-content-length' header,
+        because httplib2 decodes compressed bodies and replaces content-length
+    """
+
+    def read(self, amt=None):
+        data = httplib.HTTPResponse.read(self, amt)
+        if amt is None:
+            self.msg['-content-length'] = str(len(data))
+        return data
+
+
+class _HTTPConnection(httplib2.HTTPConnectionWithTimeout):
+    response_class = _WireSizeResponse
+
+
+class _HTTPSConnection(httplib2.HTTPSConnectionWithTimeout):
+    response_class = _WireSizeResponse
+
+
+class _Http(httplib2.Http):
+    def request(self, uri, method="GET", body=None, headers=None, redirections=httplib2.DEFAULT_MAX_REDIRECTS,
+                connection_type=None):
+        if connection_type is None:
+            connection_type = {'http': _HTTPConnection, 'https': _HTTPSConnection}.get(uri.split(':', 1)[0].lower())
+        return httplib2.Http.request(self, uri, method, body, headers, redirections, connection_type)
+
+
 class Connection(object):
-    def __init__(self, url, login=None, password=None, proxy_info=None, api_key=None):
-        self.http = httplib2.Http(disable_ssl_certificate_validation=True) if proxy_info is None else httplib2.Http(
-            proxy_info=proxy_info, disable_ssl_certificate_validation=True)
+    def __init__(self, url, login=None, password=None, proxy_info=None, api_key=None, prefer_json=False,
+                 compress_uploads=False, cache=None, retry_policy=None, rate_limiter=None, metrics=None):
+        """ With prefer_json issues, comments, attachments, links, users, groups, projects,
+            custom fields and link types are requested as json and mapped into objects
+            without building xml tree, which is several times faster for large exports.
+            With compress_uploads bodies of requests to /import/ are sent gzipped.
+            cache is youtrack.cache.ResponseCache revalidating admin resources.
+            retry_policy is youtrack.retry.RetryPolicy deciding which failed requests
+            are repeated, by default none is.
+            rate_limiter is youtrack.ratelimit.RateLimiter throttling the requests.
+            metrics is youtrack.metrics.Metrics recording the requests, by default
+            the one shared by all connections to the server.
+            Request hooks and tracer are set up afterwards, see youtrack.tracing.
+            Connection can be used from several threads, every thread gets its own
+            http connection and they share the session.
+        """
+        self.prefer_json = prefer_json
+        self.compress_uploads = compress_uploads
+        self.compression = CompressionStats()
+        self.cache = cache
+        self.retry_policy = retry_policy if retry_policy is not None else NO_RETRY
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics if metrics is not None else get_metrics(url.rstrip('/') if url else url)
+        self.hooks = Hooks()
+        self.tracer = None
+        # cached responses are shared by connections of the same user only
+        self._identity = login if api_key is None else 'api-key:' + hashlib.sha1(api_key).hexdigest()
+        self._proxy_info = proxy_info
+        self._local = threading.local()
 
         # Remove the last character of the url ends with "/"
         if url:
@@ -52,6 +123,22 @@ class Connection(object):
         else:
             self.headers = {'X-YouTrack-ApiKey': api_key}
 
+    @property
+    def http(self):
+        # httplib2.Http keeps one socket per host and can't be shared between threads
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            if self._proxy_info is None:
+                http = _Http(disable_ssl_certificate_validation=True)
+            else:
+                http = _Http(proxy_info=self._proxy_info, disable_ssl_certificate_validation=True)
+            self._local.http = http
+        return http
+
+    @http.setter
+    def http(self, http):
+        self._local.http = http
+
     def _login(self, login, password):
         response, content = self.http.request(
             self.baseUrl + "/user/login?login=" + urllib.quote_plus(login) + "&password=" + urllib.quote_plus(password),
@@ -63,29 +150,110 @@ class Connection(object):
                         'Cache-Control': 'no-cache'}
 
     @relogin_on_401
-    def _req(self, method, url, body=None, ignoreStatus=None, content_type=None):
+    def _req(self, method, url, body=None, ignoreStatus=None, content_type=None, accept=None):
         headers = self.headers
+        if accept is not None:
+            headers = headers.copy()
+            headers['Accept'] = accept
         if method == 'PUT' or method == 'POST':
             headers = headers.copy()
             if content_type is None:
                 content_type = 'application/xml; charset=UTF-8'
             headers['Content-Type'] = content_type
+            if body and self.compress_uploads and url.startswith('/import/') and len(body) >= MIN_SIZE:
+                body = utf8encode(body)
+                size = len(body)
+                body = compress(body)
+                headers['Content-Encoding'] = 'gzip'
+                self.compression.add_request(size, len(body))
             headers['Content-Length'] = str(len(body)) if body else '0'
 
-        response, content = self.http.request((self.baseUrl + url).encode('utf-8'), method, headers=headers, body=body)
+        cache_key = cached = None
+        if method == 'GET' and self.cache is not None and self.cache.accepts(url):
+            cache_key = self.cache.key(self._identity, url, accept)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                headers = headers.copy()
+                headers.update(cached.validators())
+
+        response, content = self._send(method, url, headers, body)
+        # httplib2 asks for compressed responses and decodes them, _Http keeps the size received
+        self.compression.add_response(int(response.get('-content-length', len(content))), len(content))
+        if cached is not None and response.status == 304:
+            self.cache.hit()
+            response, content = cached.response(), cached.content
+        elif cache_key is not None and response.status == 200:
+            self.cache.miss()
+            self.cache.put(cache_key, response, content)
         content = content.translate(None, '\0')
         if response.status != 200 and response.status != 201 and (ignoreStatus != response.status):
             raise youtrack.YouTrackException(url, response, content)
 
         return response, content
 
-    def _reqXml(self, method, url, body=None, ignoreStatus=None):
-        response, content = self._req(method, url, body, ignoreStatus)
+    def _send(self, method, url, headers, body):
+        """ Makes http request, repeating it according to the retry policy """
+        policy = self.retry_policy
+        limiter = self.rate_limiter
+        hooks = self.hooks
+        retry_count = 0
+        while True:
+            if limiter is not None:
+                limiter.acquire(method, url)
+            for hook in hooks.before_request:
+                hook(self, method, url, headers, body)
+            started = time.time()
+            response = error = exc_info = None
+            try:
+                response, content = self.http.request((self.baseUrl + url).encode('utf-8'), method,
+                                                      headers=headers, body=body)
+            except RETRYABLE_ERRORS, e:
+                error = e
+                exc_info = sys.exc_info()
+            except BaseException, e:
+                # not repeated, but the hooks see the end of the attempt, so that spans are finished
+                exc_info = sys.exc_info()
+                for hook in hooks.after_response:
+                    hook(self, method, url, None, time.time() - started, e)
+                raise exc_info[0], exc_info[1], exc_info[2]
+            seconds = time.time() - started
+            if response is not None:
+                self.metrics.record(method, url, seconds, response.status, len(body) if body else 0,
+                                    int(response.get('-content-length', len(content))))
+            else:
+                self.metrics.record(method, url, seconds, None, len(body) if body else 0)
+            if limiter is not None:
+                limiter.record(method, url, seconds, response.status if response is not None else None)
+            for hook in hooks.after_response:
+                hook(self, method, url, response, seconds, error)
+
+            if not policy.should_retry(method, url, retry_count, response=response, error=error):
+                if exc_info is not None:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                return response, content
+            delay = policy.wait(retry_count, response)
+            self.metrics.record_retry(method, url)
+            for hook in hooks.on_retry:
+                hook(self, method, url, retry_count, delay, response, error)
+            retry_count += 1
+
+    def span(self, name, **attributes):
+        """ Span of the tracer, see youtrack.tracing, use it in with statement """
+        if self.tracer is None:
+            return NO_SPAN
+        return self.tracer.span(name, **attributes)
+
+    def stats(self):
+        """ Request stats by endpoint template, see youtrack.metrics """
+        return self.metrics.stats()
+
+    def _reqXml(self, method, url, body=None, ignoreStatus=None, accept=None):
+        response, content = self._req(method, url, body, ignoreStatus, accept=accept)
         if response.has_key('content-type'):
             if (response["content-type"].find('application/xml') != -1 or response["content-type"].find(
                 'text/xml') != -1) and content is not None and content != '':
                 try:
-                    return minidom.parseString(content)
+                    return xmlbackend.parseString(content)
                 except Exception:
                     return ""
             elif response['content-type'].find('application/json') != -1 and content is not None and content != '':
@@ -105,8 +273,28 @@ class Connection(object):
     def _put(self, url):
         return self._reqXml('PUT', url, '<empty/>\n\n')
 
+    def _accept(self):
+        return JSON_ACCEPT if self.prefer_json else None
+
+    def _getEntity(self, url):
+        """ Document, or dict in json mode """
+        return self._reqXml('GET', url, accept=self._accept())
+
+    def _getEntities(self, url, key=None):
+        """ Child elements of the root of xml document, or items of json list.
+            Some resources wrap json list in object, key is the name of the list in it.
+        """
+        response, content = self._req('GET', url, accept=self._accept())
+        if _is_json(response):
+            items = json.loads(content) if content else []
+            if isinstance(items, dict):
+                items = items.get(key) or []
+            return items if isinstance(items, list) else [items]
+        xml = xmlbackend.parseString(content)
+        return [e for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
+
     def getIssue(self, id):
-        return youtrack.Issue(self._get("/issue/" + id), self)
+        return youtrack.Issue(self._getEntity("/issue/" + id), self)
 
     def createIssue(self, project, assignee, summary, description, priority=None, type=None, subsystem=None, state=None,
                     affectsVersion=None,
@@ -144,18 +332,19 @@ class Connection(object):
                 self._get("/issue/%s/changes" % issue).getElementsByTagName('change')]
 
     def getComments(self, id):
-        response, content = self._req('GET', '/issue/' + id + '/comment')
-        xml = minidom.parseString(content)
-        return [youtrack.Comment(e, self) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
+        return [youtrack.Comment(e, self) for e in self._getEntities('/issue/' + id + '/comment', 'comment')]
 
     def getAttachments(self, id):
-        response, content = self._req('GET', '/issue/' + id + '/attachment')
-        xml = minidom.parseString(content)
-        return [youtrack.Attachment(e, self) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
+        return [youtrack.Attachment(e, self) for e in self._getEntities('/issue/' + id + '/attachment', 'fileUrl')]
 
+    @traced('attachment download', lambda url: {'url': url})
     def getAttachmentContent(self, url):
-        f = urllib2.urlopen(urllib2.Request(self.url + url, headers=self.headers))
-        return f
+        headers = self.headers.copy()
+        headers['Accept-Encoding'] = ACCEPT_ENCODING
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire('GET', url)
+        f = urllib2.urlopen(urllib2.Request(self.url + url, headers=headers))
+        return decoding_response(f, self.compression)
 
     def deleteAttachment(self, issue_id, attachment_id):
         return self._req('DELETE', '/issue/%s/attachment/%s' % (issue_id, attachment_id))
@@ -212,6 +401,8 @@ class Connection(object):
             raise e
             
 
+    @traced('attachment upload', lambda authorLogin, content, contentLength, contentType, created, group, issueId,
+                                        name, url_prefix='/issue/': {'issue': issueId, 'name': name})
     def _process_attachmnets(self, authorLogin, content, contentLength, contentType, created, group, issueId, name,
                              url_prefix='/issue/'):
         if contentType is not None:
@@ -220,7 +411,7 @@ class Connection(object):
             content.contentLength = contentLength
         elif not isinstance(content, file):
             tmp = tempfile.NamedTemporaryFile(mode='w+b')
-            tmp.write(content.read())
+            shutil.copyfileobj(content, tmp)
             tmp.flush()
             tmp.seek(0)
             content = tmp
@@ -247,6 +438,8 @@ class Connection(object):
         r = urllib2.Request(url,
             headers=headers, data=post_data)
         #r.set_proxy('localhost:8888', 'http')
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire('POST', url_prefix + issueId + '/attachment')
         try:
             res = urllib2.urlopen(r)
         except urllib2.HTTPError, e:
@@ -267,10 +460,8 @@ class Connection(object):
 
 
     def getLinks(self, id, outwardOnly=False):
-        response, content = self._req('GET', '/issue/' + urlquote(id) + '/link')
-        xml = minidom.parseString(content)
         res = []
-        for c in [e for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]:
+        for c in self._getEntities('/issue/' + urlquote(id) + '/link', 'issueLink'):
             link = youtrack.Link(c, self)
             if link.source == id or not outwardOnly:
                 res.append(link)
@@ -279,7 +470,7 @@ class Connection(object):
     def getUser(self, login):
         """ http://confluence.jetbrains.net/display/YTD2/GET+user
         """
-        return youtrack.User(self._get("/admin/user/" + urlquote(login.encode('utf8'))), self)
+        return youtrack.User(self._getEntity("/admin/user/" + urlquote(login.encode('utf8'))), self)
 
     def createUser(self, user):
         """ user from getUser
@@ -297,6 +488,7 @@ class Connection(object):
     #                         '&jabber=' + jabber)
 
 
+    @traced('importUsers', lambda users: {'users': len(users)})
     def importUsers(self, users):
         """ Import users, returns import result (http://confluence.jetbrains.net/display/YTD2/Import+Users)
             Example: importUsers([{'login':'vadim', 'fullName':'vadim', 'email':'eee@ss.com', 'jabber':'fff@fff.com'},
@@ -320,6 +512,7 @@ class Connection(object):
                                    urllib.urlencode({'assigneeGroup': assigneeGroup}),
             xml, 400).toxml()
 
+    @traced('importLinks', lambda links: {'links': len(links)})
     def importLinks(self, links):
         """ Import links, returns import result (http://confluence.jetbrains.net/display/YTD2/Import+Links)
             Accepts result of getLinks()
@@ -336,6 +529,8 @@ class Connection(object):
         res = self._reqXml('PUT', '/import/links', xml, 400)
         return res.toxml() if hasattr(res, "toxml") else res
 
+    @traced('importIssues', lambda projectId, assigneeGroup, issues, test=False: {'project': projectId,
+                                                                              'issues': len(issues)})
     def importIssues(self, projectId, assigneeGroup, issues, test=False):
         """ Import issues, returns import result (http://confluence.jetbrains.net/display/YTD2/Import+Issues)
             Accepts retrun of getIssues()
@@ -432,7 +627,7 @@ class Connection(object):
             sys.stderr.write("request was")
             sys.stderr.write(xml)
             return response
-        item_elements = minidom.parseString(response).getElementsByTagName("item")
+        item_elements = xmlbackend.parseString(response).getElementsByTagName("item")
         if len(item_elements) != len(issues):
             sys.stderr.write(response)
         else:
@@ -463,32 +658,30 @@ class Connection(object):
     def getProject(self, projectId):
         """ http://confluence.jetbrains.net/display/YTD2/GET+project
         """
-        return youtrack.Project(self._get("/admin/project/" + urlquote(projectId)), self)
+        return youtrack.Project(self._getEntity("/admin/project/" + urlquote(projectId)), self)
 
     def getProjectIds(self):
         response, content = self._req('GET', '/admin/project/')
-        xml = minidom.parseString(content)
+        xml = xmlbackend.parseString(content)
         return [e.getAttribute('id') for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
 
     def getProjectAssigneeGroups(self, projectId):
         response, content = self._req('GET', '/admin/project/' + urlquote(projectId) + '/assignee/group')
-        xml = minidom.parseString(content)
+        xml = xmlbackend.parseString(content)
         return [youtrack.Group(e, self) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
 
     def getGroup(self, name):
-        return youtrack.Group(self._get("/admin/group/" + urlquote(name.encode('utf-8'))), self)
+        return youtrack.Group(self._getEntity("/admin/group/" + urlquote(name.encode('utf-8'))), self)
 
     def getGroups(self):
-        response, content = self._req('GET', '/admin/group')
-        xml = minidom.parseString(content)
-        return [youtrack.Group(e, self) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
+        return [youtrack.Group(e, self) for e in self._getEntities('/admin/group', 'userGroup')]
 
     def deleteGroup(self, name):
         return self._req('DELETE', "/admin/group/" + urlquote(name.encode('utf-8')))
 
     def getUserGroups(self, userName):
         response, content = self._req('GET', '/admin/user/%s/group' % urlquote(userName.encode('utf-8')))
-        xml = minidom.parseString(content)
+        xml = xmlbackend.parseString(content)
         return [youtrack.Group(e, self) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
 
     def setUserGroup(self, user_name, group_name):
@@ -518,12 +711,12 @@ class Connection(object):
 
     def getRoles(self):
         response, content = self._req('GET', '/admin/role')
-        xml = minidom.parseString(content)
+        xml = xmlbackend.parseString(content)
         return [youtrack.Role(e, self) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
 
     def getGroupRoles(self, group_name):
         response, content = self._req('GET', '/admin/group/%s/role' % urlquote(group_name))
-        xml = minidom.parseString(content)
+        xml = xmlbackend.parseString(content)
         return [youtrack.UserRole(e, self) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
 
     def createRole(self, role):
@@ -550,27 +743,27 @@ class Connection(object):
 
     def getRolePermissions(self, role):
         response, content = self._req('GET', '/admin/role/%s/permission' % urlquote(role.name))
-        xml = minidom.parseString(content)
+        xml = xmlbackend.parseString(content)
         return [youtrack.Permission(e, self) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
 
     def getPermissions(self):
         response, content = self._req('GET', '/admin/permission')
-        xml = minidom.parseString(content)
+        xml = xmlbackend.parseString(content)
         return [youtrack.Permission(e, self) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
 
     def getSubsystem(self, projectId, name):
         response, content = self._req('GET', '/admin/project/' + projectId + '/subsystem/' + urlquote(name))
-        xml = minidom.parseString(content)
+        xml = xmlbackend.parseString(content)
         return youtrack.Subsystem(xml, self)
 
     def getSubsystems(self, projectId):
         response, content = self._req('GET', '/admin/project/' + projectId + '/subsystem')
-        xml = minidom.parseString(content)
+        xml = xmlbackend.parseString(content)
         return [youtrack.Subsystem(e, self) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
 
     def getVersions(self, projectId):
         response, content = self._req('GET', '/admin/project/' + urlquote(projectId) + '/version?showReleased=true')
-        xml = minidom.parseString(content)
+        xml = xmlbackend.parseString(content)
         return [self.getVersion(projectId, v.getAttribute('name')) for v in
                 xml.documentElement.getElementsByTagName('version')]
 
@@ -580,7 +773,7 @@ class Connection(object):
 
     def getBuilds(self, projectId):
         response, content = self._req('GET', '/admin/project/' + urlquote(projectId) + '/build')
-        xml = minidom.parseString(content)
+        xml = xmlbackend.parseString(content)
         return [youtrack.Build(e, self) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
 
 
@@ -590,21 +783,15 @@ class Connection(object):
         position = 0
         user_search_params = urllib.urlencode(params)
         while True:
-            response, content = self._req('GET', "/admin/user/?start=%s&%s" % (str(position), user_search_params))
+            newUsers = [youtrack.User(e, self) for e in
+                        self._getEntities("/admin/user/?start=%s&%s" % (str(position), user_search_params), 'user')]
             position += 10
-            xml = minidom.parseString(content)
-            newUsers = [youtrack.User(e, self) for e in xml.documentElement.childNodes if
-                        e.nodeType == Node.ELEMENT_NODE]
             if not len(newUsers): return users
             users += newUsers
 
 
     def getUsersTen(self, start):
-        response, content = self._req('GET', "/admin/user/?start=%s" % str(start))
-        xml = minidom.parseString(content)
-        users = [youtrack.User(e, self) for e in xml.documentElement.childNodes if
-                 e.nodeType == Node.ELEMENT_NODE]
-        return users
+        return [youtrack.User(e, self) for e in self._getEntities("/admin/user/?start=%s" % str(start), 'user')]
 
     def deleteUser(self, login):
         return self._req('DELETE', "/admin/user/" + urlquote(login.encode('utf-8')))
@@ -689,12 +876,16 @@ class Connection(object):
 
     def getIssues(self, projectId, filter, after, max):
         #response, content = self._req('GET', '/project/issues/' + urlquote(projectId) + "?" +
-        response, content = self._req('GET', '/issue/byproject/' + urlquote(projectId) + "?" +
-                                             urllib.urlencode({'after': str(after),
-                                                               'max': str(max),
-                                                               'filter': filter}))
-        xml = minidom.parseString(content)
-        return [youtrack.Issue(e, self) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
+        url = '/issue/byproject/' + urlquote(projectId) + "?" + urllib.urlencode({'after': str(after),
+                                                                                  'max': str(max),
+                                                                                  'filter': filter})
+        return [youtrack.Issue(e, self) for e in self._getEntities(url, 'issue')]
+
+    def getCompactIssues(self, projectId, filter, after, max):
+        """ Same as getIssues(), but returns compact records that take much less memory.
+            Use record.materialize(connection) to get ordinary issue.
+        """
+        return compact_issues(self.getIssues(projectId, filter, after, max))
 
     def getNumberOfIssues(self, filter = '', waitForServer=True):
         while True:
@@ -714,7 +905,7 @@ class Connection(object):
 
     def getAllSprints(self,agileID):
         response, content = self._req('GET', '/agile/' + agileID + "/sprints?")
-        xml = minidom.parseString(content)
+        xml = xmlbackend.parseString(content)
         return [(e.getAttribute('name'),e.getAttribute('start'),e.getAttribute('finish')) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
 
     def getAllIssues(self, filter = '', after = 0, max = 999999, withFields = ()):
@@ -722,16 +913,17 @@ class Connection(object):
                     [('after',str(after)),
                     ('max',str(max)),
                     ('filter',filter)]
-        response, content = self._req('GET', '/issue' + "?" +
-                                             urllib.urlencode(urlJobby))
-        xml = minidom.parseString(content)
-        return [youtrack.Issue(e, self) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
+        issues = [youtrack.Issue(e, self) for e in self._getEntities('/issue' + "?" + urllib.urlencode(urlJobby), 'issue')]
+        if withFields and 'comment' not in withFields:
+            # comments were not requested, so they should be loaded on demand
+            for issue in issues:
+                issue.comments = None
+        return issues
 
     def exportIssueLinks(self):
-        response, content = self._req('GET', '/export/links')
-        xml = minidom.parseString(content)
-        return [youtrack.Link(e, self) for e in xml.documentElement.childNodes if e.nodeType == Node.ELEMENT_NODE]
+        return [youtrack.Link(e, self) for e in self._getEntities('/export/links', 'issueLink')]
 
+    @traced('executeCommand', lambda issueId, command, *args, **kwargs: {'issue': issueId, 'command': command})
     def executeCommand(self, issueId, command, comment=None, group=None, run_as=None, disable_notifications=False):
         if isinstance(command, unicode):
             command = command.encode('utf-8')
@@ -759,13 +951,11 @@ class Connection(object):
         return "Command executed"
 
     def getCustomField(self, name):
-        return youtrack.CustomField(self._get("/admin/customfield/field/" + urlquote(name.encode('utf-8'))), self)
+        return youtrack.CustomField(self._getEntity("/admin/customfield/field/" + urlquote(name.encode('utf-8'))), self)
 
     def getCustomFields(self):
-        response, content = self._req('GET', '/admin/customfield/field')
-        xml = minidom.parseString(content)
-        return [self.getCustomField(e.getAttribute('name')) for e in xml.documentElement.childNodes if
-                e.nodeType == Node.ELEMENT_NODE]
+        return [self.getCustomField(e['name'] if isinstance(e, dict) else e.getAttribute('name'))
+                for e in self._getEntities('/admin/customfield/field', 'customFieldPrototype')]
 
     def createCustomField(self, cf):
         params = dict([])
@@ -806,7 +996,7 @@ class Connection(object):
 
     def getProjectCustomFields(self, projectId):
         response, content = self._req('GET', '/admin/project/' + urlquote(projectId) + '/customfield')
-        xml = minidom.parseString(content)
+        xml = xmlbackend.parseString(content)
         return [self.getProjectCustomField(projectId, e.getAttribute('name')) for e in
                 xml.getElementsByTagName('projectCustomField')]
 
@@ -832,9 +1022,7 @@ class Connection(object):
         self._req('DELETE', '/admin/project/' + urlquote(project_id) + "/customfield/" + urlquote(pcf_name))
 
     def getIssueLinkTypes(self):
-        response, content = self._req('GET', '/admin/issueLinkType')
-        xml = minidom.parseString(content)
-        return [youtrack.IssueLinkType(e, self) for e in xml.getElementsByTagName('issueLinkType')]
+        return [youtrack.IssueLinkType(e, self) for e in self._getEntities('/admin/issueLinkType', 'issueLinkType')]
 
     def createIssueLinkTypes(self, issueLinkTypes):
         for ilt in issueLinkTypes:
@@ -862,7 +1050,7 @@ class Connection(object):
         try:
             response, content = self._req('GET',
                 '/issue/%s/timetracking/workitem' % urlquote(issue_id))
-            xml = minidom.parseString(content)
+            xml = xmlbackend.parseString(content)
             return [youtrack.WorkItem(e, self) for e in xml.documentElement.childNodes if
                     e.nodeType == Node.ELEMENT_NODE]
         except youtrack.YouTrackException, e:
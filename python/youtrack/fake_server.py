@@ -0,0 +1,872 @@
+"""
+In-memory YouTrack REST server for tests and benchmarks.
+
+    server = FakeYouTrack(latency=0.005)
+    server.store.generate('SB', 1000, description_size=2000, comments=5)
+    server.start()
+    yt = Connection(server.url, 'root', 'root')
+    ...
+    server.stop()
+
+It answers /rest/user/login, /rest/issue, /rest/import/* and /rest/admin/*
+with xml in the format of YouTrack 4-6, so scripts and synchronizers run
+against it unchanged. Only the part of search query language used by the
+scripts is understood: 'issue id: A, B', 'updated: FROM .. TO', 'tag: T'
+and 'Field: {value}'; other terms are ignored. Commands set fields of the
+issue, add tags and comments.
+
+latency seconds are added to every response, and generate() sets the size
+of descriptions, the number of comments, links, changes and attachments of
+the generated issues. server.requests counts handled requests by endpoint
+template, like youtrack.metrics does on the client side.
+"""
+
+import random
+import re
+import socket
+import threading
+import time
+import urllib
+import urlparse
+import zlib
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from collections import OrderedDict
+from xml.sax.saxutils import escape, quoteattr
+
+from youtrack import xmlbackend
+from youtrack.metrics import endpoint_template
+
+
+ELEMENT_NODE = 1
+
+STATES = ('Submitted', 'Open', 'In Progress', 'Fixed', 'Verified')
+PRIORITIES = ('Minor', 'Normal', 'Major', 'Critical', 'Show-stopper')
+TYPES = ('Bug', 'Feature', 'Task', 'Exception')
+LINK_TYPES = (('Relates', 'relates to', 'relates to', 'false'),
+              ('Depend', 'is required for', 'depends on', 'true'),
+              ('Duplicate', 'is duplicated by', 'duplicates', 'true'))
+PERMISSIONS = ('READ_ISSUE', 'UPDATE_ISSUE', 'CREATE_ISSUE', 'CREATE_COMMENT', 'READ_PROJECT')
+USERS_PAGE = 10
+
+WORDS = ('the', 'issue', 'fails', 'when', 'user', 'opens', 'project', 'settings', 'page', 'after', 'update',
+         'server', 'returns', 'error', 'null', 'pointer', 'exception', 'in', 'parser', 'import', 'of', 'large',
+         'file', 'is', 'slow', 'memory', 'grows', 'with', 'each', 'request', 'see', 'attached', 'log')
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+def random_text(rnd, size):
+    """ Words chosen by rnd, size characters long """
+    words = []
+    length = 0
+    while length < size:
+        word = rnd.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return u' '.join(words)[:size]
+
+
+def _attrs(**attrs):
+    return u''.join(u' %s=%s' % (name, quoteattr(unicode(value))) for name, value in sorted(attrs.items())
+                    if value is not None)
+
+
+def _field_xml(name, value):
+    values = value if isinstance(value, list) else [value]
+    return u'<field name=%s>%s</field>' % (quoteattr(name), u''.join(u'<value>%s</value>' % escape(unicode(v))
+                                                                      for v in values))
+
+
+def _element_text(el):
+    return u''.join(c.data for c in el.childNodes if c.nodeType != ELEMENT_NODE)
+
+
+def _elements(el, tag_name=None):
+    return [c for c in el.childNodes if c.nodeType == ELEMENT_NODE and (tag_name is None or c.tagName == tag_name)]
+
+
+def _parse_time(value):
+    """ Milliseconds of the date of search query, the year may be omitted """
+    for fmt in ('%Y-%m-%dT%H:%M:%S', '%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            parsed = time.strptime(value, fmt)
+        except ValueError:
+            continue
+        if '%Y' not in fmt:
+            parsed = time.strptime('%d-%s' % (time.localtime().tm_year, value), '%Y-' + fmt)
+        return int(time.mktime(parsed) * 1000)
+    raise HttpError(400, 'Can not parse date: ' + value)
+
+
+class Store(object):
+    """ Users, groups, roles, projects, fields and issues of the server """
+
+    def __init__(self, login='root', password='root'):
+        self.lock = threading.RLock()
+        self.users = OrderedDict()
+        self.groups = OrderedDict()
+        self.roles = OrderedDict()
+        self.projects = OrderedDict()
+        self.custom_fields = OrderedDict()
+        self.link_types = OrderedDict()
+        self.issues = {}
+        self.links = OrderedDict()
+        self.contents = {}
+        self.commands = []
+        self.addUser(login, password=password, fullName=login)
+        self.addGroup('All Users')
+        for name, outward, inward, directed in LINK_TYPES:
+            self.link_types[name] = {'name': name, 'outwardName': outward, 'inwardName': inward,
+                                     'directed': directed}
+
+    def addUser(self, login, password=None, fullName=None, email=None, groups=('All Users',)):
+        with self.lock:
+            self.users[login] = {'login': login, 'password': password, 'fullName': fullName or login,
+                                 'email': email or login + '@example.com', 'groups': list(groups)}
+
+    def addGroup(self, name, description='', roles=None):
+        with self.lock:
+            self.groups[name] = {'name': name, 'description': description, 'roles': dict(roles or {})}
+
+    def addRole(self, name, description='', permissions=PERMISSIONS):
+        with self.lock:
+            self.roles[name] = {'name': name, 'description': description, 'permissions': list(permissions)}
+
+    def addProject(self, project_id, name=None, lead='root', description=''):
+        with self.lock:
+            self.projects[project_id] = {'id': project_id, 'name': name or project_id, 'lead': lead,
+                                         'description': description, 'fields': OrderedDict(), 'issues': [],
+                                         'next': 1}
+            return self.projects[project_id]
+
+    def project(self, project_id):
+        project = self.projects.get(project_id)
+        if project is None:
+            raise HttpError(404, 'Project not found: ' + project_id)
+        return project
+
+    def issue(self, issue_id):
+        issue = self.issues.get(issue_id)
+        if issue is None:
+            raise HttpError(404, 'Issue not found: ' + issue_id)
+        return issue
+
+    def user(self, login):
+        user = self.users.get(login)
+        if user is None:
+            raise HttpError(404, 'User not found: ' + login)
+        return user
+
+    def putIssue(self, project_id, number, fields, comments=(), tags=()):
+        """ Creates or replaces the issue, fields is a dict of strings or lists of strings """
+        with self.lock:
+            project = self.project(project_id)
+            issue_id = u'%s-%d' % (project_id, number)
+            issue = self.issues.get(issue_id)
+            if issue is None:
+                project['issues'].append(issue_id)
+            all_fields = OrderedDict([('projectShortName', project_id), ('numberInProject', unicode(number))])
+            all_fields.update(fields)
+            self.issues[issue_id] = issue = {'id': issue_id, 'project': project_id, 'fields': all_fields,
+                                             'comments': list(comments), 'tags': list(tags), 'attachments': [],
+                                             'changes': issue['changes'] if issue else []}
+            project['next'] = max(project['next'], number + 1)
+            return issue
+
+    def addLink(self, type_name, source, target):
+        with self.lock:
+            self.links[(type_name, source, target)] = True
+
+    def addComment(self, issue, author, text, created=None):
+        created = unicode(created or _now())
+        issue['comments'].append({'id': u'%s-c%d' % (issue['id'], len(issue['comments']) + 1), 'author': author,
+                                  'authorFullName': self.users.get(author, {}).get('fullName', author),
+                                  'issueId': issue['id'], 'deleted': 'false', 'text': text, 'created': created,
+                                  'updated': created})
+
+    def addAttachment(self, issue, name, content, author, created=None):
+        attachment_id = u'%d-%d' % (len(self.contents), len(issue['attachments']))
+        self.contents[attachment_id] = content
+        issue['attachments'].append({'id': attachment_id, 'name': name, 'authorLogin': author,
+                                     'created': unicode(created or _now()),
+                                     'url': u'/_persistent/%s?file=%s&v=0' % (urllib.quote(name), attachment_id)})
+
+    def generate(self, project_id, count, description_size=200, comments=2, comment_size=100, links=1, tags=1,
+                 attachments=0, attachment_size=1024, changes=2, users=20, seed=0):
+        """ Adds count issues to the project, creating it and its users if needed """
+        rnd = random.Random(seed)
+        with self.lock:
+            if project_id not in self.projects:
+                self.addProject(project_id, 'Project ' + project_id)
+            if 'Developer' not in self.roles:
+                self.addRole('Developer', 'Works on issues')
+            group = self.groups.get('Developers')
+            if group is None:
+                self.addGroup('Developers', 'All developers')
+                group = self.groups['Developers']
+            group['roles'].setdefault('Developer', []).append(project_id)
+            logins = [u'user%d' % i for i in range(users)]
+            for login in logins:
+                if login not in self.users:
+                    self.addUser(login, fullName=u'User %s' % login[4:], groups=('All Users', 'Developers'))
+            now = _now()
+            first = self.projects[project_id]['next']
+            for number in range(first, first + count):
+                created = now - (count - number + first) * 60000 - 86400000
+                updated = now - rnd.randint(0, 3600000)
+                path = STATES[:rnd.randint(1, len(STATES))]
+                reporter = rnd.choice(logins)
+                fields = OrderedDict([
+                    ('summary', random_text(rnd, 60)),
+                    ('description', random_text(rnd, description_size)),
+                    ('created', unicode(created)),
+                    ('updated', unicode(updated)),
+                    ('updaterName', rnd.choice(logins)),
+                    ('reporterName', reporter),
+                    ('Priority', rnd.choice(PRIORITIES)),
+                    ('Type', rnd.choice(TYPES)),
+                    ('State', path[-1]),
+                    ('Assignee', rnd.choice(logins))])
+                issue = self.putIssue(project_id, number, fields,
+                                      tags=[rnd.choice((u'regression', u'performance', u'ui'))
+                                            for i in range(tags)])
+                for i in range(comments):
+                    self.addComment(issue, rnd.choice(logins), random_text(rnd, comment_size),
+                                    created + (i + 1) * (updated - created) / (comments + 1))
+                for i in range(attachments):
+                    self.addAttachment(issue, u'file%d.log' % i, random_text(rnd, attachment_size).encode('utf-8'),
+                                       reporter, created)
+                for i in range(min(changes, len(path) - 1)):
+                    issue['changes'].append({
+                        'updated': updated - (changes - i) * 1000, 'updaterName': rnd.choice(logins),
+                        'fields': [('State', [path[i]], [path[i + 1]])]})
+                if number > first:
+                    for i in range(links):
+                        target = rnd.randint(first, number - 1)
+                        self.addLink(rnd.choice(LINK_TYPES)[0], issue['id'], u'%s-%d' % (project_id, target))
+
+    def projectIssues(self, project_id, query, after, max):
+        with self.lock:
+            matches = _query(self, query)
+            issues = [self.issues[i] for i in self.project(project_id)['issues']]
+            return [issue for issue in issues if matches(issue)][after:after + max]
+
+    def allIssues(self, query, after, max):
+        with self.lock:
+            matches = _query(self, query)
+            issues = [self.issues[i] for p in self.projects.values() for i in p['issues']]
+            return [issue for issue in issues if matches(issue)][after:after + max]
+
+    def execute(self, issue_id, command, comment=None, run_as=None):
+        with self.lock:
+            issue = self.issue(issue_id)
+            author = run_as or 'root'
+            self.commands.append((issue_id, command, comment, run_as))
+            if comment:
+                self.addComment(issue, author, comment)
+            if command.strip().lower() == 'comment':
+                return
+            project = self.projects[issue['project']]
+            names = dict((name.lower(), name) for name in list(issue['fields']) + list(project['fields']))
+            words = command.split()
+            assignments = []
+            i = 0
+            while i < len(words):
+                word = words[i].lower()
+                if word in ('tag', 'untag') and i + 1 < len(words):
+                    if word == 'tag' and words[i + 1] not in issue['tags']:
+                        issue['tags'].append(words[i + 1])
+                    elif word == 'untag' and words[i + 1] in issue['tags']:
+                        issue['tags'].remove(words[i + 1])
+                    i += 2
+                    continue
+                for n in (3, 2, 1):
+                    name = ' '.join(words[i:i + n]).lower()
+                    if i + n <= len(words) and name in names:
+                        assignments.append((names[name], []))
+                        i += n
+                        break
+                else:
+                    if not assignments:
+                        raise HttpError(400, 'Command [%s] is invalid' % command)
+                    assignments[-1][1].append(words[i])
+                    i += 1
+            changed = []
+            for name, value in assignments:
+                value = u' '.join(value)
+                old = issue['fields'].get(name)
+                issue['fields'][name] = value
+                changed.append((name, [old] if old is not None else [], [value]))
+            if changed:
+                updated = _now()
+                issue['fields']['updated'] = unicode(updated)
+                issue['fields']['updaterName'] = author
+                issue['changes'].append({'updated': updated, 'updaterName': author, 'fields': changed})
+
+
+def _query(store, query):
+    """ Predicate of issues for the supported part of the search query """
+    checks = []
+    query = query or ''
+
+    def take(pattern):
+        found = re.findall(pattern, query)
+        return found, re.sub(pattern, ' ', query)
+
+    ids, query = take(r'(?i)issue id:\s*([\w-]+(?:\s*,\s*[\w-]+)*)')
+    for found in ids:
+        wanted = set(i.strip() for i in found.split(','))
+        checks.append(lambda issue, wanted=wanted: issue['id'] in wanted)
+    ranges, query = take(r'(?i)updated:\s*(\S+)\s*\.\.\s*(\S+)')
+    for start, end in ranges:
+        start, end = _parse_time(start), _parse_time(end)
+        checks.append(lambda issue, start=start, end=end: start <= int(issue['fields']['updated']) <= end)
+    tags, query = take(r'(?i)(?:\btag:\s*|#)(\{[^}]*\}|[^\s{]+)')
+    for found in tags:
+        checks.append(lambda issue, tag=found.strip('{}'): tag in issue['tags'])
+    known = set(['project'])
+    for project in store.projects.values():
+        known.update(project['fields'])
+    for issue in store.issues.values():
+        known.update(issue['fields'])
+        break
+    for name, value in re.findall(r'([A-Za-z][\w ]*?):\s*(\{[^}]*\}|[^\s{]+)', query):
+        # free text may precede the field name, the longest known suffix is the name
+        words = name.split()
+        for i in range(len(words)):
+            if ' '.join(words[i:]) in known:
+                words = words[i:]
+                break
+        name, value = ' '.join(words), value.strip('{}')
+        if name.lower() == 'project':
+            name = 'projectShortName'
+
+        def check(issue, name=name, value=value):
+            field = store.projects[issue['project']]['fields'].get(name)
+            if field is not None and value == field['emptyText']:
+                return issue['fields'].get(name) is None
+            actual = issue['fields'].get(name)
+            return value in actual if isinstance(actual, list) else actual == value
+
+        checks.append(check)
+    return lambda issue: all(check(issue) for check in checks)
+
+
+def issue_xml(store, issue):
+    parts = [u'<issue id=%s>' % quoteattr(issue['id'])]
+    for name, value in issue['fields'].items():
+        parts.append(_field_xml(name, value))
+    for comment in issue['comments']:
+        parts.append(u'<comment%s/>' % _attrs(**comment))
+    for tag in issue['tags']:
+        parts.append(u'<tag>%s</tag>' % escape(tag))
+    parts.append(u'</issue>')
+    return u''.join(parts)
+
+
+def _link_xml(store, type_name, source, target):
+    link_type = store.link_types.get(type_name, {})
+    return u'<issueLink%s/>' % _attrs(typeName=type_name, typeOutward=link_type.get('outwardName'),
+                                      typeInward=link_type.get('inwardName'), source=source, target=target)
+
+
+def _change_xml(change):
+    parts = [u'<change>', _field_xml('updated', unicode(change['updated'])),
+             _field_xml('updaterName', change['updaterName'])]
+    for name, old, new in change['fields']:
+        parts.append(u'<field name=%s>%s%s</field>' % (
+            quoteattr(name), u''.join(u'<oldValue>%s</oldValue>' % escape(v) for v in old),
+            u''.join(u'<newValue>%s</newValue>' % escape(v) for v in new)))
+    parts.append(u'</change>')
+    return u''.join(parts)
+
+
+def _user_ref(user):
+    return u'<user%s/>' % _attrs(login=user['login'], url='/rest/admin/user/' + user['login'])
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in one packet, otherwise delayed acks add 40ms to keep-alive requests
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    # (method, path below /rest, handler name), {name} matches a path segment
+    ROUTES = [
+        ('POST', '/user/login', 'login'),
+        ('GET', '/issue/byproject/{project}', 'getProjectIssues'),
+        ('GET', '/issue', 'getIssues'),
+        ('PUT', '/issue', 'createIssue'),
+        ('GET', '/issue/{id}', 'getIssue'),
+        ('DELETE', '/issue/{id}', 'deleteIssue'),
+        ('GET', '/issue/{id}/comment', 'getComments'),
+        ('GET', '/issue/{id}/link', 'getLinks'),
+        ('GET', '/issue/{id}/attachment', 'getAttachments'),
+        ('POST', '/issue/{id}/attachment', 'postAttachment'),
+        ('GET', '/issue/{id}/changes', 'getChanges'),
+        ('POST', '/issue/{id}/execute', 'execute'),
+        ('PUT', '/import/users', 'importUsers'),
+        ('PUT', '/import/links', 'importLinks'),
+        ('PUT', '/import/{project}/issues', 'importIssues'),
+        ('POST', '/import/{id}/attachment', 'postAttachment'),
+        ('GET', '/project/all', 'getAllProjects'),
+        ('GET', '/admin/project', 'getProjects'),
+        ('GET', '/admin/project/{project}', 'getProject'),
+        ('PUT', '/admin/project/{project}', 'createProject'),
+        ('GET', '/admin/project/{project}/customfield', 'getProjectFields'),
+        ('GET', '/admin/project/{project}/customfield/{name}', 'getProjectField'),
+        ('PUT', '/admin/project/{project}/customfield/{name}', 'createProjectField'),
+        ('DELETE', '/admin/project/{project}/customfield/{name}', 'deleteProjectField'),
+        ('GET', '/admin/user', 'getUsers'),
+        ('GET', '/admin/user/{login}', 'getUser'),
+        ('GET', '/admin/user/{login}/group', 'getUserGroups'),
+        ('POST', '/admin/user/{login}/group/{name}', 'setUserGroup'),
+        ('GET', '/admin/group', 'getGroups'),
+        ('GET', '/admin/group/{name}', 'getGroup'),
+        ('PUT', '/admin/group/{name}', 'createGroup'),
+        ('GET', '/admin/group/{name}/role', 'getGroupRoles'),
+        ('PUT', '/admin/group/{name}/role/{role}', 'addGroupRole'),
+        ('GET', '/admin/role', 'getRoles'),
+        ('GET', '/admin/role/{role}', 'getRole'),
+        ('PUT', '/admin/role/{role}', 'createRole'),
+        ('GET', '/admin/role/{role}/permission', 'getRolePermissions'),
+        ('POST', '/admin/role/{role}/permission/{name}', 'addRolePermission'),
+        ('GET', '/admin/customfield/field', 'getCustomFields'),
+        ('GET', '/admin/customfield/field/{name}', 'getCustomField'),
+        ('PUT', '/admin/customfield/field/{name}', 'createCustomField'),
+        ('GET', '/admin/issueLinkType', 'getLinkTypes'),
+        ('PUT', '/admin/issueLinkType/{name}', 'createLinkType'),
+    ]
+    ROUTES = [(method, re.compile('^' + re.sub(r'\{(\w+)\}', r'(?P<\1>[^/]+)', path) + '$'), name)
+              for method, path, name in ROUTES]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _handle(self, method):
+        server = self.server.fake
+        url = urlparse.urlsplit(self.path)
+        self.params = dict(urlparse.parse_qsl(url.query, keep_blank_values=True))
+        self.body = self._read_body()
+        server._count(method, self.path)
+        if server.latency:
+            time.sleep(server.latency)
+        status, headers, content = 200, {}, u''
+        try:
+            if url.path.startswith('/_persistent/'):
+                self._check_session()
+                status, headers, content = self.getAttachmentContent()
+            elif not url.path.startswith('/rest/'):
+                raise HttpError(404, 'Not found')
+            else:
+                path = url.path[len('/rest'):].rstrip('/') or '/'
+                for route_method, pattern, name in self.ROUTES:
+                    match = pattern.match(path)
+                    if match and route_method == method:
+                        if name != 'login':
+                            self._check_session()
+                        args = dict((k, urllib.unquote(v).decode('utf-8')) for k, v in match.groupdict().items())
+                        with server.store.lock:
+                            result = getattr(self, name)(server.store, **args)
+                        if isinstance(result, tuple):
+                            status, headers, content = result
+                        elif result is not None:
+                            content = result
+                        break
+                else:
+                    raise HttpError(405 if any(p.match(path) for m, p, n in self.ROUTES) else 404,
+                                    'No resource for %s %s' % (method, path))
+        except HttpError, e:
+            status, content = e.status, u'<error>%s</error>' % escape(unicode(e))
+        if isinstance(content, unicode):
+            content = content.encode('utf-8')
+        self.send_response(status)
+        if 'Content-Type' not in headers:
+            self.send_header('Content-Type', 'application/xml; charset=UTF-8')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _read_body(self):
+        length = int(self.headers.getheader('content-length') or 0)
+        body = self.rfile.read(length) if length else ''
+        if body and self.headers.getheader('content-encoding') == 'gzip':
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        return body
+
+    def _check_session(self):
+        server = self.server.fake
+        if self.headers.getheader('x-youtrack-apikey'):
+            return
+        cookie = self.headers.getheader('cookie') or ''
+        if not any(c.strip() in server.sessions for c in cookie.split(';')):
+            raise HttpError(401, 'Unauthorized')
+
+    def _xml(self):
+        try:
+            return xmlbackend.parseString(self.body).documentElement
+        except Exception, e:
+            raise HttpError(400, 'Can not parse request: %s' % e)
+
+    def login(self, store):
+        user = store.users.get(self.params.get('login'))
+        if user is None or user['password'] != self.params.get('password'):
+            raise HttpError(403, 'Incorrect login or password.')
+        session = 'YTSESSIONID=%032x' % random.getrandbits(128)
+        self.server.fake.sessions.add(session)
+        return 200, {'Set-Cookie': session + '; Path=/'}, u'<login>ok</login>'
+
+    def getProjectIssues(self, store, project):
+        issues = store.projectIssues(project, self.params.get('filter'), int(self.params.get('after') or 0),
+                                     int(self.params.get('max') or 10))
+        return u'<issues>%s</issues>' % u''.join(issue_xml(store, issue) for issue in issues)
+
+    def getIssues(self, store):
+        issues = store.allIssues(self.params.get('filter'), int(self.params.get('after') or 0),
+                                 int(self.params.get('max') or 10))
+        return u'<issueCompacts>%s</issueCompacts>' % u''.join(issue_xml(store, issue) for issue in issues)
+
+    def createIssue(self, store):
+        params = dict(urlparse.parse_qsl(self.body))
+        project = store.project(params.pop('project'))
+        fields = OrderedDict([('summary', params.pop('summary', '').decode('utf-8')),
+                              ('created', unicode(_now())), ('updated', unicode(_now())),
+                              ('reporterName', 'root'), ('updaterName', 'root')])
+        for name, value in params.items():
+            fields[name] = value.decode('utf-8')
+        issue = store.putIssue(project['id'], project['next'], fields)
+        location = '%s/rest/issue/%s' % (self.server.fake.url, issue['id'].encode('utf-8'))
+        return 201, {'Location': location}, u''
+
+    def getIssue(self, store, id):
+        return issue_xml(store, store.issue(id))
+
+    def deleteIssue(self, store, id):
+        issue = store.issue(id)
+        store.projects[issue['project']]['issues'].remove(id)
+        del store.issues[id]
+
+    def getComments(self, store, id):
+        return u'<comments>%s</comments>' % u''.join(
+            u'<comment%s/>' % _attrs(**c) for c in store.issue(id)['comments'])
+
+    def getLinks(self, store, id):
+        store.issue(id)
+        return u'<issueLinks>%s</issueLinks>' % u''.join(
+            _link_xml(store, *link) for link in store.links if id in link[1:])
+
+    def getAttachments(self, store, id):
+        return u'<fileUrls>%s</fileUrls>' % u''.join(
+            u'<fileUrl%s/>' % _attrs(**a) for a in store.issue(id)['attachments'])
+
+    def postAttachment(self, store, id):
+        issue = store.issue(id)
+        match = re.search(r'filename="([^"]*)";?\r\n(?:[^\r\n]+\r\n)*\r\n', self.body)
+        if match is None:
+            raise HttpError(400, 'No file in request')
+        content = self.body[match.end():self.body.rfind('\r\n--')]
+        store.addAttachment(issue, match.group(1).decode('utf-8'), content,
+                            self.params.get('authorLogin', 'root').decode('utf-8'), self.params.get('created'))
+        return 201, {}, u''
+
+    def getAttachmentContent(self):
+        content = self.server.fake.store.contents.get(self.params.get('file'))
+        if content is None:
+            raise HttpError(404, 'Attachment not found')
+        return 200, {'Content-Type': 'application/octet-stream'}, content
+
+    def getChanges(self, store, id):
+        return u'<changes>%s</changes>' % u''.join(_change_xml(change) for change in store.issue(id)['changes'])
+
+    def execute(self, store, id):
+        params = dict((k, v.decode('utf-8')) for k, v in self.params.items())
+        store.execute(id, params.get('command', u''), params.get('comment'), params.get('runAs'))
+        return u'<result>Command executed</result>'
+
+    def importUsers(self, store):
+        for el in _elements(self._xml(), 'user'):
+            login = el.getAttribute('login')
+            if login not in store.users:
+                store.addUser(login, fullName=el.getAttribute('fullName'), email=el.getAttribute('email'))
+        return u'<importResult/>'
+
+    def importLinks(self, store):
+        for el in _elements(self._xml(), 'link'):
+            store.addLink(el.getAttribute('typeName'), el.getAttribute('source'), el.getAttribute('target'))
+        return u'<importResult/>'
+
+    def importIssues(self, store, project):
+        store.project(project)
+        items = []
+        for el in _elements(self._xml(), 'issue'):
+            fields = OrderedDict()
+            comments = []
+            for c in _elements(el):
+                if c.tagName == 'field':
+                    values = [_element_text(v) for v in _elements(c, 'value')]
+                    fields[c.getAttribute('name')] = values[0] if len(values) == 1 else values
+                elif c.tagName == 'comment':
+                    comments.append(dict((str(k), v) for k, v in c.attributes.items()))
+            number = fields.pop('numberInProject', None)
+            if number is None:
+                items.append(u'<item imported="false"><error>numberInProject is missing</error></item>')
+                continue
+            if self.params.get('test') != 'True':
+                store.putIssue(project, int(number), fields, comments)
+            items.append(u'<item%s/>' % _attrs(id=number, imported='true'))
+        return u'<importResult>%s</importResult>' % u''.join(items)
+
+    def getAllProjects(self, store):
+        return u'<projects>%s</projects>' % u''.join(
+            u'<project%s/>' % _attrs(shortName=p['id'], name=p['name']) for p in store.projects.values())
+
+    def getProjects(self, store):
+        return u'<projectRefs>%s</projectRefs>' % u''.join(
+            u'<project%s/>' % _attrs(id=p['id'], url='/rest/admin/project/' + p['id'])
+            for p in store.projects.values())
+
+    def getProject(self, store, project):
+        p = store.project(project)
+        return u'<project%s/>' % _attrs(id=p['id'], name=p['name'], lead=p['lead'], description=p['description'])
+
+    def createProject(self, store, project):
+        if project in store.projects:
+            raise HttpError(409, 'Project already exists: ' + project)
+        store.addProject(project, self.params.get('projectName', project).decode('utf-8'),
+                         self.params.get('projectLeadLogin', 'root').decode('utf-8'),
+                         self.params.get('description', '').decode('utf-8').strip())
+        return 201, {'Location': '%s/rest/admin/project/%s' % (self.server.fake.url, project.encode('utf-8'))}, u''
+
+    def getProjectFields(self, store, project):
+        return u'<projectCustomFieldRefs>%s</projectCustomFieldRefs>' % u''.join(
+            u'<projectCustomField%s/>' % _attrs(name=name, url='/rest/admin/project/%s/customfield/%s' % (
+                project, name)) for name in store.project(project)['fields'])
+
+    def getProjectField(self, store, project, name):
+        field = store.project(project)['fields'].get(name)
+        if field is None:
+            raise HttpError(404, 'Field not found: ' + name)
+        return u'<projectCustomField%s>%s</projectCustomField>' % (
+            _attrs(name=name, type=field['type'], emptyText=field['emptyText']),
+            u''.join(u'<param%s/>' % _attrs(name=k, value=v) for k, v in sorted(field['params'].items())))
+
+    def createProjectField(self, store, project, name):
+        prototype = store.custom_fields.get(name)
+        if prototype is None:
+            raise HttpError(404, 'Field not found: ' + name)
+        params = dict((k, v.decode('utf-8')) for k, v in self.params.items())
+        empty_text = params.pop('emptyFieldText', u'No ' + name)
+        store.project(project)['fields'][name] = {'type': prototype['type'], 'emptyText': empty_text,
+                                                  'params': params}
+        return 201, {}, u''
+
+    def deleteProjectField(self, store, project, name):
+        store.project(project)['fields'].pop(name, None)
+
+    def getUsers(self, store):
+        start = int(self.params.get('start') or 0)
+        users = list(store.users.values())[start:start + USERS_PAGE]
+        return u'<userRefs>%s</userRefs>' % u''.join(_user_ref(u) for u in users)
+
+    def getUser(self, store, login):
+        user = store.user(login)
+        return u'<user%s/>' % _attrs(login=user['login'], fullName=user['fullName'], email=user['email'])
+
+    def getUserGroups(self, store, login):
+        return u'<userGroupRefs>%s</userGroupRefs>' % u''.join(
+            u'<userGroup%s/>' % _attrs(name=g, url='/rest/admin/group/' + g) for g in store.user(login)['groups'])
+
+    def setUserGroup(self, store, login, name):
+        user = store.user(login)
+        if name not in store.groups:
+            raise HttpError(404, 'Group not found: ' + name)
+        if name not in user['groups']:
+            user['groups'].append(name)
+
+    def getGroups(self, store):
+        return u'<userGroupRefs>%s</userGroupRefs>' % u''.join(
+            u'<userGroup%s/>' % _attrs(name=g, url='/rest/admin/group/' + g) for g in store.groups)
+
+    def _group(self, store, name):
+        group = store.groups.get(name)
+        if group is None:
+            raise HttpError(404, 'Group not found: ' + name)
+        return group
+
+    def getGroup(self, store, name):
+        group = self._group(store, name)
+        return u'<userGroup%s/>' % _attrs(name=group['name'], description=group['description'])
+
+    def createGroup(self, store, name):
+        if name in store.groups:
+            raise HttpError(409, 'Group already exists: ' + name)
+        store.addGroup(name, self.params.get('description', '').decode('utf-8'))
+        return 201, {}, u''
+
+    def getGroupRoles(self, store, name):
+        roles = self._group(store, name)['roles']
+        return u'<userRoles>%s</userRoles>' % u''.join(
+            u'<userRole%s><projects>%s</projects></userRole>' % (
+                _attrs(name=role), u''.join(u'<projectRef%s/>' % _attrs(id=p, url='/rest/admin/project/' + p)
+                                            for p in projects))
+            for role, projects in sorted(roles.items()))
+
+    def addGroupRole(self, store, name, role):
+        group = self._group(store, name)
+        self._role(store, role)
+        projects = [e.getAttribute('id') for e in self._xml().getElementsByTagName('projectRef')] \
+            if self.body else []
+        group['roles'][role] = projects
+
+    def getRoles(self, store):
+        return u'<roles>%s</roles>' % u''.join(u'<role%s/>' % _attrs(name=r) for r in store.roles)
+
+    def _role(self, store, name):
+        role = store.roles.get(name)
+        if role is None:
+            raise HttpError(404, 'Role not found: ' + name)
+        return role
+
+    def getRole(self, store, role):
+        r = self._role(store, role)
+        return u'<role%s/>' % _attrs(name=r['name'], description=r['description'])
+
+    def createRole(self, store, role):
+        if role in store.roles:
+            raise HttpError(409, 'Role already exists: ' + role)
+        store.addRole(role, self.params.get('description', '').decode('utf-8'), ())
+        return 201, {}, u''
+
+    def getRolePermissions(self, store, role):
+        return u'<permissions>%s</permissions>' % u''.join(
+            u'<permission%s/>' % _attrs(name=p) for p in self._role(store, role)['permissions'])
+
+    def addRolePermission(self, store, role, name):
+        permissions = self._role(store, role)['permissions']
+        if name not in permissions:
+            permissions.append(name)
+
+    def getCustomFields(self, store):
+        return u'<customFieldPrototypes>%s</customFieldPrototypes>' % u''.join(
+            u'<customFieldPrototype%s/>' % _attrs(name=name, url='/rest/admin/customfield/field/' + name)
+            for name in store.custom_fields)
+
+    def getCustomField(self, store, name):
+        field = store.custom_fields.get(name)
+        if field is None:
+            raise HttpError(404, 'Field not found: ' + name)
+        return u'<customFieldPrototype%s/>' % _attrs(**field)
+
+    def createCustomField(self, store, name):
+        if name in store.custom_fields:
+            raise HttpError(409, 'Field already exists: ' + name)
+        store.custom_fields[name] = {'name': name, 'type': self.params.get('type', 'string'),
+                                     'isPrivate': self.params.get('isPrivate', 'false').lower(),
+                                     'visibleByDefault': self.params.get('defaultVisibility', 'true').lower()}
+        return 201, {}, u''
+
+    def getLinkTypes(self, store):
+        return u'<issueLinkTypes>%s</issueLinkTypes>' % u''.join(
+            u'<issueLinkType%s/>' % _attrs(**t) for t in store.link_types.values())
+
+    def createLinkType(self, store, name):
+        if name in store.link_types:
+            raise HttpError(409, 'Link type already exists: ' + name)
+        store.link_types[name] = {'name': name, 'outwardName': self.params.get('outwardName', name),
+                                  'inwardName': self.params.get('inwardName', name),
+                                  'directed': self.params.get('directed', 'false').lower()}
+        return 201, {}, u''
+
+
+class _HTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, handler):
+        HTTPServer.__init__(self, address, handler)
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self.connections_lock:
+            self.connections.add(request)
+        ThreadingMixIn.process_request(self, request, client_address)
+
+    def shutdown_request(self, request):
+        with self.connections_lock:
+            self.connections.discard(request)
+        HTTPServer.shutdown_request(self, request)
+
+    def close_connections(self):
+        """ Ends keep-alive connections, their threads wait for the next request otherwise """
+        with self.connections_lock:
+            for connection in self.connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+
+
+class FakeYouTrack(object):
+    def __init__(self, store=None, latency=0.0, host='127.0.0.1', port=0):
+        """ port 0 takes any free port, see url """
+        self.store = store if store is not None else Store()
+        self.latency = latency
+        self.sessions = set()
+        self.requests = {}
+        self._requests_lock = threading.Lock()
+        self._server = _HTTPServer((host, port), Handler)
+        self._server.fake = self
+        self._thread = None
+        self.url = 'http://%s:%d' % self._server.server_address[:2]
+
+    def _count(self, method, path):
+        template = endpoint_template(method, path[len('/rest'):] if path.startswith('/rest/') else path)
+        with self._requests_lock:
+            self.requests[template] = self.requests.get(template, 0) + 1
+
+    def total_requests(self):
+        with self._requests_lock:
+            return sum(self.requests.values())
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-youtrack')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.close_connections()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
+        return False
@@ -0,0 +1,134 @@
+"""
+Memory profiling of long running migrations.
+
+A script marks its phases and pages of issues, and the profiler reports
+how memory grew since its previous report:
+
+    profiler = MemoryProfiler(interval=10)
+    profiler.phase('users')
+    ...
+    profiler.phase('issues')
+    for page in pages:
+        ...
+        profiler.page('issues %d' % start)
+    profiler.stop()
+
+Every phase is reported, pages every interval pages. A report shows maximum
+resident set size, the allocation sites that grew most and the types of
+objects whose number grew most. Allocation sites come from tracemalloc
+(pytracemalloc on Python 2); without it only object counts and resident set
+size are reported.
+"""
+
+import gc
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def _size(size, sign=''):
+    sign = '-' if size < 0 else sign
+    size = abs(size)
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024:
+            return '%s%.1f %s' % (sign, size, unit)
+        size /= 1024.0
+    return '%s%.1f GiB' % (sign, size)
+
+
+def _object_counts():
+    counts = {}
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+class MemoryProfiler(object):
+    def __init__(self, stream=None, interval=1, top=10, frames=1):
+        self.stream = stream if stream is not None else sys.stderr
+        self.interval = interval
+        self.top = top
+        self._phase = None
+        self._pages = 0
+        self._started = time.time()
+        self._snapshot = None
+        self._counts = {}
+        self._stop_tracing = False
+        if tracemalloc is not None and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self._stop_tracing = True
+
+    def phase(self, name):
+        """ Ends current phase with a report and starts the next one """
+        if self._phase is not None:
+            self.report('phase ' + self._phase)
+        self._phase = name
+        self._pages = 0
+
+    def page(self, label):
+        self._pages += 1
+        if self._pages % self.interval == 0:
+            self.report(label)
+
+    def stop(self):
+        self.phase(None)
+        if self._stop_tracing:
+            tracemalloc.stop()
+            self._stop_tracing = False
+
+    def report(self, label):
+        lines = ['=== %.1f s after %s' % (time.time() - self._started, label)]
+        if resource is not None:
+            # kilobytes on Linux, bytes on Mac OS
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            lines.append('max rss %s' % _size(rss if sys.platform == 'darwin' else rss * 1024))
+        if tracemalloc is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            lines.append('traced %s, peak %s' % (_size(current), _size(peak)))
+            snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)])
+            if self._snapshot is None:
+                stats = [(stat.size, stat.count, stat) for stat in snapshot.statistics('lineno')]
+            else:
+                stats = [(stat.size_diff, stat.count_diff, stat) for stat in
+                         snapshot.compare_to(self._snapshot, 'lineno')]
+            self._snapshot = snapshot
+            lines.append('top allocation sites:')
+            for size, count, stat in stats[:self.top]:
+                frame = stat.traceback[0]
+                lines.append('  %12s %+9d blocks  %s:%d (%s)' % (
+                    _size(size, '+'), count, frame.filename, frame.lineno, _size(stat.size)))
+            # statistics are not counted as objects of the script
+            stats = stat = None
+        counts = _object_counts()
+        growth = sorted(((count - self._counts.get(name, 0), count, name) for name, count in counts.items()),
+                        reverse=True)
+        self._counts = counts
+        lines.append('top object types:')
+        for diff, count, name in growth[:self.top]:
+            lines.append('  %+9d %9d  %s' % (diff, count, name))
+        self.stream.write('\n'.join(lines) + '\n')
+        self.stream.flush()
+
+
+class NullProfiler(object):
+    """ Profiler of scripts run without memory profiling """
+
+    def phase(self, name):
+        pass
+
+    def page(self, label):
+        pass
+
+    def stop(self):
+        pass
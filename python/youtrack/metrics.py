@@ -0,0 +1,200 @@
+"""
+Request metrics of Connection.
+
+Every request is accounted to its endpoint template, which is the method and
+the url with ids and names replaced by placeholders, like
+'GET /issue/{id}/comment' or 'PUT /import/{project}/issues'. For each template
+Metrics keeps the number of calls, latency histogram, bytes sent and received,
+response statuses and retries:
+
+    for endpoint, stats in sorted(connection.stats().items()):
+        print endpoint, stats['calls'], stats['seconds']
+
+Connections to the same server share Metrics, so scripts which reconnect
+from time to time still get the totals. Metrics of all servers are written on
+exit when YOUTRACK_METRICS environment variable names a file; files ending
+with .prom or .txt get Prometheus text format, others json. dump() does the
+same on request.
+"""
+
+import atexit
+import json
+import os
+import threading
+import urlparse
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# segments followed by an id or a name, and the placeholder for it
+_PARAMETERS = {
+    'issue': '{id}', 'byproject': '{project}', 'project': '{project}', 'import': '{project}',
+    'user': '{login}', 'group': '{group}', 'role': '{role}', 'field': '{field}', 'customfield': '{field}',
+    'version': '{version}', 'subsystem': '{subsystem}', 'build': '{build}', 'comment': '{comment}',
+    'attachment': '{attachment}', 'issueLinkType': '{linkType}', 'agile': '{agile}', 'permission': '{permission}',
+    'bundle': '{bundle}', 'buildBundle': '{bundle}', 'stateBundle': '{bundle}', 'versionBundle': '{bundle}',
+    'ownedFieldBundle': '{bundle}', 'userBundle': '{bundle}', 'enumeration': '{bundle}',
+}
+# resource names which are never ids
+_LITERALS = frozenset([
+    'all', 'assignee', 'attachment', 'build', 'buildBundle', 'bundle', 'byproject', 'changes', 'comment', 'count',
+    'customfield', 'enumeration', 'execute', 'field', 'group', 'history', 'intellisense', 'issue', 'issueLinkType',
+    'issues', 'link', 'links', 'login', 'ownedFieldBundle', 'permission', 'project', 'role', 'sprints', 'state',
+    'stateBundle', 'subsystem', 'timetracking', 'user', 'userBundle', 'users', 'version', 'versionBundle',
+    'workitem', 'workitems'])
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def endpoint_template(method, url):
+    path = urlparse.urlsplit(url).path.rstrip('/')
+    segments = path.split('/')
+    for i in range(1, len(segments)):
+        previous = segments[i - 1]
+        if previous in _PARAMETERS and segments[i] not in _LITERALS:
+            segments[i] = _PARAMETERS[previous]
+    return '%s %s' % (method, '/'.join(segments) or '/')
+
+
+class EndpointStats(object):
+    __slots__ = ('calls', 'seconds', 'max_seconds', 'buckets', 'bytes_out', 'bytes_in', 'statuses', 'errors',
+                 'retries')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.statuses = {}
+        self.errors = 0
+        self.retries = 0
+
+    def as_dict(self):
+        return {'calls': self.calls,
+                'seconds': self.seconds,
+                'max_seconds': self.max_seconds,
+                'latency_buckets': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], self.buckets)),
+                'bytes_out': self.bytes_out,
+                'bytes_in': self.bytes_in,
+                'statuses': dict((str(s), n) for s, n in self.statuses.items()),
+                'errors': self.errors,
+                'retries': self.retries}
+
+
+class Metrics(object):
+    def __init__(self, name=''):
+        """ name tells the metrics apart in dumps, usually it is the server url """
+        self.name = name
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, method, url):
+        template = endpoint_template(method, url)
+        stats = self._endpoints.get(template)
+        if stats is None:
+            stats = self._endpoints[template] = EndpointStats()
+        return stats
+
+    def record(self, method, url, seconds, status=None, bytes_out=0, bytes_in=0):
+        """ Accounts a request which got response with the status, or failed if status is None """
+        bucket = 0
+        while bucket < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[bucket]:
+            bucket += 1
+        with self._lock:
+            stats = self._endpoint(method, url)
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.buckets[bucket] += 1
+            stats.bytes_out += bytes_out
+            stats.bytes_in += bytes_in
+            if status is None:
+                stats.errors += 1
+            else:
+                stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def record_retry(self, method, url):
+        with self._lock:
+            self._endpoint(method, url).retries += 1
+
+    def stats(self):
+        """ Dictionary of stats by endpoint template """
+        with self._lock:
+            return dict((template, stats.as_dict()) for template, stats in self._endpoints.items())
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+def get_metrics(name):
+    """ Metrics registered under the name, they are created on the first call """
+    with _registry_lock:
+        for metrics in _registry:
+            if metrics.name == name:
+                return metrics
+        metrics = Metrics(name)
+        _registry.append(metrics)
+        return metrics
+
+
+def to_json(metrics_list=None):
+    metrics_list = _registry if metrics_list is None else metrics_list
+    return json.dumps([{'name': m.name, 'endpoints': m.stats()} for m in metrics_list], indent=2, sort_keys=True)
+
+
+def _labels(**labels):
+    return '{%s}' % ','.join('%s="%s"' % (k, v.replace('\\', '\\\\').replace('"', '\\"'))
+                             for k, v in sorted(labels.items(), key=lambda (k, v): (k == 'le', k)))
+
+
+def to_prometheus(metrics_list=None):
+    metrics_list = _registry if metrics_list is None else metrics_list
+    lines = {
+        'requests': ['# HELP youtrack_requests_total Requests by endpoint and response status',
+                     '# TYPE youtrack_requests_total counter'],
+        'duration': ['# HELP youtrack_request_duration_seconds Request latency by endpoint',
+                     '# TYPE youtrack_request_duration_seconds histogram'],
+        'bytes': ['# HELP youtrack_request_bytes_total Bytes sent and received by endpoint',
+                  '# TYPE youtrack_request_bytes_total counter'],
+        'retries': ['# HELP youtrack_request_retries_total Retried requests by endpoint',
+                    '# TYPE youtrack_request_retries_total counter'],
+    }
+    for metrics in metrics_list:
+        for endpoint, stats in sorted(metrics.stats().items()):
+            labels = dict(server=metrics.name, endpoint=endpoint)
+            statuses = dict(stats['statuses'], error=stats['errors']) if stats['errors'] else stats['statuses']
+            for status, count in sorted(statuses.items()):
+                lines['requests'].append('youtrack_requests_total%s %d' % (_labels(status=status, **labels), count))
+            cumulative = 0
+            for le in [str(b) for b in LATENCY_BUCKETS] + ['+Inf']:
+                cumulative += stats['latency_buckets'][le]
+                lines['duration'].append('youtrack_request_duration_seconds_bucket%s %d' % (
+                    _labels(le=le, **labels), cumulative))
+            lines['duration'].append('youtrack_request_duration_seconds_sum%s %f' % (_labels(**labels), stats['seconds']))
+            lines['duration'].append('youtrack_request_duration_seconds_count%s %d' % (_labels(**labels), stats['calls']))
+            for direction in ('in', 'out'):
+                lines['bytes'].append('youtrack_request_bytes_total%s %d' % (
+                    _labels(direction=direction, **labels), stats['bytes_' + direction]))
+            lines['retries'].append('youtrack_request_retries_total%s %d' % (_labels(**labels), stats['retries']))
+    return '\n'.join(sum([lines[k] for k in ('requests', 'duration', 'bytes', 'retries')], [])) + '\n'
+
+
+def dump(path, metrics_list=None):
+    """ Writes the given metrics, or all registered ones, into the file """
+    if path.endswith('.prom') or path.endswith('.txt'):
+        content = to_prometheus(metrics_list)
+    else:
+        content = to_json(metrics_list)
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def _dump_on_exit():
+    path = os.environ.get('YOUTRACK_METRICS')
+    if path and _registry:
+        dump(path)
+
+atexit.register(_dump_on_exit)
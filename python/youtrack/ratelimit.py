@@ -0,0 +1,132 @@
+"""
+Client side rate limiting of Connection requests.
+
+Requests are divided into classes: reads, writes, imports (/import/...) and
+commands (/execute). Every class has a token bucket refilled with the
+configured number of requests per second, and a request waits for a token of
+its class before it is sent.
+
+The limiter also watches the latency of responses. When the average latency
+of a class grows above latency_target, or the server answers 429 or 503, the
+rate of the class is cut down; while the server is fast again it is raised
+step by step back to the configured value:
+
+    limiter = RateLimiter({'read': 20, 'write': 5, 'import': 1, 'execute': 5})
+    target = Connection(url, login, password, rate_limiter=limiter)
+
+The same limiter can be shared by several connections and threads.
+"""
+
+import threading
+import time
+
+READ = 'read'
+WRITE = 'write'
+IMPORT = 'import'
+EXECUTE = 'execute'
+
+# requests per second, None is no limit
+DEFAULT_RATES = {READ: 20.0, WRITE: 10.0, IMPORT: 2.0, EXECUTE: 10.0}
+THROTTLED_STATUSES = (429, 503)
+
+
+def endpoint_class(method, url):
+    if url.startswith('/import/'):
+        return IMPORT
+    if '/execute' in url:
+        return EXECUTE
+    if method in ('GET', 'HEAD', 'OPTIONS'):
+        return READ
+    return WRITE
+
+
+class TokenBucket(object):
+    def __init__(self, rate, capacity=None, clock=time.time, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """ Takes a token, waiting for it if the bucket is empty. Returns the seconds waited. """
+        with self._lock:
+            self._refill()
+            # the token is reserved now, so that concurrent callers queue up
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            self.sleep(wait)
+        return wait
+
+    def set_rate(self, rate):
+        """ Tokens added so far are counted with the old rate """
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+
+
+class RateLimiter(object):
+    def __init__(self, rates=None, latency_target=2.0, min_factor=0.1, smoothing=0.2,
+                 clock=time.time, sleep=time.sleep):
+        """ rates maps request classes to requests per second, classes which are not
+            mentioned get DEFAULT_RATES. The rate of a class is never cut below
+            min_factor of the configured one.
+        """
+        self.rates = dict(DEFAULT_RATES)
+        self.rates.update(rates or {})
+        self.latency_target = latency_target
+        self.min_factor = min_factor
+        self.smoothing = smoothing
+        self.waited = 0.0
+        self._buckets = {}
+        self._factors = {}
+        self._latencies = {}
+        self._lock = threading.Lock()
+        for name, rate in self.rates.items():
+            if rate is not None:
+                self._buckets[name] = TokenBucket(rate, clock=clock, sleep=sleep)
+                self._factors[name] = 1.0
+
+    def acquire(self, method, url):
+        bucket = self._buckets.get(endpoint_class(method, url))
+        if bucket is None:
+            return 0.0
+        wait = bucket.acquire()
+        if wait:
+            with self._lock:
+                self.waited += wait
+        return wait
+
+    def record(self, method, url, seconds, status=None):
+        """ Adapts the rate of the request class to the response latency and status """
+        name = endpoint_class(method, url)
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            return
+        with self._lock:
+            latency = self._latencies.get(name)
+            latency = seconds if latency is None else latency + self.smoothing * (seconds - latency)
+            self._latencies[name] = latency
+            factor = self._factors[name]
+            if status in THROTTLED_STATUSES:
+                factor /= 2
+            elif latency > self.latency_target:
+                factor *= 0.8
+            elif latency < self.latency_target / 2:
+                factor += 0.05
+            factor = min(1.0, max(self.min_factor, factor))
+            self._factors[name] = factor
+            bucket.set_rate(self.rates[name] * factor)
+
+    def rate(self, name):
+        """ Current requests per second of the class """
+        bucket = self._buckets.get(name)
+        return bucket.rate if bucket is not None else None
@@ -0,0 +1,108 @@
+"""
+Retry policy of Connection requests.
+
+A request is repeated when the connection fails or the server answers with
+one of RETRY_STATUSES, after a delay which grows exponentially and is
+randomized so that parallel clients don't come back at the same moment.
+Retry-After header of the response is respected. Requests which change data
+are repeated only when the server surely didn't process them, unless they are
+known to be idempotent like imports are.
+
+Connections repeat nothing unless they are given a policy. The number of
+retries is limited per request and by the budget of the policy, which can be
+shared by all connections of a job:
+
+    policy = RetryPolicy(max_retries=5, budget=200)
+    source = Connection(source_url, login, password, retry_policy=policy)
+    target = Connection(target_url, login, password, retry_policy=policy)
+"""
+
+import errno
+import httplib
+import random
+import socket
+import threading
+import time
+from email.utils import mktime_tz, parsedate_tz
+
+RETRY_STATUSES = (429, 502, 503, 504)
+# statuses meaning that the request wasn't processed
+NOT_PROCESSED_STATUSES = (429,)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'DELETE')
+# imports of issues, links, users and work items with the same ids update them
+IDEMPOTENT_PREFIXES = ('/import/',)
+RETRYABLE_ERRORS = (socket.error, httplib.HTTPException)
+
+
+class RetryPolicy(object):
+    def __init__(self, max_retries=4, delay=1.0, backoff=2.0, max_delay=60.0, jitter=0.5, budget=None,
+                 statuses=RETRY_STATUSES):
+        """ delay * backoff ** n seconds, but not more than max_delay, are waited before n-th retry,
+            jitter is the part of the delay which is randomized. budget limits the number
+            of retries made through this policy, None means no limit.
+        """
+        self.max_retries = max_retries
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.budget = budget
+        self.statuses = statuses
+        self.retries = 0
+        self.sleep = time.sleep
+        self._lock = threading.Lock()
+
+    def is_idempotent(self, method, url):
+        return method in IDEMPOTENT_METHODS or url.startswith(IDEMPOTENT_PREFIXES)
+
+    def should_retry(self, method, url, retry_count, response=None, error=None):
+        """ Checks whether a request which got the response or failed with the error
+            should be made again. A retry is taken from the budget.
+        """
+        if retry_count >= self.max_retries:
+            return False
+        if response is not None:
+            if response.status not in self.statuses:
+                return False
+            processed = response.status not in NOT_PROCESSED_STATUSES
+        elif isinstance(error, RETRYABLE_ERRORS):
+            processed = getattr(error, 'errno', None) != errno.ECONNREFUSED
+        else:
+            return False
+        if processed and not self.is_idempotent(method, url):
+            return False
+        with self._lock:
+            if self.budget is not None and self.retries >= self.budget:
+                return False
+            self.retries += 1
+        return True
+
+    def retry_after(self, response):
+        """ Seconds to wait according to Retry-After header of the response, or None """
+        value = response.get('retry-after') if response is not None else None
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            date = parsedate_tz(value)
+            if date is None:
+                return None
+            seconds = mktime_tz(date) - time.time()
+        return min(max(seconds, 0.0), self.max_delay)
+
+    def get_delay(self, retry_count, response=None):
+        seconds = self.retry_after(response)
+        if seconds is not None:
+            return seconds
+        seconds = min(self.delay * (self.backoff ** retry_count), self.max_delay)
+        return seconds * (1 - self.jitter * random.random())
+
+    def wait(self, retry_count, response=None):
+        seconds = self.get_delay(retry_count, response)
+        self.sleep(seconds)
+        return seconds
+
+
+# policy of Connection without retry_policy, requests fail on the first error
+NO_RETRY = RetryPolicy(max_retries=0)
@@ -0,0 +1,207 @@
+"""
+Request hooks and tracing of Connection.
+
+connection.hooks holds callbacks called for every request attempt:
+
+    before_request(connection, method, url, headers, body)
+    after_response(connection, method, url, response, seconds, error)
+    on_retry(connection, method, url, retry_count, delay, response, error)
+
+response is None when the request failed with error. With no callbacks
+registered the cost of a request doesn't change.
+
+Tracer builds spans on top of the hooks. Connection operations like
+importIssues, executeCommand or attachment transfers open a span, and
+requests made inside of it become its children:
+
+    tracer = Tracer(FileExporter('trace.jsonl'))
+    tracer.instrument(source)
+    tracer.instrument(target)
+    with tracer.span('project', id='SB'):
+        ...
+    tracer.close()
+
+FileExporter writes one json object per finished span, in the layout of
+OpenTelemetry spans.
+"""
+
+import functools
+import json
+import os
+import random
+import threading
+import time
+
+from youtrack.metrics import endpoint_template
+
+
+class Hooks(object):
+    __slots__ = ('before_request', 'after_response', 'on_retry')
+
+    def __init__(self):
+        self.before_request = []
+        self.after_response = []
+        self.on_retry = []
+
+
+class Span(object):
+    __slots__ = ('tracer', 'name', 'trace_id', 'span_id', 'parent_id', 'start', 'end', 'attributes', 'events',
+                 'error')
+
+    def __init__(self, tracer, name, parent, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else '%032x' % random.getrandbits(128)
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start = time.time()
+        self.end = None
+        self.attributes = attributes
+        self.events = []
+        self.error = None
+
+    def set_attribute(self, name, value):
+        self.attributes[name] = value
+
+    def add_event(self, name, **attributes):
+        self.events.append((name, time.time(), attributes))
+
+    def finish(self, error=None):
+        self.end = time.time()
+        if error is not None:
+            self.error = error
+        self.tracer._finish(self)
+
+    def __enter__(self):
+        self.tracer._push(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.tracer._pop(self)
+        self.finish('%s: %s' % (exc_type.__name__, exc_value) if exc_type is not None else None)
+        return False
+
+    def as_dict(self):
+        span = {'traceId': self.trace_id,
+                'spanId': self.span_id,
+                'name': self.name,
+                'startTimeUnixNano': int(self.start * 1e9),
+                'endTimeUnixNano': int(self.end * 1e9),
+                'attributes': self.attributes,
+                'events': [{'name': name, 'timeUnixNano': int(t * 1e9), 'attributes': attributes}
+                           for name, t, attributes in self.events],
+                'status': {'code': 'ERROR', 'message': self.error} if self.error else {'code': 'OK'}}
+        if self.parent_id is not None:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class _NoSpan(object):
+    """ Span of connections without tracer """
+    def set_attribute(self, name, value):
+        pass
+
+    def add_event(self, name, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+NO_SPAN = _NoSpan()
+
+
+class Tracer(object):
+    def __init__(self, exporter):
+        self.exporter = exporter
+        self._local = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _push(self, span):
+        self._stack().append(span)
+
+    def _pop(self, span):
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+
+    def _finish(self, span):
+        self.exporter.export(span)
+
+    def current(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def span(self, name, **attributes):
+        """ Span which is a child of the current span of the thread, use it in with statement """
+        return Span(self, name, self.current(), attributes)
+
+    def instrument(self, connection):
+        """ Makes requests of the connection spans, and its operations spans of this tracer """
+        connection.tracer = self
+        connection.hooks.before_request.append(self._before_request)
+        connection.hooks.after_response.append(self._after_response)
+        connection.hooks.on_retry.append(self._on_retry)
+
+    def _before_request(self, connection, method, url, headers, body):
+        span = self.span(endpoint_template(method, url), url=url, server=connection.url)
+        self._push(span)
+
+    def _after_response(self, connection, method, url, response, seconds, error):
+        span = self.current()
+        if span is None:
+            return
+        self._pop(span)
+        if response is not None:
+            span.set_attribute('status', response.status)
+            span.finish('HTTP %d' % response.status if response.status >= 400 else None)
+        else:
+            span.finish(repr(error))
+
+    def _on_retry(self, connection, method, url, retry_count, delay, response, error):
+        span = self.current()
+        if span is not None:
+            span.add_event('retry', url=url, retry=retry_count, delay=delay,
+                           status=response.status if response is not None else repr(error))
+
+    def close(self):
+        self.exporter.close()
+
+
+class FileExporter(object):
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.as_dict(), sort_keys=True) + os.linesep
+        with self._lock:
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def traced(name, attributes=None):
+    """ Makes the Connection method a span, attributes function gets
+        the arguments of the method and returns the attributes of the span.
+    """
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapped(self, *args, **kwargs):
+            tracer = self.tracer
+            if tracer is None:
+                return f(self, *args, **kwargs)
+            with tracer.span(name, **(attributes(*args, **kwargs) if attributes is not None else {})):
+                return f(self, *args, **kwargs)
+        return wrapped
+    return decorator
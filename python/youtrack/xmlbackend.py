@@ -0,0 +1,338 @@
+"""
+XML parsing backends.
+
+minidom builds its tree of python objects node by node and is by far the
+slowest parser of the standard library. When lxml or cElementTree is available
+responses are parsed by it, and the resulting tree is wrapped into light nodes
+implementing the part of the DOM api the youtrack package relies on:
+documentElement, childNodes, nodeType, tagName, data, attributes,
+getAttribute, hasAttribute, getElementsByTagName and toxml.
+
+The backend is chosen on import from YOUTRACK_XML_BACKEND environment variable
+or the first one available of lxml, cElementTree and minidom. It can be
+switched at runtime:
+
+    from youtrack import xmlbackend
+    xmlbackend.use('minidom')
+"""
+
+import os
+from xml.dom import Node, minidom
+from xml.dom.minicompat import NodeList
+
+# cElementTree forgets the prefixes used in the document, attributes of these
+# namespaces are exposed with their conventional prefixes like minidom does
+NAMESPACES = {
+    'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+    'xml': 'http://www.w3.org/XML/1998/namespace',
+}
+_QNAMES = dict(('{%s}' % uri, prefix + ':') for prefix, uri in NAMESPACES.items())
+_CLARK_NAMES = dict((prefix + ':', '{%s}' % uri) for prefix, uri in NAMESPACES.items())
+
+BACKENDS = ('lxml', 'cElementTree', 'ElementTree', 'minidom')
+# pure python ElementTree is slower than minidom, it is used only on request
+_PREFERRED = ('lxml', 'cElementTree', 'minidom')
+
+
+def _qname(name):
+    # '{http://www.w3.org/2001/XMLSchema-instance}type' -> 'xsi:type'
+    if name[0] != '{':
+        return name
+    uri, local = name[1:].split('}', 1)
+    return _QNAMES.get('{%s}' % uri, '') + local
+
+
+def _clark_name(name):
+    # 'xsi:type' -> '{http://www.w3.org/2001/XMLSchema-instance}type'
+    if ':' not in name:
+        return name
+    prefix, local = name.split(':', 1)
+    return _CLARK_NAMES.get(prefix + ':', prefix + ':') + local
+
+
+class _Node(object):
+    """Node type constants are available on nodes like on minidom ones"""
+    __slots__ = ()
+
+for _name in dir(Node):
+    if _name.endswith('_NODE'):
+        setattr(_Node, _name, getattr(Node, _name))
+
+
+class Text(_Node):
+    __slots__ = ('data',)
+    nodeType = Node.TEXT_NODE
+    nodeName = '#text'
+
+    def __init__(self, data):
+        self.data = unicode(data)
+
+    @property
+    def nodeValue(self):
+        return self.data
+
+    def toxml(self):
+        return _escape(self.data)
+
+
+class Attr(_Node):
+    __slots__ = ('name', 'value')
+    nodeType = Node.ATTRIBUTE_NODE
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+
+class Attributes(object):
+    """Read-only counterpart of minidom NamedNodeMap"""
+    __slots__ = ('_el',)
+
+    def __init__(self, el):
+        self._el = el
+
+    def items(self):
+        return [(_qname(name), unicode(value)) for name, value in self._el.items()]
+
+    def keys(self):
+        return [_qname(name) for name in self._el.keys()]
+
+    def values(self):
+        return [unicode(value) for value in self._el.values()]
+
+    def item(self, index):
+        items = self.items()
+        if 0 <= index < len(items):
+            return Attr(*items[index])
+        return None
+
+    def get(self, name, default=None):
+        value = self._el.get(_clark_name(name))
+        if value is None:
+            return default
+        return Attr(name, unicode(value))
+
+    def __getitem__(self, name):
+        attr = self.get(name)
+        if attr is None:
+            raise KeyError(name)
+        return attr
+
+    def __contains__(self, name):
+        return self._el.get(_clark_name(name)) is not None
+
+    def __len__(self):
+        return len(self._el.keys())
+
+    length = property(__len__)
+
+
+class Element(_Node):
+    """Element of the parsed tree. Every backend makes a subclass which
+    defines _tostring serializing the wrapped element without its tail."""
+    __slots__ = ('_el', '_children')
+    nodeType = Node.ELEMENT_NODE
+
+    def __init__(self, el):
+        self._el = el
+        self._children = None
+
+    @property
+    def tagName(self):
+        return self._el.tag
+
+    nodeName = tagName
+
+    @property
+    def attributes(self):
+        return Attributes(self._el)
+
+    @property
+    def childNodes(self):
+        children = self._children
+        if children is None:
+            el = self._el
+            element = self.__class__
+            children = NodeList()
+            append = children.append
+            text = el.text
+            if text:
+                append(Text(text))
+            for c in el:
+                append(element(c))
+                tail = c.tail
+                if tail:
+                    append(Text(tail))
+            self._children = children
+        return children
+
+    @property
+    def firstChild(self):
+        children = self.childNodes
+        return children[0] if children else None
+
+    def getAttribute(self, name):
+        if ':' in name:
+            name = _clark_name(name)
+        value = self._el.get(name)
+        if value is None:
+            return u''
+        return unicode(value)
+
+    def hasAttribute(self, name):
+        if ':' in name:
+            name = _clark_name(name)
+        return self._el.get(name) is not None
+
+    def getElementsByTagName(self, name):
+        el = self._el
+        element = self.__class__
+        if name == '*':
+            name = None
+        return NodeList(element(e) for e in el.iter(name) if e is not el)
+
+    def toxml(self, encoding=None):
+        xml = self._tostring(self._el)
+        if encoding is None:
+            return xml
+        return xml.encode(encoding)
+
+
+class Document(_Node):
+    __slots__ = ('documentElement',)
+    nodeType = Node.DOCUMENT_NODE
+    nodeName = '#document'
+
+    def __init__(self, root):
+        self.documentElement = root
+
+    @property
+    def childNodes(self):
+        return NodeList([self.documentElement])
+
+    @property
+    def firstChild(self):
+        return self.documentElement
+
+    def getElementsByTagName(self, name):
+        root = self.documentElement
+        elements = root.getElementsByTagName(name)
+        if name in ('*', root.tagName):
+            elements.insert(0, root)
+        return elements
+
+    def toxml(self, encoding=None):
+        xml = u'<?xml version="1.0" ?>' + self.documentElement.toxml()
+        if encoding is None:
+            return xml
+        return xml.encode(encoding)
+
+
+def _escape(data):
+    return data.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _lxml():
+    from lxml import etree
+
+    # comments and processing instructions would be kept as elements
+    parser = etree.XMLParser(resolve_entities=False, remove_comments=True, remove_pis=True, huge_tree=True)
+
+    class LxmlElement(Element):
+        __slots__ = ()
+
+        @staticmethod
+        def _tostring(el):
+            return etree.tostring(el, encoding=unicode, with_tail=False)
+
+    def parseString(content):
+        # lxml refuses unicode with an encoding declaration
+        if isinstance(content, unicode):
+            content = content.encode('utf-8')
+        return Document(LxmlElement(etree.fromstring(content, parser)))
+
+    return parseString
+
+
+def _element_tree(module):
+    from xml.etree import ElementTree
+    for prefix, uri in NAMESPACES.items():
+        if prefix != 'xml':
+            ElementTree.register_namespace(prefix, uri)
+
+    class ElementTreeElement(Element):
+        __slots__ = ()
+
+        @staticmethod
+        def _tostring(el):
+            tail = el.tail
+            el.tail = None
+            try:
+                return module.tostring(el, 'utf-8').decode('utf-8')
+            finally:
+                el.tail = tail
+
+    def parseString(content):
+        if isinstance(content, unicode):
+            content = content.encode('utf-8')
+        return Document(ElementTreeElement(module.fromstring(content)))
+
+    return parseString
+
+
+def _cElementTree():
+    from xml.etree import cElementTree
+    return _element_tree(cElementTree)
+
+
+def _ElementTree():
+    from xml.etree import ElementTree
+    return _element_tree(ElementTree)
+
+
+def _minidom():
+    return minidom.parseString
+
+
+_factories = {
+    'lxml': _lxml,
+    'cElementTree': _cElementTree,
+    'ElementTree': _ElementTree,
+    'minidom': _minidom,
+}
+
+backend = None
+_parseString = None
+
+
+def available():
+    """Names of the backends which can be used here"""
+    names = []
+    for name in BACKENDS:
+        try:
+            _factories[name]()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def use(name=None):
+    """Switches parsing to the backend with the given name, or the fastest
+    available one if the name is None. Raises ImportError if the backend
+    can't be loaded."""
+    global backend, _parseString
+    if name is None:
+        name = [b for b in available() if b in _PREFERRED][0]
+    if name not in _factories:
+        raise ValueError('Unknown xml backend [%s], expected one of %s' % (name, ', '.join(BACKENDS)))
+    _parseString = _factories[name]()
+    backend = name
+
+
+def parseString(content):
+    """Parses xml string into a Document with the current backend"""
+    return _parseString(content)
+
+
+use(os.environ.get('YOUTRACK_XML_BACKEND') or None)
@@ -8,6 +8,7 @@ import traceback
 
 from sync.users import UserImporter
 from sync.links import LinkImporter
+from youtrack.memory import MemoryProfiler, NullProfiler
 
 import re
 import getopt
@@ -43,6 +44,9 @@ Options:
     -p,  Covert period values (used as workaroud for JT-19362)
     -t TIME_SETTINGS,
          Time Tracking settings in format "days_in_a_week:hours_in_a_day"
+    -m PAGES,
+         Profile memory usage, report its growth to stderr after every phase
+         and every PAGES pages of issues
 """ % os.path.basename(sys.argv[0])
 
 
@@ -53,7 +57,7 @@ def main():
     attachments_only = False
     try:
         params = {}
-        opts, args = getopt.getopt(sys.argv[1:], 'hanrcdfpt:T')
+        opts, args = getopt.getopt(sys.argv[1:], 'hanrcdfpt:Tm:')
         for opt, val in opts:
             if opt == '-h':
                 usage()
@@ -74,6 +78,8 @@ def main():
                 params['create_new_issues'] = True
             elif opt == '-T':
                 params['sync_tags'] = True
+            elif opt == '-m':
+                params['memory_profiler'] = MemoryProfiler(interval=int(val))
             elif opt == '-t':
                 if ':' in val:
                     d, h = val.split(':')
@@ -94,14 +100,17 @@ def main():
         print 'Not enough arguments'
         usage()
         sys.exit(1)
-    if attachments_only:
-        import_attachments_only(source_url, source_login, source_password,
-                                target_url, target_login, target_password,
-                                project_ids, params=params)
-    else:
-        youtrack2youtrack(source_url, source_login, source_password,
-                          target_url, target_login, target_password,
-                          project_ids, params=params)
+    try:
+        if attachments_only:
+            import_attachments_only(source_url, source_login, source_password,
+                                    target_url, target_login, target_password,
+                                    project_ids, params=params)
+        else:
+            youtrack2youtrack(source_url, source_login, source_password,
+                              target_url, target_login, target_password,
+                              project_ids, params=params)
+    finally:
+        params.get('memory_profiler', NullProfiler()).stop()
 
 def create_bundle_from_bundle(source, target, bundle_name, bundle_type, user_importer):
     source_bundle = source.getBundle(bundle_type, bundle_name)
@@ -252,11 +261,13 @@ def youtrack2youtrack(source_url, source_login, source_password, target_url, tar
         return
     if params is None:
         params = {}
+    profiler = params.get('memory_profiler', NullProfiler())
 
     source = Connection(source_url, source_login, source_password)
     target = Connection(target_url, target_login, target_password)
     #, proxy_info = httplib2.ProxyInfo(socks.PROXY_TYPE_HTTP, 'localhost', 8888)
 
+    profiler.phase('issue link types')
     print "Import issue link types"
     for ilt in source.getIssueLinkTypes():
         try:
@@ -268,6 +279,7 @@ def youtrack2youtrack(source_url, source_login, source_password, target_url, tar
     link_importer = LinkImporter(target)
 
     #create all projects with minimum info and project lead set
+    profiler.phase('projects')
     created_projects = []
     for project_id in project_ids:
         created = create_project_stub(source, target, project_id, user_importer)
@@ -279,6 +291,7 @@ def youtrack2youtrack(source_url, source_login, source_password, target_url, tar
     user_importer.importUsersRecursively([target.getUser(project.lead) for project in created_projects])
     #afterwards in a script any user import imply recursive import
 
+    profiler.phase('custom fields')
     cf_names_to_import = set([]) # names of cf prototypes that should be imported
     for project_id in project_ids:
         cf_names_to_import.update([pcf.name.capitalize() for pcf in source.getProjectCustomFields(project_id)])
@@ -317,6 +330,7 @@ def youtrack2youtrack(source_url, source_login, source_password, target_url, tar
         link_importer.resetConnections(target)
 
         # copy project, subsystems, versions
+        profiler.phase('project %s fields' % projectId)
         project = source.getProject(projectId)
 
         link_importer.addAvailableIssuesFrom(projectId)
@@ -345,6 +359,7 @@ def youtrack2youtrack(source_url, source_login, source_password, target_url, tar
         tt_settings = target.getProjectTimeTrackingSettings(projectId)
 
         print "Import issues"
+        profiler.phase('project %s issues' % projectId)
         last_created_issue_number = 0
 
         while True:
@@ -573,11 +588,14 @@ def youtrack2youtrack(source_url, source_login, source_password, target_url, tar
                 raise e
 
             start += max
+            profiler.page('%s issues %d' % (projectId, start))
 
     print "Import issue links"
+    profiler.phase('issue links')
     link_importer.importCollectedLinks()
 
     print "Trying to execute failed commands once again"
+    profiler.phase('failed commands')
     for issue_id, command in failed_commands:
         try:
             print 'Executing command on issue %s: %s' % (issue_id, command)
@@ -595,12 +613,14 @@ def import_attachments_only(source_url, source_login, source_password,
         return
     if params is None:
         params = {}
+    profiler = params.get('memory_profiler', NullProfiler())
     start = 0
     max = 20
     source = Connection(source_url, source_login, source_password)
     target = Connection(target_url, target_login, target_password)
     user_importer = UserImporter(source, target, caching_users=params.get('enable_user_caching', True))
     for projectId in project_ids:
+        profiler.phase('project %s attachments' % projectId)
         while True:
             try:
                 print 'Get issues from %d to %d' % (start, start + max)
@@ -655,6 +675,7 @@ def import_attachments_only(source_url, source_login, source_password,
                 traceback.print_exc()
                 raise e
             start += max
+            profiler.page('%s attachments %d' % (projectId, start))
 
 
 if __name__ == "__main__":